@@ -30,7 +30,9 @@ def initialize_resources(**context) -> bool:
         pinecone_api_key = os.getenv('PINECONE_API_KEY')
         index_name = os.getenv('PINECONE_INDEX_NAME', 'pdf-semantic-chunking')
         
-        if not openai_api_key or not pinecone_api_key:
+        # Only the Pinecone vector store needs a Pinecone key
+        needs_pinecone = os.getenv('VECTOR_STORE', 'pinecone') == 'pinecone'
+        if not openai_api_key or (needs_pinecone and not pinecone_api_key):
             raise ValueError("Missing required API keys in environment variables")
         
         logger.info("Initializing PDFProcessor...")
@@ -42,7 +44,7 @@ def initialize_resources(**context) -> bool:
         
         # Create/initialize index
         index_name = os.getenv('PINECONE_INDEX_NAME', 'pdf-semantic-chunking')
-        logger.info(f"Creating/connecting to Pinecone index: {index_name}")
+        logger.info(f"Creating/connecting to vector index: {index_name}")
         
         stats = processor.create_index(index_name=index_name)
         logger.info(f"Index initialized with stats: {stats}")
@@ -27,37 +27,54 @@ def initialize_processor() -> PDFProcessor:
     )
 
 def upload_document_batches(processor: PDFProcessor, doc_data: Dict, batch_size: int) -> Tuple[int, List[str]]:
-    """Upload document chunks in batches."""
+    """Upload document chunks in batches.
+
+    Chunks are embedded a window of several batches at a time. Cached
+    chunks are served from the embedding cache; the rest go through the
+    processor's dispatcher, which runs token-packed requests concurrently
+    within the configured rate limits.
+    """
     uploaded_chunks = 0
     errors = []
     
     try:
         splits = doc_data['splits']
         metadata = doc_data['metadata']
+        dispatcher = processor.embedding_dispatcher
+        window = batch_size * dispatcher.max_concurrency
         
-        # Process in batches
-        for i in range(0, len(splits), batch_size):
+        for w in range(0, len(splits), window):
+            window_metadata = metadata[w:w + window]
             try:
-                i_end = min(len(splits), i + batch_size)
-                metadata_batch = metadata[i:i_end]
-                
-                # Prepare vectors for upload
-                ids = [m['id'] for m in metadata_batch]
-                contents = [processor.build_chunk(title=m['title'], content=m['content']) 
-                           for m in metadata_batch]
-                
-                # Create embeddings and upload
-                embeds = processor.encoder(contents)
-                processor.index.upsert(vectors=zip(ids, embeds, metadata_batch))
-                
-                uploaded_chunks += len(metadata_batch)
-                logger.info(f"Uploaded batch of {len(metadata_batch)} chunks")
-                
+                contents = [processor.build_chunk(title=m['title'], content=m['content'])
+                           for m in window_metadata]
+                embeds = processor.chunk_encoder(contents)
             except Exception as e:
-                error_msg = f"Error uploading batch {i//batch_size}: {str(e)}"
+                error_msg = f"Error embedding batches {w//batch_size}-{(w + len(window_metadata) - 1)//batch_size}: {str(e)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
-                
+                continue
+
+            # Upload in batches
+            for i in range(0, len(window_metadata), batch_size):
+                try:
+                    metadata_batch = window_metadata[i:i + batch_size]
+                    ids = [m['id'] for m in metadata_batch]
+                    processor.index.upsert(zip(ids, embeds[i:i + batch_size], metadata_batch))
+                    
+                    uploaded_chunks += len(metadata_batch)
+                    logger.info(f"Uploaded batch of {len(metadata_batch)} chunks")
+                    
+                except Exception as e:
+                    error_msg = f"Error uploading batch {(w + i)//batch_size}: {str(e)}"
+                    logger.error(error_msg)
+                    errors.append(error_msg)
+
+        cache = getattr(processor.chunk_encoder, 'cache', None)
+        logger.info(
+            f"Embedding throughput: {dispatcher.throughput:.1f} chunks/sec over "
+            f"{dispatcher.chunks_embedded} embedded chunks ({cache.hits if cache else 0} served from cache)"
+        )
         return uploaded_chunks, errors
         
     except Exception as e:
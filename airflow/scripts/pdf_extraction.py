@@ -0,0 +1,104 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from scripts.pdf_backends import get_backend
+
+
+@dataclass
+class ExtractedText:
+    """Full text of a PDF plus the offset at which every page starts."""
+    content: str
+    pages: int
+    page_char_offsets: List[int]
+    page_byte_offsets: List[int]
+
+
+def _extract_page_range(task: Tuple[str, str, int, int]) -> List[str]:
+    """Extract the text of pages [start, end) from a PDF (runs inside a worker)."""
+    backend_name, file_path, start, end = task
+    return get_backend(backend_name).extract_pages(file_path, start, end)
+
+
+def split_page_ranges(num_pages: int, num_ranges: int) -> List[Tuple[int, int]]:
+    """Split [0, num_pages) into at most num_ranges contiguous, near-equal ranges."""
+    num_ranges = max(1, min(num_ranges, num_pages))
+    size, remainder = divmod(num_pages, num_ranges)
+    ranges = []
+    start = 0
+    for i in range(num_ranges):
+        end = start + size + (1 if i < remainder else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def join_pages(page_texts: List[str]) -> ExtractedText:
+    """Join per-page text once and record the char/byte offset of every page."""
+    char_offsets = []
+    byte_offsets = []
+    char_pos = 0
+    byte_pos = 0
+    for text in page_texts:
+        char_offsets.append(char_pos)
+        byte_offsets.append(byte_pos)
+        char_pos += len(text)
+        byte_pos += len(text.encode("utf-8"))
+
+    return ExtractedText(
+        content="".join(page_texts),
+        pages=len(page_texts),
+        page_char_offsets=char_offsets,
+        page_byte_offsets=byte_offsets
+    )
+
+
+def extract_text(
+    file_path: str,
+    workers: Optional[int] = None,
+    backend: Optional[str] = None,
+    min_pages_per_task: int = 16
+) -> ExtractedText:
+    """Extract PDF text, spreading page ranges over a process pool when workers > 1.
+
+    backend names a parser from pdf_backends (PDF_PARSER_BACKEND env var when
+    omitted). Pages come back in document order regardless of which worker handled them.
+    Documents too small to fill at least two tasks are read in-process, since
+    starting a pool costs more than it saves.
+    """
+    if workers is None:
+        workers = int(os.getenv("PDF_EXTRACT_WORKERS", "1"))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    parser = get_backend(backend)
+    num_pages = parser.page_count(file_path)
+
+    if workers == 1 or num_pages < 2 * min_pages_per_task:
+        return join_pages(parser.extract_pages(file_path, 0, num_pages))
+
+    # Oversubscribe the pool a little so one slow range doesn't idle the other workers
+    num_tasks = min(workers * 4, num_pages // min_pages_per_task)
+    tasks = [(parser.name, file_path, start, end) for start, end in split_page_ranges(num_pages, num_tasks)]
+
+    # "spawn" avoids forking a process that may already hold client threads/locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as executor:
+        page_texts = [text for chunk in executor.map(_extract_page_range, tasks) for text in chunk]
+
+    return join_pages(page_texts)
+
+
+def iter_page_windows(file_path: str, window_pages: int, backend: Optional[str] = None) -> Iterator[Tuple[int, int, str]]:
+    """Yield (start_page, end_page, text) for consecutive windows of window_pages pages.
+
+    Only one window of text is held in memory at a time, whatever the page count.
+    """
+    parser = get_backend(backend)
+    num_pages = parser.page_count(file_path)
+    for start in range(0, num_pages, window_pages):
+        end = min(num_pages, start + window_pages)
+        yield start, end, "".join(parser.extract_pages(file_path, start, end))
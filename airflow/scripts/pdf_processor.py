@@ -4,14 +4,15 @@ from semantic_router.encoders import OpenAIEncoder
 from semantic_router.splitters import RollingWindowSplitter
 from semantic_router.utils.logger import logger
 from semantic_router.schema import DocumentSplit
-import PyPDF2
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from pinecone import Pinecone, ServerlessSpec
-import time
 from tqdm.auto import tqdm
 from dotenv import load_dotenv
 import hashlib
+from scripts.embedding_cache import build_cached_encoder
+from scripts.embedding_dispatcher import EmbeddingDispatcher
+from scripts.pdf_extraction import extract_text
+from scripts.vector_store import build_vector_store
 
 load_dotenv()
 class PDFProcessor:
@@ -21,8 +22,11 @@ class PDFProcessor:
         self.encoder = OpenAIEncoder(name="text-embedding-3-small")
         logger.setLevel("WARNING")
         
-        self.pc = Pinecone(api_key=pinecone_api_key)
         self.dims = len(self.encoder(["test"])[0])
+        self.embedding_dispatcher = EmbeddingDispatcher.from_env(self.encoder)
+        # Chunk embeddings go through a persistent cache so unchanged chunks are never re-embedded;
+        # only its misses reach the dispatcher and its rate limits
+        self.chunk_encoder = build_cached_encoder(self.embedding_dispatcher, self.dims)
         
         self.splitter = RollingWindowSplitter(
             encoder=self.encoder,
@@ -38,49 +42,11 @@ class PDFProcessor:
         self.create_index(index_name=index_name)
 
     def create_index(self, index_name: str = "pdf-semantic-chunking"):
-        """Create and initialize Pinecone index."""
-        # Setup serverless specification
-        spec = ServerlessSpec(cloud="aws", region="us-east-1")
-        
-        # Check if index exists
-        if index_name in self.pc.list_indexes().names():
-            # If exists, just connect to it
-            self.index = self.pc.Index(index_name)
-            logger.info(f"Connected to existing index: {index_name}")
-        else:
-            # Create new index if it doesn't exist
-            self.pc.create_index(
-                name=index_name,
-                dimension=self.dims,
-                metric='dotproduct',
-                spec=spec
-            )
-            # Wait for index to be initialized
-            while not self.pc.describe_index(index_name).status['ready']:
-                time.sleep(1)
-            
-            # Connect to index
-            self.index = self.pc.Index(index_name)
-            logger.info(f"Created and initialized new index: {index_name}")
-        
-        time.sleep(1)  # Small delay to ensure connection is established
-        return self.index.describe_index_stats()
-        # # Create index if it doesn't exist
-        # if index_name not in self.pc.list_indexes().names():
-        #     self.pc.create_index(
-        #         name=index_name,
-        #         dimension=self.dims,
-        #         metric='dotproduct',
-        #         spec=spec
-        #     )
-        #     # Wait for index to be initialized
-        #     while not self.pc.describe_index(index_name).status['ready']:
-        #         time.sleep(1)
-        
-        # # Connect to index
-        # self.index = self.pc.Index(index_name)
-        # time.sleep(1)
-        # return self.index.describe_index_stats()
+        """Open the configured vector store (VECTOR_STORE), creating the index if needed."""
+        self.index_name = index_name
+        self.index = build_vector_store(self.dims, index_name)
+        logger.info(f"Connected to {self.index.name} index: {index_name}")
+        return self.index.stats()
 
     def build_chunk(self, title: str, content: str) -> str:
         """Format chunk with title for embedding."""
@@ -100,21 +66,19 @@ class PDFProcessor:
         query_response = self.index.query(
             vector=[0] * self.dims,  # Dummy vector for metadata-only query
             top_k=1,
-            filter={"doc_hash": doc_hash},
-            include_metadata=True
+            filter={"doc_hash": doc_hash}
         )
 
-        exists = len(query_response.matches) > 0
+        exists = len(query_response) > 0
         
         if exists:
             # Fetch all chunk IDs for this document
             fetch_response = self.index.query(
                 vector=[0] * self.dims,
                 top_k=10000,  # Large number to get all chunks
-                filter={"doc_hash": doc_hash},
-                include_metadata=True
+                filter={"doc_hash": doc_hash}
             )
-            chunk_ids = [match.id for match in fetch_response.matches]
+            chunk_ids = [match.id for match in fetch_response]
             return True, chunk_ids
         
         return False, []
@@ -150,25 +114,28 @@ class PDFProcessor:
             })
         return metadata
 
-    def read_pdf(self, file_path: str) -> Optional[Dict[str, Any]]:
-        """Read PDF and extract content with metadata."""
+    def read_pdf(self, file_path: str, workers: Optional[int] = None, backend: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Read PDF and extract content with metadata.
+
+        With workers > 1 pages are extracted in parallel worker processes
+        (defaults to the PDF_EXTRACT_WORKERS env var, serial when unset).
+        backend picks the parser (defaults to PDF_PARSER_BACKEND, then PyPDF2).
+        """
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                
-                doc_info = {
-                    "file_path": file_path,
-                    "title": os.path.splitext(os.path.basename(file_path))[0],
-                    "pages": len(pdf_reader.pages),
-                    "content": text,
-                    "processed_date": datetime.now().isoformat(),
-                    "doc_id": f"doc_{hash(file_path)}",
-                    "references": []
-                }
-                return doc_info
+            extracted = extract_text(file_path, workers=workers, backend=backend)
+
+            doc_info = {
+                "file_path": file_path,
+                "title": os.path.splitext(os.path.basename(file_path))[0],
+                "pages": extracted.pages,
+                "content": extracted.content,
+                "page_char_offsets": extracted.page_char_offsets,
+                "page_byte_offsets": extracted.page_byte_offsets,
+                "processed_date": datetime.now().isoformat(),
+                "doc_id": f"doc_{hash(file_path)}",
+                "references": []
+            }
+            return doc_info
         except Exception as e:
             print(f"Error reading PDF: {str(e)}")
             return None
@@ -202,20 +169,22 @@ class PDFProcessor:
         for m in metadata:
             m["doc_hash"] = doc_hash
         
-        # Process in batches
-        for i in range(0, len(splits), batch_size):
-            i_end = min(len(splits), i+batch_size)
-            metadata_batch = metadata[i:i_end]
-            
-            ids = [m["id"] for m in metadata_batch]
-            content = [self.build_chunk(title=x["title"], content=x["content"]) 
-                      for x in metadata_batch]
-            
-            embeds = self.encoder(content)
-            self.index.upsert(vectors=zip(ids, embeds, metadata_batch))
+        # Embed several upsert batches per dispatch so they run concurrently
+        window = batch_size * self.embedding_dispatcher.max_concurrency
+        for i in range(0, len(metadata), window):
+            self.embed_and_upsert(metadata[i:i+window], batch_size)
             
         return len(splits), exists
 
+    def embed_and_upsert(self, metadata: List[Dict[str, Any]], batch_size: int = 128) -> None:
+        """Embed chunks (cache misses through the dispatcher) and upsert them in batches of batch_size."""
+        content = [self.build_chunk(title=x["title"], content=x["content"]) for x in metadata]
+        embeds = self.chunk_encoder(content)
+        for i in range(0, len(metadata), batch_size):
+            metadata_batch = metadata[i:i+batch_size]
+            ids = [m["id"] for m in metadata_batch]
+            self.index.upsert(zip(ids, embeds[i:i+batch_size], metadata_batch))
+
     def get_available_pdfs(self) -> List[str]:
         """Retrieve list of all indexed PDF titles."""
         if not self.index:
@@ -224,13 +193,12 @@ class PDFProcessor:
         # Query with dummy vector to get unique titles
         response = self.index.query(
             vector=[0] * self.dims,
-            top_k=10000,  # Large number to get all possible matches
-            include_metadata=True
+            top_k=10000  # Large number to get all possible matches
         )
         
         # Extract unique titles from metadata
         titles = set()
-        for match in response.matches:
+        for match in response:
             if 'title' in match.metadata:
                 titles.add(match.metadata['title'])
         
@@ -251,13 +219,12 @@ class PDFProcessor:
         matches = self.index.query(
             vector=xq,
             top_k=top_k,
-            filter=filter_dict,
-            include_metadata=True
+            filter=filter_dict
         )
         
         # Format results
         chunks = []
-        for m in matches["matches"]:
+        for m in matches:
             content = m["metadata"]["content"]
             title = m["metadata"]["title"]
             pre_id = m["metadata"]["prechunk_id"]
@@ -268,15 +235,15 @@ class PDFProcessor:
             if pre_id or post_id:
                 ids_to_fetch = [id for id in [pre_id, post_id] if id]
                 if ids_to_fetch:
-                    other_chunks = self.index.fetch(ids=ids_to_fetch)["vectors"]
+                    other_chunks = self.index.fetch(ids_to_fetch)
                     
                     if pre_id and pre_id in other_chunks:
-                        context += other_chunks[pre_id]["metadata"]["content"][-400:]
+                        context += other_chunks[pre_id].metadata["content"][-400:]
                     
                     context += f"\n{content}\n"
                     
                     if post_id and post_id in other_chunks:
-                        context += other_chunks[post_id]["metadata"]["content"][:400]
+                        context += other_chunks[post_id].metadata["content"][:400]
             
             chunk = f"# {title}\n\n{context if context else content}"
             chunks.append(chunk)
@@ -284,13 +251,13 @@ class PDFProcessor:
         return chunks
 
     def delete_index(self, confirm: bool = True) -> bool:
-        """Delete the Pinecone index."""
+        """Delete the vector index."""
         if not self.index:
             print("No active index to delete")
             return False
             
         try:
-            index_name = self.index._index_name
+            index_name = self.index_name
 
             if confirm:
                 answer = input(f"Type 'y' to confirm deletion of index '{index_name}'...\n>> ")
@@ -298,7 +265,7 @@ class PDFProcessor:
                     print("Deletion Cancelled")
                     return False
                     
-            self.pc.delete_index(index_name)
+            self.index.drop()
             self.index = None
             print(f"Index '{index_name}' Deleted!")
             return True
@@ -46,6 +46,7 @@ class EnhancedGraphState(BaseModel):
     output_type: str
     rag_context: Optional[RAGContext] = None
     pdf_title: Optional[str] = None
+    file_id: Optional[str] = None
     cache_result: Optional[CacheResult] = None  
     s3_url: Optional[str] = None
     flashcards: Optional[FlashcardSet] = None
@@ -56,9 +57,9 @@ class EnhancedGraphState(BaseModel):
     tweet_content: Optional[TweetContent] = None
 
 class IntegratedContentGenerator:
-    def __init__(self):
+    def __init__(self, rag_app: Optional[RAGApplication] = None):
         self.content_engine = ContentEngine()
-        self.rag_app = RAGApplication()
+        self.rag_app = rag_app or RAGApplication()
         self.podcast_cache = PodcastCache()
         self.s3_storage = S3Storage(bucket_name=os.getenv("AWS_BUCKET_NAME"))
 
@@ -133,14 +134,14 @@ Return only the enhanced script in the same format, applying all improvements.
 """
 
 class PodcastGenerator:
-    def __init__(self):
+    def __init__(self, rag_app: Optional[RAGApplication] = None):
         self.llm = ChatOpenAI(
             model="learnlm-1.5-pro-experimental",
             base_url="https://generativelanguage.googleapis.com/v1beta/openai/", 
             temperature=0.7, 
             api_key=os.getenv("GEMINI_API_KEY")
         )
-        self.rag_app = RAGApplication()
+        self.rag_app = rag_app or RAGApplication()
         self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
         self.voice_ids = {
             "Speaker 1": os.getenv("ELEVENLABS_VOICE_ID_1"),
@@ -368,12 +369,18 @@ class PodcastGenerator:
         return state
 
     
-    def generate_content(self, question: str, pdf_title: str, output_type: str = "podcast") -> Dict[str, Any]:
+    def generate_content(
+        self,
+        question: str,
+        pdf_title: str,
+        output_type: str = "podcast",
+        file_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Generate either a podcast or flashcards based on the specified output type"""
         # First retrieve RAG context regardless of output type
         print(f"DEBUG: Generating content for query: {question}, Output Type: {output_type}")
         print(f"DEBUG: Using PDF Title: {pdf_title}")
-        rag_response = self.rag_app.query_document(question, pdf_title)
+        rag_response = self.rag_app.query_document(question, pdf_title, file_id=file_id)
 
         
         # Check for errors in RAG response
@@ -555,7 +562,7 @@ class PodcastGenerator:
                 raise
 
         else:  # podcast generation
-            return self.generate_podcast(question=question, pdf_title=pdf_title)
+            return self.generate_podcast(question=question, pdf_title=pdf_title, file_id=file_id)
         
         
        
@@ -592,7 +599,8 @@ class PodcastGenerator:
             
         rag_response = self.rag_app.query_document(
             state.rag_context.question, 
-            state.pdf_title
+            state.pdf_title,
+            file_id=state.file_id
         )
         
         state.rag_context.answer = rag_response["answer"]
@@ -752,7 +760,7 @@ class PodcastGenerator:
         audio = AudioSegment.from_file(io.BytesIO(response.content), format="mp3")
         return audio
     
-    def generate_podcast(self, question: str, pdf_title: str) -> Dict[str, Any]:
+    def generate_podcast(self, question: str, pdf_title: str, file_id: Optional[str] = None) -> Dict[str, Any]:
         """Generate a podcast based on the provided question and PDF"""
         initial_state = EnhancedGraphState(
             messages=[HumanMessage(content=f"Create a podcast about: {question}")],
@@ -763,6 +771,7 @@ class PodcastGenerator:
                 pdf_title=pdf_title
             ),
             pdf_title=pdf_title,
+            file_id=file_id,
             cache_result=None,
             s3_url=None,
             current_stage="start"
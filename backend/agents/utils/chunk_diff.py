@@ -0,0 +1,89 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Fields that change on every indexing run and must not by themselves force a re-upsert
+VOLATILE_FIELDS = ("doc_hash", "processed_date")
+
+
+def chunk_hash(content: str) -> str:
+    """Stable content hash of a chunk's text."""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def chunk_fingerprint(metadata: Dict[str, Any], volatile_fields: Optional[Iterable[str]] = None) -> str:
+    """Hash of a chunk's metadata, ignoring its id and the volatile fields."""
+    volatile = set(VOLATILE_FIELDS if volatile_fields is None else volatile_fields)
+    stable = {k: v for k, v in metadata.items() if k not in volatile and k != "id"}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ChunkIdAssigner:
+    """Give chunks content-addressed ids that stay the same when neighbouring text changes.
+
+    Identical chunks within one document get an occurrence suffix (".1", ".2", ...)
+    so their ids stay unique.
+    """
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.occurrences: Dict[str, int] = {}
+
+    def __call__(self, content: str) -> str:
+        digest = chunk_hash(content)[:16]
+        n = self.occurrences.get(digest, 0)
+        self.occurrences[digest] = n + 1
+        return f"{self.doc_id}#{digest}" if n == 0 else f"{self.doc_id}#{digest}.{n}"
+
+
+def iter_linked_chunks(doc_id: str, items: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, str, str, str, Any]]:
+    """Yield (chunk_id, prechunk_id, postchunk_id, content, payload) for (content, payload) items.
+
+    Uses one item of lookahead so the next chunk's id is known when a chunk is emitted.
+    """
+    assign_id = ChunkIdAssigner(doc_id)
+    iterator = iter(items)
+    current = next(iterator, None)
+    current_id = assign_id(current[0]) if current is not None else ""
+    prechunk_id = ""
+    while current is not None:
+        following = next(iterator, None)
+        following_id = assign_id(following[0]) if following is not None else ""
+        yield current_id, prechunk_id, following_id, current[0], current[1]
+        prechunk_id, current, current_id = current_id, following, following_id
+
+
+@dataclass
+class ChunkDiff:
+    """What has to change in the index to go from the stored chunks to the new ones."""
+    to_embed: List[Dict[str, Any]] = field(default_factory=list)
+    to_relink: List[Dict[str, Any]] = field(default_factory=list)
+    to_delete: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+
+def diff_chunks(
+    existing: Dict[str, str],
+    new_metadata: List[Dict[str, Any]],
+    volatile_fields: Optional[Iterable[str]] = None
+) -> ChunkDiff:
+    """Compare stored chunks (id -> fingerprint) with freshly built chunk metadata.
+
+    New ids need embedding; ids present in both whose fingerprint changed (for
+    example a neighbour link) only need their metadata rewritten; stored ids
+    that are no longer produced are deleted.
+    """
+    diff = ChunkDiff()
+    new_ids = set()
+    for m in new_metadata:
+        new_ids.add(m["id"])
+        stored = existing.get(m["id"])
+        if stored is None:
+            diff.to_embed.append(m)
+        elif stored != chunk_fingerprint(m, volatile_fields):
+            diff.to_relink.append(m)
+        else:
+            diff.unchanged += 1
+    diff.to_delete = [chunk_id for chunk_id in existing if chunk_id not in new_ids]
+    return diff
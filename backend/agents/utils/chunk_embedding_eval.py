@@ -0,0 +1,118 @@
+"""Compare pooled chunk embeddings against re-embedded chunks on a PDF.
+
+Usage:
+    python -m agents.utils.chunk_embedding_eval book.pdf [--queries queries.json] [--top-k 5]
+
+Two kinds of evaluation are reported:
+  * synthetic: for sampled chunks the longest sentence is used as the query
+    and the chunk it came from is the only relevant result (hit@k, MRR);
+  * queries (optional JSON list of strings): the re-embedded ranking is
+    treated as the reference and the pooled ranking is scored by top-k
+    overlap and top-1 agreement.
+Embedding traffic (tokens sent to the API) for both modes is reported as well.
+"""
+import argparse
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from semantic_router.encoders import OpenAIEncoder
+from semantic_router.splitters.utils import tiktoken_length
+
+from agents.utils.pdf_extraction import extract_text
+from agents.utils.pdf_processor import build_splitter
+from agents.utils.sentence_pooling import pool_split_embeddings
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _embed(encoder: Any, texts: List[str], batch_size: int = 1000) -> np.ndarray:
+    embeds = []
+    for i in range(0, len(texts), batch_size):
+        embeds.extend(encoder(texts[i:i + batch_size]))
+    return _normalise(np.array(embeds, dtype=np.float32))
+
+
+def _rank_of(target: int, scores: np.ndarray) -> int:
+    return int((scores > scores[target]).sum()) + 1
+
+
+def evaluate(
+    pdf_path: str,
+    queries: Optional[List[str]] = None,
+    top_k: int = 5,
+    sample: int = 50,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Build both sets of chunk vectors for pdf_path and score them against each other."""
+    title = os.path.splitext(os.path.basename(pdf_path))[0]
+    content = extract_text(pdf_path).content
+
+    encoder = OpenAIEncoder(name="text-embedding-3-small")
+    splitter = build_splitter(encoder)
+    splitter.enable_statistics = False
+    splits, sentence_embeddings = splitter.split_with_embeddings([content])
+
+    pooled = _normalise(np.array(pool_split_embeddings(splits, sentence_embeddings), dtype=np.float32))
+    chunk_texts = [f"# {title}\n{split.content}" for split in splits]
+    reembedded = _embed(encoder, chunk_texts)
+
+    report: Dict[str, Any] = {
+        "chunks": len(splits),
+        "splitter_tokens": sum(tiktoken_length(doc) for split in splits for doc in split.docs),
+        "reembed_extra_tokens": sum(tiktoken_length(text) for text in chunk_texts),
+    }
+
+    # Synthetic queries: the longest sentence of a chunk should retrieve that chunk
+    candidates = [i for i, split in enumerate(splits) if len(split.docs) > 1]
+    rng = random.Random(seed)
+    targets = rng.sample(candidates, min(sample, len(candidates)))
+    if targets:
+        query_vectors = _embed(encoder, [max(splits[i].docs, key=len) for i in targets])
+        for name, matrix in (("pooled", pooled), ("reembed", reembedded)):
+            ranks = [_rank_of(t, matrix @ q) for t, q in zip(targets, query_vectors)]
+            report[f"synthetic_hit@{top_k}_{name}"] = sum(r <= top_k for r in ranks) / len(ranks)
+            report[f"synthetic_mrr_{name}"] = sum(1 / r for r in ranks) / len(ranks)
+
+    # Real queries: how closely does the pooled ranking follow the re-embedded one?
+    if queries:
+        query_vectors = _embed(encoder, queries)
+        overlaps, top1 = [], []
+        for q in query_vectors:
+            reference = np.argsort(-(reembedded @ q))[:top_k]
+            candidate = np.argsort(-(pooled @ q))[:top_k]
+            overlaps.append(len(set(reference) & set(candidate)) / top_k)
+            top1.append(candidate[0] in reference)
+        report[f"query_overlap@{top_k}"] = sum(overlaps) / len(overlaps)
+        report[f"query_top1_in_reference@{top_k}"] = sum(top1) / len(top1)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pooled and re-embedded chunk vectors")
+    parser.add_argument("pdf_path")
+    parser.add_argument("--queries", help="JSON file containing a list of query strings")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=50)
+    args = parser.parse_args()
+
+    queries = None
+    if args.queries:
+        with open(args.queries) as file:
+            queries = json.load(file)
+
+    report = evaluate(args.pdf_path, queries=queries, top_k=args.top_k, sample=args.sample)
+    print(f"\nChunk embedding comparison for {args.pdf_path}")
+    print("-" * 50)
+    for key, value in report.items():
+        print(f"{key:<36}{value:.3f}" if isinstance(value, float) else f"{key:<36}{value}")
+
+
+if __name__ == "__main__":
+    main()
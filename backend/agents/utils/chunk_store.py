@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Column, String, Text, delete, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from agents.utils.document_catalog import CatalogBase
+
+# Metadata kept on the vectors themselves: ids, links and the fields queries filter on
+INDEX_FIELDS = ("doc_id", "file_id", "user_id", "title", "doc_hash", "prechunk_id", "postchunk_id")
+
+
+class ChunkText(CatalogBase):
+    __tablename__ = "document_chunk_texts"
+
+    chunk_id = Column(String(512), primary_key=True)
+    doc_id = Column(String(255), index=True, nullable=False)
+    payload = Column(Text, nullable=False)
+
+
+def split_chunk_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a chunk's metadata that is stored on its vector."""
+    return {key: metadata[key] for key in INDEX_FIELDS if key in metadata}
+
+
+class ChunkTextStore:
+    """Chunk text and display metadata kept out of the vector index, keyed by chunk id.
+
+    Rows live in the application database next to the document catalog; an
+    in-process LRU of recently read rows sits in front of it.
+    """
+
+    def __init__(self, engine: Engine, cache_size: Optional[int] = None):
+        CatalogBase.metadata.create_all(bind=engine, tables=[ChunkText.__table__])
+        self.session_factory = sessionmaker(bind=engine, autoflush=False)
+        if cache_size is None:
+            cache_size = int(os.getenv("CHUNK_TEXT_CACHE_SIZE", "10000"))
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, chunk_id: str, row: Dict[str, Any]) -> None:
+        self.cache[chunk_id] = row
+        self.cache.move_to_end(chunk_id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def put_many(self, metadata: Sequence[Dict[str, Any]]) -> None:
+        """Store the non-index fields of each chunk's metadata, replacing earlier versions."""
+        by_id = {m["id"]: m for m in metadata}
+        rows = {
+            chunk_id: {k: v for k, v in m.items() if k != "id" and k not in INDEX_FIELDS}
+            for chunk_id, m in by_id.items()
+        }
+        if not rows:
+            return
+        with self.session_factory() as session, session.begin():
+            session.execute(delete(ChunkText).where(ChunkText.chunk_id.in_(list(rows))))
+            session.add_all([
+                ChunkText(chunk_id=chunk_id, doc_id=by_id[chunk_id]["doc_id"], payload=json.dumps(row))
+                for chunk_id, row in rows.items()
+            ])
+        with self.lock:
+            for chunk_id, row in rows.items():
+                if chunk_id in self.cache:
+                    self._remember(chunk_id, row)
+
+    def get_many(self, chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Rows for the given ids (missing ids are left out), with a single query for cache misses."""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        with self.lock:
+            for chunk_id in dict.fromkeys(chunk_ids):
+                row = self.cache.get(chunk_id)
+                if row is None:
+                    missing.append(chunk_id)
+                else:
+                    self.cache.move_to_end(chunk_id)
+                    found[chunk_id] = row
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            with self.session_factory() as session:
+                rows = session.execute(
+                    select(ChunkText.chunk_id, ChunkText.payload).where(ChunkText.chunk_id.in_(missing))
+                )
+                loaded = {chunk_id: json.loads(payload) for chunk_id, payload in rows}
+            with self.lock:
+                for chunk_id, row in loaded.items():
+                    self._remember(chunk_id, row)
+            found.update(loaded)
+        return found
+
+    def delete_many(self, chunk_ids: Sequence[str]) -> None:
+        if not chunk_ids:
+            return
+        with self.session_factory() as session, session.begin():
+            session.execute(delete(ChunkText).where(ChunkText.chunk_id.in_(list(chunk_ids))))
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self.cache.pop(chunk_id, None)
+
+    def delete_documents(self, doc_ids: Sequence[str]) -> None:
+        if not doc_ids:
+            return
+        with self.session_factory() as session, session.begin():
+            session.execute(delete(ChunkText).where(ChunkText.doc_id.in_(list(doc_ids))))
+        with self.lock:
+            prefixes = tuple(f"{doc_id}#" for doc_id in doc_ids)
+            for chunk_id in [chunk_id for chunk_id in self.cache if chunk_id.startswith(prefixes)]:
+                del self.cache[chunk_id]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,104 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agents.utils.context_windows import merge_overlap
+from agents.utils.embedding_dispatcher import count_tokens
+
+
+def mmr_order(
+    query_vector: Sequence[float],
+    vectors: Sequence[Optional[Sequence[float]]],
+    mmr_lambda: float = 0.7
+) -> List[int]:
+    """Order items by maximal marginal relevance: lambda * relevance - (1 - lambda) * similarity to earlier picks.
+
+    Items keep their given (ranked) order when any vector is missing or
+    mmr_lambda is 1.
+    """
+    if mmr_lambda >= 1 or not vectors or any(v is None for v in vectors):
+        return list(range(len(vectors)))
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    similarity = matrix @ matrix.T
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    remaining = list(range(len(vectors)))
+    order = []
+    while remaining:
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy[remaining]
+        best = remaining.pop(int(np.argmax(scores)))
+        order.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a whitespace boundary so it fits in max_tokens."""
+    while text and count_tokens(text) > max_tokens:
+        cut = int(len(text) * max_tokens / count_tokens(text) * 0.95)
+        parts = text[:cut].rsplit(None, 1)
+        text = parts[0] if len(parts) > 1 else text[:cut]
+    return text
+
+
+def pack_context(
+    passages: Sequence[Tuple[str, str]],
+    vectors: Sequence[Optional[Sequence[float]]],
+    query_vector: Sequence[float],
+    max_tokens: int = 0,
+    mmr_lambda: float = 0.7,
+    min_overlap: int = 50
+) -> List[str]:
+    """Pick (title, text) passages for a prompt within a token budget, as "# title" sections.
+
+    Passages are taken in MMR order. One contained in an already picked
+    passage of the same title is dropped, and one overlapping a picked
+    passage's start or end is merged into it so the shared text appears
+    once. A passage that does not fit is skipped in favour of later, smaller
+    ones; the first passage is truncated rather than dropped. Tokens are
+    counted with the model tokenizer; max_tokens 0 means no budget.
+    """
+    picked: List[List[str]] = []
+    used = 0
+
+    def cost(title: str, text: str) -> int:
+        return count_tokens(f"# {title}\n\n{text}\n\n")
+
+    for i in mmr_order(query_vector, vectors, mmr_lambda):
+        title, text = passages[i]
+        same_title = [p for p in picked if p[0] == title]
+        if any(text in p[1] for p in same_title):
+            continue
+
+        target, merged_text = None, None
+        for p in same_title:
+            for left, right in ((p[1], text), (text, p[1])):
+                joined, merged = merge_overlap(left, right, min_overlap)
+                if merged:
+                    target, merged_text = p, joined
+                    break
+            if target is not None:
+                break
+
+        if target is not None:
+            extra = cost(title, merged_text) - cost(title, target[1])
+            if not max_tokens or used + extra <= max_tokens:
+                target[1] = merged_text
+                used += extra
+            continue
+
+        tokens = cost(title, text)
+        if max_tokens and used + tokens > max_tokens:
+            if picked:
+                continue
+            text = truncate_to_tokens(text, max_tokens - cost(title, ""))
+            tokens = cost(title, text)
+        picked.append([title, text])
+        used += tokens
+
+    return [f"# {title}\n\n{text}" for title, text in picked]
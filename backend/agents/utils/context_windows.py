@@ -0,0 +1,102 @@
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+CONTEXT_BEFORE = "context_before"
+CONTEXT_AFTER = "context_after"
+
+
+def iter_with_context_windows(
+    items: Iterable[Tuple[Dict[str, Any], Any]],
+    window_chars: int
+) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    """Store the tail of the previous chunk and the head of the next one on each chunk's metadata.
+
+    items are (metadata, payload) pairs in document order; one item of
+    lookahead is used, so this works on streams as well as lists.
+    """
+    previous_content = ""
+    iterator = iter(items)
+    current = next(iterator, None)
+    while current is not None:
+        following = next(iterator, None)
+        metadata = current[0]
+        metadata[CONTEXT_BEFORE] = previous_content[-window_chars:] if previous_content else ""
+        metadata[CONTEXT_AFTER] = following[0]["content"][:window_chars] if following is not None else ""
+        previous_content = metadata["content"]
+        yield current
+        current = following
+
+
+def merge_overlap(left: str, right: str, min_overlap: int = 20) -> Tuple[str, bool]:
+    """Join left and right, collapsing the longest suffix of left that is also a prefix of right.
+
+    Returns (text, merged); merged is False (and text is empty) when they
+    share fewer than min_overlap characters (or than the shorter string).
+    """
+    min_overlap = max(1, min(min_overlap, len(left), len(right)))
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:], True
+    return "", False
+
+
+def assemble_context_windows(matches: Sequence[Dict[str, Any]], with_ids: bool = False) -> List[Tuple]:
+    """Stitch ranked matches into passages from their stored context windows, without fetching neighbours.
+
+    Matches that are adjacent chunks become one passage, and matches one
+    chunk apart are joined when their windows overlap, so no text is
+    repeated. Each match is a dict with "id" and "metadata". Returns
+    (metadata of the passage's first chunk, text) in order of each
+    passage's best-ranked match, plus the ids of the matches it holds
+    when with_ids is set.
+    """
+    by_id = {m["id"]: m["metadata"] for m in matches}
+    rank = {m["id"]: r for r, m in enumerate(matches)}
+
+    # Runs of directly adjacent matches, in document order
+    runs = []
+    for m in matches:
+        if by_id[m["id"]].get("prechunk_id") in by_id:
+            continue
+        run = [m["id"]]
+        while by_id[run[-1]].get("postchunk_id") in by_id and by_id[run[-1]]["postchunk_id"] not in run:
+            run.append(by_id[run[-1]]["postchunk_id"])
+        runs.append(run)
+
+    passages = [
+        {
+            "ids": run,
+            "before": by_id[run[0]].get(CONTEXT_BEFORE, ""),
+            "middle": "\n".join(by_id[chunk_id]["content"] for chunk_id in run),
+            "after": by_id[run[-1]].get(CONTEXT_AFTER, "")
+        }
+        for run in runs
+    ]
+
+    # Join passages separated by a single unmatched chunk whose windows overlap
+    by_gap = {by_id[p["ids"][0]].get("prechunk_id"): p for p in passages if by_id[p["ids"][0]].get("prechunk_id")}
+    absorbed = set()
+    for passage in passages:
+        if id(passage) in absorbed:
+            continue
+        while True:
+            following = by_gap.get(by_id[passage["ids"][-1]].get("postchunk_id"))
+            if following is None or following is passage or id(following) in absorbed:
+                break
+            bridge, merged = merge_overlap(passage["after"], following["before"])
+            if not merged:
+                break
+            passage["middle"] = "\n".join([passage["middle"], bridge, following["middle"]])
+            passage["ids"] = passage["ids"] + following["ids"]
+            passage["after"] = following["after"]
+            absorbed.add(id(following))
+
+    assembled = [
+        (min(rank[chunk_id] for chunk_id in p["ids"]), by_id[p["ids"][0]], p)
+        for p in passages if id(p) not in absorbed
+    ]
+    assembled.sort(key=lambda item: item[0])
+    return [
+        (metadata, "\n".join(part for part in (p["before"], p["middle"], p["after"]) if part))
+        + ((p["ids"],) if with_ids else ())
+        for _, metadata, p in assembled
+    ]
@@ -0,0 +1,288 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, create_engine, delete, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from agents.utils.sparse_encoder import BM25Stats
+
+CatalogBase = declarative_base()
+
+STATUS_INDEXING = "indexing"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+STATUS_DELETING = "deleting"
+
+
+class CatalogDocument(CatalogBase):
+    __tablename__ = "document_catalog"
+
+    doc_id = Column(String(255), primary_key=True)
+    file_id = Column(String(64), index=True)
+    user_id = Column(String(64), index=True)
+    namespace = Column(String(255), default="")
+    doc_hash = Column(String(64), index=True)
+    title = Column(String(1024), index=True)
+    chunk_count = Column(Integer, default=0)
+    embedding_model = Column(String(255))
+    status = Column(String(32), default=STATUS_INDEXING, index=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CatalogChunk(CatalogBase):
+    __tablename__ = "document_catalog_chunks"
+
+    chunk_id = Column(String(512), primary_key=True)
+    doc_id = Column(String(255), ForeignKey("document_catalog.doc_id", ondelete="CASCADE"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+
+
+class CatalogFileLink(CatalogBase):
+    """A user's file pointing at a (possibly shared) document; the links of a document are its reference count."""
+    __tablename__ = "document_file_links"
+
+    file_id = Column(String(64), primary_key=True)
+    user_id = Column(String(64), index=True, nullable=False)
+    doc_id = Column(String(255), ForeignKey("document_catalog.doc_id", ondelete="CASCADE"), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class CatalogSparseStats(CatalogBase):
+    """Chunk count and mean chunk length (in tokens) a document's sparse vectors were built with."""
+    __tablename__ = "document_sparse_stats"
+
+    doc_id = Column(String(255), ForeignKey("document_catalog.doc_id", ondelete="CASCADE"), primary_key=True)
+    chunk_count = Column(Integer, nullable=False)
+    avg_length = Column(Float, nullable=False)
+
+
+class CatalogTerm(CatalogBase):
+    """A document's vocabulary: how many of its chunks contain each term."""
+    __tablename__ = "document_terms"
+
+    doc_id = Column(String(255), ForeignKey("document_catalog.doc_id", ondelete="CASCADE"), primary_key=True)
+    term = Column(String(255), primary_key=True)
+    document_frequency = Column(Integer, nullable=False)
+
+
+class DocumentCatalog:
+    """Relational record of every indexed document and the ids of its chunks.
+
+    Lookups that used to scan the vector index (listing titles, finding a
+    document by hash or file, collecting chunk ids to delete) are answered by
+    indexed SQL queries instead. A document's chunk set is replaced in one
+    transaction once its vectors are stored, so readers never see a partial set.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        CatalogBase.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    @classmethod
+    def from_env(cls) -> "DocumentCatalog":
+        """Connect to DATABASE_URL (the application database)."""
+        database_url = os.getenv("DATABASE_URL")
+        if not database_url:
+            raise ValueError("DATABASE_URL must be set for the document catalog")
+        return cls(create_engine(database_url, pool_pre_ping=True))
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        with self.session_factory() as session:
+            with session.begin():
+                yield session
+
+    def begin_indexing(self, doc: Dict[str, Any], embedding_model: str, namespace: str = "") -> None:
+        """Create or update the document row and mark it as being indexed."""
+        with self.session() as session:
+            row = session.get(CatalogDocument, doc["doc_id"])
+            if row is None:
+                row = CatalogDocument(doc_id=doc["doc_id"])
+                session.add(row)
+            row.file_id = doc.get("file_id", row.file_id)
+            row.user_id = doc.get("user_id", row.user_id)
+            row.title = doc["title"]
+            row.embedding_model = embedding_model
+            row.namespace = namespace
+            row.status = STATUS_INDEXING
+
+    def complete_indexing(
+        self,
+        doc_id: str,
+        doc_hash: str,
+        chunks: Sequence[Tuple[str, str]],
+        term_stats: Optional[BM25Stats] = None
+    ) -> None:
+        """Atomically replace a document's chunk set with (chunk_id, fingerprint) pairs and mark it ready.
+
+        term_stats replaces the document's sparse vocabulary; without it the
+        document has none.
+        """
+        with self.session() as session:
+            session.execute(delete(CatalogChunk).where(CatalogChunk.doc_id == doc_id))
+            session.add_all([
+                CatalogChunk(chunk_id=chunk_id, doc_id=doc_id, position=position, fingerprint=fingerprint)
+                for position, (chunk_id, fingerprint) in enumerate(chunks)
+            ])
+            session.execute(delete(CatalogTerm).where(CatalogTerm.doc_id == doc_id))
+            session.execute(delete(CatalogSparseStats).where(CatalogSparseStats.doc_id == doc_id))
+            if term_stats is not None and term_stats.chunk_count:
+                session.add(CatalogSparseStats(
+                    doc_id=doc_id, chunk_count=term_stats.chunk_count, avg_length=term_stats.avg_length
+                ))
+                # Terms longer than the column are left out; no tokenizer output is that long in practice
+                session.add_all([
+                    CatalogTerm(doc_id=doc_id, term=term, document_frequency=df)
+                    for term, df in term_stats.document_frequencies.items() if len(term) <= 255
+                ])
+            row = session.get(CatalogDocument, doc_id)
+            row.doc_hash = doc_hash
+            row.chunk_count = len(chunks)
+            row.status = STATUS_READY
+
+    def mark_failed(self, doc_id: str) -> None:
+        with self.session() as session:
+            row = session.get(CatalogDocument, doc_id)
+            if row is not None:
+                row.status = STATUS_FAILED
+
+    def find_by_hash(self, doc_hash: str) -> Optional[str]:
+        """doc_id of a fully indexed document with this hash, if any."""
+        with self.session() as session:
+            return session.scalars(
+                select(CatalogDocument.doc_id)
+                .where(CatalogDocument.doc_hash == doc_hash, CatalogDocument.status == STATUS_READY)
+                .limit(1)
+            ).first()
+
+    def get_chunk_fingerprints(self, doc_id: str) -> Dict[str, str]:
+        """Chunk id -> fingerprint for a document, in document order."""
+        with self.session() as session:
+            rows = session.execute(
+                select(CatalogChunk.chunk_id, CatalogChunk.fingerprint)
+                .where(CatalogChunk.doc_id == doc_id)
+                .order_by(CatalogChunk.position)
+            )
+            return {chunk_id: fingerprint for chunk_id, fingerprint in rows}
+
+    def get_chunk_ids(self, doc_id: str) -> List[str]:
+        return list(self.get_chunk_fingerprints(doc_id))
+
+    def get_term_stats(self, doc_id: str, terms: Sequence[str]) -> Optional[BM25Stats]:
+        """A document's sparse statistics restricted to terms, or None if it has no sparse vocabulary."""
+        with self.session() as session:
+            row = session.get(CatalogSparseStats, doc_id)
+            if row is None:
+                return None
+            frequencies = dict(session.execute(
+                select(CatalogTerm.term, CatalogTerm.document_frequency)
+                .where(CatalogTerm.doc_id == doc_id, CatalogTerm.term.in_(set(terms)))
+            ).all()) if terms else {}
+            return BM25Stats(row.chunk_count, round(row.avg_length * row.chunk_count), frequencies)
+
+    def get_namespace(self, doc_id: str) -> Optional[str]:
+        """Vector namespace a document was indexed into, if it is catalogued."""
+        with self.session() as session:
+            return session.scalar(select(CatalogDocument.namespace).where(CatalogDocument.doc_id == doc_id))
+
+    def get_documents_by_file(self, file_id: str) -> List[Tuple[str, str]]:
+        """(doc_id, namespace) of the document a file links to, or of every document indexed from it."""
+        with self.session() as session:
+            rows = session.execute(
+                select(CatalogDocument.doc_id, CatalogDocument.namespace)
+                .join(CatalogFileLink, CatalogFileLink.doc_id == CatalogDocument.doc_id)
+                .where(CatalogFileLink.file_id == file_id)
+            ).all()
+            if not rows:
+                rows = session.execute(
+                    select(CatalogDocument.doc_id, CatalogDocument.namespace).where(CatalogDocument.file_id == file_id)
+                )
+            return [(doc_id, namespace or "") for doc_id, namespace in rows]
+
+    def link_file(self, file_id: str, user_id: str, doc_id: str, require_ready: bool = False) -> bool:
+        """Point a user's file at a document, taking a reference on it.
+
+        With require_ready the link is only made if the document is fully
+        indexed; returns whether the link exists afterwards.
+        """
+        with self.session() as session:
+            document = session.execute(
+                select(CatalogDocument).where(CatalogDocument.doc_id == doc_id).with_for_update()
+            ).scalar_one_or_none()
+            if document is None or (require_ready and document.status != STATUS_READY):
+                return False
+            link = session.get(CatalogFileLink, file_id)
+            if link is None:
+                session.add(CatalogFileLink(file_id=file_id, user_id=user_id, doc_id=doc_id))
+            else:
+                link.user_id, link.doc_id = user_id, doc_id
+            return True
+
+    def get_linked_document(self, file_id: str, user_id: Optional[str] = None) -> Optional[str]:
+        """doc_id a file links to; with user_id, only if that user owns the link."""
+        query = select(CatalogFileLink.doc_id).where(CatalogFileLink.file_id == file_id)
+        if user_id is not None:
+            query = query.where(CatalogFileLink.user_id == user_id)
+        with self.session() as session:
+            return session.scalar(query)
+
+    def unlink_file(self, file_id: str) -> Optional[Tuple[str, int]]:
+        """Drop a file's link, returning (doc_id, links left), or None if the file had no link.
+
+        When the last link goes, the document is marked as being deleted in
+        the same transaction so no new upload can link to it meanwhile.
+        """
+        with self.session() as session:
+            link = session.get(CatalogFileLink, file_id)
+            if link is None:
+                return None
+            doc_id = link.doc_id
+            document = session.execute(
+                select(CatalogDocument).where(CatalogDocument.doc_id == doc_id).with_for_update()
+            ).scalar_one()
+            session.delete(link)
+            session.flush()
+            remaining = session.scalar(
+                select(func.count()).select_from(CatalogFileLink).where(CatalogFileLink.doc_id == doc_id)
+            )
+            if not remaining:
+                document.status = STATUS_DELETING
+            return doc_id, remaining
+
+    def list_titles(self) -> List[str]:
+        """Sorted distinct titles of fully indexed documents."""
+        with self.session() as session:
+            return list(session.scalars(
+                select(CatalogDocument.title)
+                .where(CatalogDocument.status == STATUS_READY)
+                .distinct()
+                .order_by(CatalogDocument.title)
+            ))
+
+    def list_documents(self, namespace: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        """(doc_id, namespace, doc_hash) of fully indexed documents, optionally in one namespace."""
+        query = select(CatalogDocument.doc_id, CatalogDocument.namespace, CatalogDocument.doc_hash).where(
+            CatalogDocument.status == STATUS_READY
+        )
+        if namespace is not None:
+            query = query.where(CatalogDocument.namespace == namespace)
+        with self.session() as session:
+            rows = session.execute(query.order_by(CatalogDocument.doc_id))
+            return [(doc_id, ns or "", doc_hash) for doc_id, ns, doc_hash in rows]
+
+    def delete_documents(self, doc_ids: Sequence[str]) -> None:
+        """Remove documents and their chunk rows."""
+        if not doc_ids:
+            return
+        with self.session() as session:
+            session.execute(delete(CatalogChunk).where(CatalogChunk.doc_id.in_(doc_ids)))
+            session.execute(delete(CatalogTerm).where(CatalogTerm.doc_id.in_(doc_ids)))
+            session.execute(delete(CatalogSparseStats).where(CatalogSparseStats.doc_id.in_(doc_ids)))
+            session.execute(delete(CatalogFileLink).where(CatalogFileLink.doc_id.in_(doc_ids)))
+            session.execute(delete(CatalogDocument).where(CatalogDocument.doc_id.in_(doc_ids)))
@@ -0,0 +1,434 @@
+import asyncio
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Slots are added to the vector file this many at a time, up to max_entries
+GROWTH_SLOTS = 4096
+KEY_TAG_BYTES = 16
+
+
+def _key_tag(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=KEY_TAG_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed store of embedding vectors.
+
+    A SQLite table maps sha256(model name + text) to a row ("slot") of a
+    memory-mapped float array on disk. The array grows GROWTH_SLOTS slots
+    at a time; once max_entries slots are in use the least recently used
+    entry is evicted and its slot reused, so the file never grows past
+    max_entries * dims values.
+
+    Next to each vector the slot records a tag of the key it holds, written
+    after the vector and only once the SQLite change committed. A vector is
+    returned only if its slot carries the key's tag before and after it is
+    copied, so a slot that another process is reusing reads as a miss.
+    """
+
+    def __init__(self, cache_dir: str, dims: int, max_entries: int = 200_000, dtype: str = "float32"):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.dims = dims
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Autocommit mode so transactions are opened explicitly with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        self.vectors_path = os.path.join(cache_dir, "vectors.bin")
+        self.tags_path = os.path.join(cache_dir, "slot_keys.bin")
+        layout = f"{dims}:{max_entries}:{self.dtype.name}:tagged"
+        row = self.db.execute("SELECT value FROM settings WHERE name = 'layout'").fetchone()
+        if row is None or row[0] != layout or not all(map(os.path.exists, (self.vectors_path, self.tags_path))):
+            # Slot files missing or built with another shape: start from an empty cache
+            self.db.execute("DELETE FROM embeddings")
+            self.db.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('layout', ?)", (layout,))
+            for path in (self.vectors_path, self.tags_path):
+                open(path, "wb").close()
+        self.slots = 0
+        self.vectors: Optional[np.memmap] = None
+        self.slot_tags: Optional[np.memmap] = None
+        self._map()
+
+    def _map(self, slots: int = 0) -> None:
+        """Map the slot files, first growing them to at least slots slots (only under the write transaction)."""
+        row_bytes = self.dims * self.dtype.itemsize
+        current = min(os.path.getsize(self.vectors_path) // row_bytes, os.path.getsize(self.tags_path) // KEY_TAG_BYTES)
+        if slots > current:
+            current = min(self.max_entries, -(-slots // GROWTH_SLOTS) * GROWTH_SLOTS)
+            for path, size in ((self.vectors_path, row_bytes), (self.tags_path, KEY_TAG_BYTES)):
+                with open(path, "r+b") as file:
+                    file.truncate(current * size)
+        if current and current != self.slots:
+            self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(current, self.dims))
+            self.slot_tags = np.memmap(self.tags_path, dtype=np.uint8, mode="r+", shape=(current, KEY_TAG_BYTES))
+            self.slots = current
+
+    def _read(self, key: str, slot: int) -> Optional[np.ndarray]:
+        if slot >= self.slots:
+            return None
+        tag = _key_tag(key)
+        if self.slot_tags[slot].tobytes() != tag:
+            return None
+        vector = np.array(self.vectors[slot], dtype=np.float32)
+        # Re-checked after the copy: a writer clears the tag before it touches the vector
+        return vector if self.slot_tags[slot].tobytes() == tag else None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address of a text embedded with a given model."""
+        return hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors by key, returning None for every miss."""
+        if not keys:
+            return []
+        with self._lock:
+            slots: Dict[str, int] = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                slots.update(self.db.execute(
+                    f"SELECT key, slot FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+
+            if slots and max(slots.values()) >= self.slots:
+                # Another process grew the slot files
+                self._map()
+            found: Dict[str, np.ndarray] = {}
+            for key, slot in slots.items():
+                vector = self._read(key, slot)
+                if vector is not None:
+                    found[key] = vector
+
+            if found:
+                now = time.time()
+                self.db.execute("BEGIN")
+                self.db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.db.execute("COMMIT")
+
+            results = []
+            for key in keys:
+                if key in found:
+                    self.hits += 1
+                    results.append(found[key])
+                else:
+                    self.misses += 1
+                    results.append(None)
+            return results
+
+    def put_many(self, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+        """Store vectors, evicting least recently used entries when the cache is full."""
+        if not items:
+            return
+        items = [(key, np.asarray(vector, dtype=self.dtype).reshape(self.dims)) for key, vector in items]
+        with self._lock:
+            writes: Dict[int, Tuple[str, np.ndarray]] = {}
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                count = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                now = time.time()
+                for key, vector in items:
+                    row = self.db.execute("SELECT slot FROM embeddings WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        slot = row[0]
+                        self.db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, key))
+                        if self._read(key, slot) is not None:
+                            continue
+                    else:
+                        if count < self.max_entries:
+                            slot = count
+                            count += 1
+                        else:
+                            lru_key, slot = self.db.execute(
+                                "SELECT key, slot FROM embeddings ORDER BY last_used LIMIT 1"
+                            ).fetchone()
+                            self.db.execute("DELETE FROM embeddings WHERE key = ?", (lru_key,))
+                        self.db.execute(
+                            "INSERT INTO embeddings (key, slot, last_used) VALUES (?, ?, ?)",
+                            (key, slot, now)
+                        )
+                    writes[slot] = (key, vector)
+                self._map(count)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+            if not writes:
+                return
+            # Slots are written only once their keys are committed; until a slot's tag is set it reads as a miss
+            for slot, (key, vector) in writes.items():
+                self.slot_tags[slot] = 0
+                self.vectors[slot] = vector
+                self.slot_tags[slot] = np.frombuffer(_key_tag(key), dtype=np.uint8)
+            self.vectors.flush()
+            self.slot_tags.flush()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "max_entries": self.max_entries
+        }
+
+
+class CachedEncoder:
+    """Drop-in wrapper around an encoder that only embeds texts missing from the cache."""
+
+    def __init__(self, encoder: Any, cache: EmbeddingCache):
+        self.encoder = encoder
+        self.cache = cache
+        self.name = encoder.name
+
+    def __call__(self, docs: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(self.name, doc) for doc in docs]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing: Dict[str, str] = {}
+        for key, doc, vector in zip(keys, docs, vectors):
+            if vector is None:
+                missing.setdefault(key, doc)
+
+        if missing:
+            embeds = self.encoder(list(missing.values()))
+            fresh = dict(zip(missing.keys(), embeds))
+            self.cache.put_many(list(fresh.items()))
+            return [fresh[key] if vector is None else vector.tolist() for key, vector in zip(keys, vectors)]
+
+        return [vector.tolist() for vector in vectors]
+
+
+def build_cached_encoder(encoder: Any, dims: int) -> Any:
+    """Wrap encoder with the persistent cache configured through EMBEDDING_CACHE_* env vars.
+
+    Returns the encoder unchanged when EMBEDDING_CACHE_DIR is set to an empty string.
+    """
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "/tmp/embedding_cache")
+    if not cache_dir:
+        return encoder
+    cache = EmbeddingCache(
+        cache_dir=cache_dir,
+        dims=dims,
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+        dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+    )
+    return CachedEncoder(encoder, cache)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: surrounding whitespace stripped and inner runs collapsed."""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """In-process LRU of query embeddings keyed by normalized text, with a TTL.
+
+    Concurrent lookups of the same text, from threads or coroutines, share a
+    single embedding call. Misses can fall back to a persistent
+    EmbeddingCache before the encoder is called.
+    """
+
+    def __init__(self, encoder: Any, max_entries: int = 1024, ttl: float = 3600.0, store: Optional[EmbeddingCache] = None):
+        self.encoder = encoder
+        self.name = encoder.name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.store_hits = 0
+        self._entries: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str) -> Tuple[Optional[List[float]], Optional[Future], bool]:
+        """(cached vector, None, False), or the in-flight future for key and whether this caller must resolve it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0], None, False
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return None, future, True
+
+    def _resolve(self, key: str, future: Future, vector: Optional[List[float]] = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            del self._inflight[key]
+            if error is None and self.max_entries > 0:
+                self._entries[key] = (vector, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if error is None:
+            future.set_result(vector)
+        else:
+            future.set_exception(error)
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        return self._load_many([key]).get(key)
+
+    def _load_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        if self.store is None or not keys:
+            return {}
+        vectors = self.store.get_many([EmbeddingCache.make_key(self.name, key) for key in keys])
+        found = {key: vector.tolist() for key, vector in zip(keys, vectors) if vector is not None}
+        with self._lock:
+            self.store_hits += len(found)
+        return found
+
+    def _save(self, key: str, vector: List[float]) -> None:
+        self._save_many([(key, vector)])
+
+    def _save_many(self, items: Sequence[Tuple[str, List[float]]]) -> None:
+        if self.store is not None and items:
+            self.store.put_many([(EmbeddingCache.make_key(self.name, key), vector) for key, vector in items])
+
+    def embed(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector, future, owner = self._claim(key)
+        if vector is not None:
+            return vector
+        if not owner:
+            return future.result()
+        try:
+            vector = self._load(key)
+            if vector is None:
+                vector = self.encoder([key])[0]
+                self._save(key, vector)
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, vector)
+        return vector
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed several queries, sending every distinct text that is neither cached nor in flight in one encoder call."""
+        keys = [normalize_query(text) for text in texts]
+        resolved: Dict[str, List[float]] = {}
+        waiting: Dict[str, Future] = {}
+        owned: Dict[str, Future] = {}
+        for key in dict.fromkeys(keys):
+            vector, future, owner = self._claim(key)
+            if vector is not None:
+                resolved[key] = vector
+            elif owner:
+                owned[key] = future
+            else:
+                waiting[key] = future
+
+        if owned:
+            try:
+                fresh = self._load_many(list(owned))
+                missing = [key for key in owned if key not in fresh]
+                if missing:
+                    embedded = list(zip(missing, self.encoder(missing)))
+                    self._save_many(embedded)
+                    fresh.update(embedded)
+            except BaseException as e:
+                for key, future in owned.items():
+                    self._resolve(key, future, error=e)
+                raise
+            for key, future in owned.items():
+                self._resolve(key, future, fresh[key])
+            resolved.update(fresh)
+
+        for key, future in waiting.items():
+            resolved[key] = future.result()
+        return [resolved[key] for key in keys]
+
+    async def aembed(self, text: str) -> List[float]:
+        """Async embed: the encoder's async client is used and store lookups run in a worker thread."""
+        key = normalize_query(text)
+        vector, future, owner = self._claim(key)
+        if vector is not None:
+            return vector
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            vector = await asyncio.to_thread(self._load, key)
+            if vector is None:
+                vector = (await self.encoder.acall([key]))[0]
+                await asyncio.to_thread(self._save, key, vector)
+        except BaseException as e:
+            self._resolve(key, future, error=e)
+            raise
+        self._resolve(key, future, vector)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters; coalesced lookups waited on another caller's embedding call."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "store_hits": self.store_hits,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+def build_query_embedding_cache(encoder: Any, store: Optional[EmbeddingCache] = None) -> QueryEmbeddingCache:
+    """Query embedding cache configured through QUERY_EMBEDDING_CACHE_* env vars.
+
+    QUERY_EMBEDDING_CACHE_SIZE=0 keeps nothing but still coalesces concurrent
+    identical queries; store is only used when QUERY_EMBEDDING_CACHE_PERSIST=true.
+    """
+    persist = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() == "true"
+    return QueryEmbeddingCache(
+        encoder,
+        max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600")),
+        store=store if persist else None
+    )
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """Block until amount tokens are available, returning the seconds spent waiting.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        wait for a full bucket instead of forever.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
+
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the embedding model's tokenizer, estimating when it is unavailable."""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return max(1, len(text) // 4)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def pack_batches(token_counts: List[int], max_batch_tokens: int, max_batch_items: int) -> List[List[int]]:
+    """Greedily pack item indices, in order, into batches bounded by tokens and item count."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingDispatcher:
+    """Embed texts in token-packed batches with bounded concurrency and API rate limits.
+
+    Batches are sized by token count rather than item count and are sent
+    concurrently (at most max_concurrency in flight), each one first taking a
+    request from the requests/min bucket and its tokens from the tokens/min
+    bucket. Results always come back in input order. Wrap the API encoder
+    and put any cache in front, so cache hits neither use up the rate
+    limits nor count towards throughput.
+    """
+
+    def __init__(
+        self,
+        encoder: Any,
+        max_concurrency: int = 4,
+        max_batch_tokens: int = 8000,
+        max_batch_items: int = 2048,
+        requests_per_minute: float = 3000,
+        tokens_per_minute: float = 1_000_000
+    ):
+        self.encoder = encoder
+        self.max_concurrency = max_concurrency
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self._stats_lock = threading.Lock()
+        self.chunks_embedded = 0
+        self.tokens_embedded = 0
+        self.requests_sent = 0
+        self.seconds_busy = 0.0
+        self.seconds_throttled = 0.0
+
+    @classmethod
+    def from_env(cls, encoder: Any) -> "EmbeddingDispatcher":
+        """Build a dispatcher configured through EMBED_* env vars."""
+        return cls(
+            encoder,
+            max_concurrency=int(os.getenv("EMBED_MAX_CONCURRENCY", "4")),
+            max_batch_tokens=int(os.getenv("EMBED_BATCH_TOKENS", "8000")),
+            requests_per_minute=float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "3000")),
+            tokens_per_minute=float(os.getenv("EMBED_TOKENS_PER_MINUTE", "1000000"))
+        )
+
+    def _embed_batch(self, texts: List[str], tokens: int) -> List[List[float]]:
+        throttled = self.request_bucket.acquire(1) + self.token_bucket.acquire(tokens)
+        embeds = self.encoder(texts)
+        with self._stats_lock:
+            self.requests_sent += 1
+            self.seconds_throttled += throttled
+        return embeds
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts concurrently, returning vectors in the same order as texts."""
+        if not texts:
+            return []
+        start = time.perf_counter()
+        token_counts = [count_tokens(text) for text in texts]
+        batches = pack_batches(token_counts, self.max_batch_tokens, self.max_batch_items)
+
+        embeds: List[Optional[List[float]]] = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            futures = [
+                (batch, executor.submit(
+                    self._embed_batch,
+                    [texts[i] for i in batch],
+                    sum(token_counts[i] for i in batch)
+                ))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                for i, vector in zip(batch, future.result()):
+                    embeds[i] = vector
+
+        with self._stats_lock:
+            self.chunks_embedded += len(texts)
+            self.tokens_embedded += sum(token_counts)
+            self.seconds_busy += time.perf_counter() - start
+        return embeds
+
+    @property
+    def name(self) -> str:
+        return self.encoder.name
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        """Encoder interface, so a CachedEncoder can send only its cache misses through the dispatcher."""
+        return self.embed(texts)
+
+    @property
+    def throughput(self) -> float:
+        """Chunks embedded per second of time spent inside embed()."""
+        return self.chunks_embedded / self.seconds_busy if self.seconds_busy else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks_embedded": self.chunks_embedded,
+            "tokens_embedded": self.tokens_embedded,
+            "requests_sent": self.requests_sent,
+            "chunks_per_sec": self.throughput,
+            "seconds_throttled": self.seconds_throttled
+        }
@@ -0,0 +1,97 @@
+import queue
+import threading
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Iterable, List, Optional
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one upsert batch."""
+    index: int
+    size: int
+    error: Optional[str] = None
+
+
+_DONE = object()
+
+
+def run_embed_upsert_pipeline(
+    batches: Iterable[List[Any]],
+    embed_fn: Callable[[List[Any]], List[Any]],
+    upsert_fn: Callable[[List[Any], List[Any]], None],
+    group_size: int = 1,
+    max_pending: int = 2
+) -> List[BatchResult]:
+    """Embed upcoming batches in a producer thread while the caller upserts earlier ones.
+
+    The producer pulls group_size batches at a time from batches, embeds them
+    with a single embed_fn call (so a concurrent dispatcher can work on them
+    together) and queues each batch with its vectors. At most max_pending
+    embedded batches wait in the queue, which bounds memory and keeps the
+    producer from racing ahead of the vector store.
+
+    A failed embed or upsert is recorded on the affected batches and the
+    pipeline moves on. An exception raised while producing batches (e.g. by
+    the splitter) stops the pipeline and is re-raised here.
+    """
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    results: List[BatchResult] = []
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            iterator = iter(batches)
+            index = 0
+            while not stop.is_set():
+                group = list(islice(iterator, group_size))
+                if not group:
+                    break
+                try:
+                    embeds = embed_fn([item for batch in group for item in batch])
+                    error = None
+                except Exception as e:
+                    embeds, error = [], str(e)
+
+                offset = 0
+                for batch in group:
+                    batch_embeds = embeds[offset:offset + len(batch)] if error is None else None
+                    offset += len(batch)
+                    if not put((index, batch, batch_embeds, error)):
+                        return
+                    index += 1
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name="embed-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            index, batch, embeds, error = item
+            if error is None:
+                try:
+                    upsert_fn(batch, embeds)
+                except Exception as e:
+                    error = str(e)
+            results.append(BatchResult(index=index, size=len(batch), error=error))
+    finally:
+        stop.set()
+        producer.join()
+
+    return results
@@ -0,0 +1,105 @@
+import os
+from typing import Dict, List, Optional, Type
+
+import PyPDF2
+
+
+class PDFBackend:
+    """Interface for PDF text extraction backends.
+
+    Backends must be cheap to construct and hold no open file handles between
+    calls, because the extraction engine rebuilds them inside worker processes.
+    """
+    name: str = ""
+
+    def page_count(self, file_path: str) -> int:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[str]:
+        """Return the text of pages [start, end), one string per page."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class PyPDF2Backend(PDFBackend):
+    name = "pypdf2"
+
+    def page_count(self, file_path: str) -> int:
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[str]:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+class PyPdfium2Backend(PDFBackend):
+    """PDFium (C++) based backend, usually the fastest option."""
+    name = "pypdfium2"
+
+    def __init__(self):
+        import pypdfium2
+        self._pdfium = pypdfium2
+
+    def page_count(self, file_path: str) -> int:
+        pdf = self._pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[str]:
+        pdf = self._pdfium.PdfDocument(file_path)
+        try:
+            texts = []
+            for i in range(start, end):
+                page = pdf[i]
+                text_page = page.get_textpage()
+                texts.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+            return texts
+        finally:
+            pdf.close()
+
+
+class PdfMinerBackend(PDFBackend):
+    """pdfminer.six backend, pure Python with layout-aware text ordering."""
+    name = "pdfminer"
+
+    def __init__(self):
+        from pdfminer import high_level, layout, pdfpage
+        self._high_level = high_level
+        self._layout = layout
+        self._pdfpage = pdfpage
+
+    def page_count(self, file_path: str) -> int:
+        with open(file_path, 'rb') as file:
+            return sum(1 for _ in self._pdfpage.PDFPage.get_pages(file))
+
+    def extract_pages(self, file_path: str, start: int, end: int) -> List[str]:
+        texts = []
+        for page_layout in self._high_level.extract_pages(file_path, page_numbers=range(start, end)):
+            texts.append("".join(
+                element.get_text() for element in page_layout
+                if isinstance(element, self._layout.LTTextContainer)
+            ))
+        return texts
+
+
+PDF_BACKENDS: Dict[str, Type[PDFBackend]] = {
+    PyPDF2Backend.name: PyPDF2Backend,
+    PyPdfium2Backend.name: PyPdfium2Backend,
+    PdfMinerBackend.name: PdfMinerBackend,
+}
+
+
+def get_backend(name: Optional[str] = None) -> PDFBackend:
+    """Build the backend called name, falling back to the PDF_PARSER_BACKEND env var."""
+    name = (name or os.getenv("PDF_PARSER_BACKEND", PyPDF2Backend.name)).lower()
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}'. Available: {', '.join(PDF_BACKENDS)}")
+    try:
+        return PDF_BACKENDS[name]()
+    except ImportError as e:
+        raise ImportError(f"PDF backend '{name}' is not installed: {str(e)}") from e
@@ -0,0 +1,116 @@
+"""Benchmark PDF parser backends on a local corpus.
+
+Usage:
+    python -m agents.utils.pdf_benchmark /path/to/pdfs --backends pypdf2 pypdfium2 pdfminer
+
+Every (backend, file) pair runs in a fresh process so the reported peak RSS
+belongs to that backend alone. Text quality is reported as word recall
+against the reference backend (PyPDF2 unless --reference says otherwise).
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from agents.utils.pdf_backends import PDF_BACKENDS, PyPDF2Backend
+from agents.utils.pdf_extraction import extract_text
+
+
+def _run_single(backend_name: str, file_path: str, workers: int) -> Dict[str, Any]:
+    """Extract one file with one backend (runs inside a fresh process)."""
+    start = time.perf_counter()
+    extracted = extract_text(file_path, workers=workers, backend=backend_name)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": extracted.pages,
+        "seconds": elapsed,
+        "content": extracted.content,
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def word_recall(reference: str, candidate: str) -> float:
+    """Fraction of the reference's words (with multiplicity) that the candidate also produced."""
+    reference_words = Counter(reference.split())
+    total = sum(reference_words.values())
+    if not total:
+        return 1.0
+    overlap = reference_words & Counter(candidate.split())
+    return sum(overlap.values()) / total
+
+
+def run_benchmark(
+    corpus_dir: str,
+    backends: List[str],
+    reference: str = PyPDF2Backend.name,
+    workers: int = 1
+) -> List[Dict[str, Any]]:
+    """Run every backend over every PDF in corpus_dir and aggregate the results per backend."""
+    files = sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+        if name.lower().endswith(".pdf")
+    )
+    if not files:
+        raise ValueError(f"No PDF files found in {corpus_dir}")
+
+    context = multiprocessing.get_context("spawn")
+    runs: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+    for backend_name in dict.fromkeys([reference, *backends]):
+        runs[backend_name] = {}
+        for file_path in files:
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs[backend_name][file_path] = executor.submit(
+                        _run_single, backend_name, file_path, workers
+                    ).result()
+            except Exception as e:
+                print(f"Error running {backend_name} on {file_path}: {str(e)}")
+                runs[backend_name][file_path] = None
+
+    results = []
+    for backend_name in backends:
+        completed = {f: r for f, r in runs[backend_name].items() if r is not None}
+        pages = sum(r["pages"] for r in completed.values())
+        seconds = sum(r["seconds"] for r in completed.values())
+        recalls = [
+            word_recall(runs[reference][f]["content"], r["content"])
+            for f, r in completed.items() if runs[reference].get(f) is not None
+        ]
+        results.append({
+            "backend": backend_name,
+            "files": len(completed),
+            "failed": len(files) - len(completed),
+            "pages": pages,
+            "pages_per_sec": pages / seconds if seconds else 0.0,
+            "peak_rss_mb": max((r["peak_rss_mb"] for r in completed.values()), default=0.0),
+            "word_recall": sum(recalls) / len(recalls) if recalls else 0.0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF parser backends")
+    parser.add_argument("corpus_dir", help="Directory of PDFs to parse")
+    parser.add_argument("--backends", nargs="+", default=list(PDF_BACKENDS), choices=list(PDF_BACKENDS))
+    parser.add_argument("--reference", default=PyPDF2Backend.name, choices=list(PDF_BACKENDS))
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.corpus_dir, args.backends, args.reference, args.workers)
+
+    print(f"\n{'backend':<12}{'files':>7}{'failed':>8}{'pages':>8}{'pages/s':>10}{'peak MB':>10}{'recall':>9}")
+    print("-" * 64)
+    for r in sorted(results, key=lambda r: r["pages_per_sec"], reverse=True):
+        print(
+            f"{r['backend']:<12}{r['files']:>7}{r['failed']:>8}{r['pages']:>8}"
+            f"{r['pages_per_sec']:>10.1f}{r['peak_rss_mb']:>10.1f}{r['word_recall']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,75 @@
+import asyncio
 import os
 from getpass import getpass
 from semantic_router.encoders import OpenAIEncoder
-from semantic_router.splitters import RollingWindowSplitter
 from semantic_router.utils.logger import logger
 from semantic_router.schema import DocumentSplit
-import PyPDF2
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Callable, Sequence
 from datetime import datetime
-from pinecone import Pinecone, ServerlessSpec
-import time
 from tqdm.auto import tqdm
 from dotenv import load_dotenv
 import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from agents.utils.chunk_diff import chunk_fingerprint, diff_chunks, iter_linked_chunks
+from agents.utils.chunk_store import ChunkTextStore, split_chunk_metadata
+from agents.utils.context_assembler import pack_context
+from agents.utils.context_windows import CONTEXT_AFTER, CONTEXT_BEFORE, assemble_context_windows, iter_with_context_windows
+from agents.utils.document_catalog import DocumentCatalog
+from agents.utils.embedding_cache import build_cached_encoder, build_query_embedding_cache
+from agents.utils.embedding_dispatcher import EmbeddingDispatcher
+from agents.utils.ingest_pipeline import run_embed_upsert_pipeline
+from agents.utils.sparse_encoder import BM25Stats, SparseVector, encode_document, encode_query, hybrid_scale, tokenize
+from agents.utils.sentence_pooling import RecordingRollingWindowSplitter, pool_split_embeddings
+from agents.utils.pdf_extraction import extract_text, iter_page_windows
+from agents.utils.pdf_backends import get_backend
+from agents.utils.retrieval_cache import RetrievalCache, retrieval_tags
+from agents.utils.retrieval_session import EXTEND, REFRESH, REUSE, RetrievalSessionStore
+from agents.utils.vector_store import build_vector_store
 
 load_dotenv()
+
+# doc_id prefix of documents shared by every upload of the same file bytes
+SHARED_DOC_PREFIX = "content_"
+
+# Output sizes of the OpenAI embedding models, so startup needs no probe request
+KNOWN_EMBEDDING_DIMS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536
+}
+
+def embedding_dimensions(encoder: Any) -> int:
+    """Embedding size from EMBEDDING_DIMENSIONS, else the known model size, else one probe request."""
+    configured = os.getenv("EMBEDDING_DIMENSIONS")
+    if configured:
+        return int(configured)
+    if encoder.name in KNOWN_EMBEDDING_DIMS:
+        return KNOWN_EMBEDDING_DIMS[encoder.name]
+    return len(encoder(["test"])[0])
+
+def build_splitter(encoder: Any, sentence_encoder: Optional[Any] = None) -> RecordingRollingWindowSplitter:
+    """Build the semantic splitter used for chunking documents."""
+    return RecordingRollingWindowSplitter(
+        encoder=encoder,
+        sentence_encoder=sentence_encoder,
+        dynamic_threshold=True,
+        min_split_tokens=100,
+        max_split_tokens=500,
+        window_size=2,
+        # plot_splits=True,
+        enable_statistics=True
+    )
+
 class PDFProcessor:
-    def __init__(self, openai_api_key: str, pinecone_api_key: str, pinecone_index_name: str):
+    def __init__(
+        self,
+        openai_api_key: str,
+        pinecone_api_key: str,
+        pinecone_index_name: str,
+        catalog: Optional[DocumentCatalog] = None
+    ):
         """Initialize the PDF processor with necessary components."""
         openai_api_key = os.getenv("OPENAI_API_KEY")
         pinecone_api_key = os.getenv("PINECONE_API_KEY")
@@ -23,73 +77,55 @@ class PDFProcessor:
         self.encoder = OpenAIEncoder(name="text-embedding-3-small")
         logger.setLevel("WARNING")
         
-        self.pc = Pinecone(api_key=pinecone_api_key)
-        print(f"DEBUG: {len(self.encoder(["test"])[0])}")
-        self.dims = len(self.encoder(["test"])[0])
+        self.dims = embedding_dimensions(self.encoder)
+        self.embedding_dispatcher = EmbeddingDispatcher.from_env(self.encoder)
+        # Chunk embeddings go through a persistent cache so unchanged chunks are never re-embedded;
+        # only its misses reach the dispatcher and its rate limits
+        self.chunk_encoder = build_cached_encoder(self.embedding_dispatcher, self.dims)
+        # Query embeddings are cached in process (optionally backed by the chunk cache); identical concurrent queries embed once
+        self.query_embeddings = build_query_embedding_cache(self.encoder, store=getattr(self.chunk_encoder, "cache", None))
+        # Assembled query results per (scope, query, top_k, model); re-indexing or deleting a document invalidates its entries
+        self.retrieval_cache = RetrievalCache.from_env()
+        # Per-conversation working sets of passages; follow-up turns close to a conversation's topic skip the search
+        self.retrieval_sessions = RetrievalSessionStore.from_env()
         
-        self.splitter = RollingWindowSplitter(
-            encoder=self.encoder,
-            dynamic_threshold=True,
-            min_split_tokens=100,
-            max_split_tokens=500,
-            window_size=2,
-            # plot_splits=True,
-            enable_statistics=True
+        # "reembed" embeds every chunk again (high fidelity); "pooled" reuses the splitter's sentence embeddings
+        self.chunk_embedding_mode = os.getenv("CHUNK_EMBEDDING_MODE", "reembed")
+        # Sentence embeddings are cached too, so re-splitting an edited document only embeds new sentences
+        self.splitter = build_splitter(self.encoder, sentence_encoder=self.chunk_encoder)
+        # Characters of neighbouring text stored with each chunk so queries need no neighbour fetches (0 disables)
+        self.context_window_chars = int(os.getenv("CONTEXT_WINDOW_CHARS", "400"))
+        # Retrieved passages are packed into this many tokens (0: no limit), picked in MMR order
+        # (CONTEXT_MMR_LAMBDA 1 ranks by relevance only, lower values favour diverse passages)
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+        self.context_mmr_lambda = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+        # "bm25" stores a sparse BM25 vector with every chunk and the document's term statistics in the catalog;
+        # queries weight dense against sparse scores by HYBRID_ALPHA (1 is dense only)
+        self.sparse_mode = os.getenv("SPARSE_VECTORS", "bm25")
+        self.hybrid_alpha = float(os.getenv("HYBRID_ALPHA", "0.7"))
+        
+        # Document and chunk bookkeeping lives in Postgres, not in vector metadata scans
+        self.catalog = catalog or DocumentCatalog.from_env()
+        # "postgres" keeps chunk text in the database and only ids and filter fields on the vectors;
+        # "index" stores everything as vector metadata
+        self.chunk_store = (
+            ChunkTextStore(self.catalog.engine) if os.getenv("CHUNK_TEXT_STORE", "postgres") == "postgres" else None
         )
+        # "file" gives every upload its own namespace, "user" one per user, "shared" keeps everything in the default one
+        self.namespace_mode = os.getenv("VECTOR_NAMESPACE_MODE", "file")
+        # "content" indexes identical uploads once and links every user's file to the shared chunk set
+        self.dedup_mode = os.getenv("DOCUMENT_DEDUP", "content")
         
         self.index = None
         self.create_index(index_name=pinecone_index_name)
 
     def create_index(self, index_name: str = "pdf-semantic-chunking1"):
-        """Create and initialize Pinecone index."""
-        # Setup serverless specification
-        spec = ServerlessSpec(cloud="aws", region="us-east-1")
-        
-        # Check if index exists
-        if index_name in self.pc.list_indexes().names():
-            # If exists, just connect to it
-            self.index = self.pc.Index(index_name)
-            logger.info(f"Connected to existing index: {index_name}")
-        else:
-            # Create new index if it doesn't exist
-            self.pc.create_index(
-                name=index_name,
-                dimension=self.dims,
-                metric='dotproduct',
-                spec=spec
-            )
-            # Wait for index to be initialized
-            while not self.pc.describe_index(index_name).status['ready']:
-                time.sleep(5)
-            
-            # Connect to index
-            self.index = self.pc.Index(index_name)
-
-            logger.info(f"Created and initialized new index: {index_name}")
-        
-        time.sleep(5)  # Small delay to ensure connection is established
-        print(f"DEBUG: Pinecone index connected with {self.dims} dimensions")
-        return self.index.describe_index_stats()
-        # """Create and initialize Pinecone index."""
-        # # Setup serverless specification
-        # spec = ServerlessSpec(cloud="aws", region="us-east-1")
-        
-        # # Create index if it doesn't exist
-        # if index_name not in self.pc.list_indexes().names():
-        #     self.pc.create_index(
-        #         name=index_name,
-        #         dimension=self.dims,
-        #         metric='dotproduct',
-        #         spec=spec
-        #     )
-        #     # Wait for index to be initialized
-        #     while not self.pc.describe_index(index_name).status['ready']:
-        #         time.sleep(1)
-        
-        # # Connect to index
-        # self.index = self.pc.Index(index_name)
-        # time.sleep(1)
-        # return self.index.describe_index_stats()
+        """Open the configured vector store (VECTOR_STORE), creating the index if needed."""
+        self.index_name = index_name
+        self.index = build_vector_store(self.dims, index_name)
+        logger.info(f"Connected to {self.index.name} index: {index_name}")
+        logger.debug(f"{self.index.name} index connected with {self.dims} dimensions")
+        return self.index.stats()
 
     def build_chunk(self, title: str, content: str) -> str:
         """Format chunk with title for embedding."""
@@ -100,90 +136,321 @@ class PDFProcessor:
         hash_input = f"{content}{metadata.get('title', '')}{metadata.get('processed_date', '')}"
         return hashlib.sha256(hash_input.encode()).hexdigest()
 
-    def check_document_exists(self, doc_hash: str) -> Tuple[bool, List[str]]:
-        """Check if a document with the same hash exists in the index."""
-        if not self.index:
-            raise ValueError("Index not initialized. Call create_index() first.")
+    def calculate_file_hash(self, file_path: str, metadata: Dict[str, Any]) -> str:
+        """Calculate a document hash from the raw PDF bytes, reading the file in blocks."""
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        sha.update(f"{metadata.get('title', '')}{metadata.get('processed_date', '')}".encode())
+        return sha.hexdigest()
 
-        # Query the index for chunks with matching document hash
-        query_response = self.index.query(
-            vector=[0] * self.dims,  # Dummy vector for metadata-only query
-            top_k=1,
-            filter={"doc_hash": doc_hash},
-            include_metadata=True
-        )
+    def calculate_content_hash(self, file_path: str) -> str:
+        """Hash of the raw file bytes alone, identical for every upload of the same PDF."""
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
 
-        exists = len(query_response.matches) > 0
-        
-        if exists:
-            # Fetch all chunk IDs for this document
-            fetch_response = self.index.query(
-                vector=[0] * self.dims,
-                top_k=10000,  # Large number to get all chunks
-                filter={"doc_hash": doc_hash},
-                include_metadata=True
-            )
-            chunk_ids = [match.id for match in fetch_response.matches]
-            return True, chunk_ids
-        
-        return False, []
+    def shared_doc_id(self, content_hash: str) -> str:
+        """doc_id (and namespace) of the shared document for a file content hash."""
+        return f"{SHARED_DOC_PREFIX}{content_hash[:32]}"
+
+    def link_existing_document(self, content_hash: str, file_id: str, user_id: str) -> Optional[int]:
+        """Link a file to the already indexed document with the same bytes, returning its chunk count.
+
+        Returns None (and links nothing) when no such document is ready yet.
+        """
+        doc_id = self.shared_doc_id(content_hash)
+        if not self.catalog.link_file(file_id, user_id, doc_id, require_ready=True):
+            return None
+        self.invalidate_tags(retrieval_tags(file_id=file_id))
+        return len(self.catalog.get_chunk_ids(doc_id))
 
-    def delete_document_chunks(self, chunk_ids: List[str]) -> bool:
+    def check_document_exists(self, doc_hash: str) -> Tuple[bool, List[str]]:
+        """Check if a document with the same hash is indexed, returning its chunk ids."""
+        doc_id = self.catalog.find_by_hash(doc_hash)
+        if doc_id is None:
+            return False, []
+        return True, self.catalog.get_chunk_ids(doc_id)
+
+    def namespace_for(
+        self,
+        user_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        doc_id: Optional[str] = None
+    ) -> str:
+        """Vector namespace that holds a user's, file's or shared document's chunks under the configured mode."""
+        if self.namespace_mode in ("file", "user") and doc_id and doc_id.startswith(SHARED_DOC_PREFIX):
+            return doc_id
+        if self.namespace_mode == "file" and file_id:
+            return f"file_{file_id}"
+        if self.namespace_mode in ("file", "user") and user_id:
+            return f"user_{user_id}"
+        return ""
+
+    def delete_document_chunks(self, chunk_ids: List[str], namespace: str = "", batch_size: int = 1000) -> bool:
         """Delete specific chunks from the index."""
         try:
-            if chunk_ids:
-                self.index.delete(ids=chunk_ids)
+            for i in range(0, len(chunk_ids), batch_size):
+                self.index.delete(ids=chunk_ids[i:i+batch_size], namespace=namespace)
+            if self.chunk_store is not None:
+                self.chunk_store.delete_many(chunk_ids)
             return True
         except Exception as e:
             print(f"Error deleting chunks: {str(e)}")
             return False
 
+    def get_document_chunks(self, doc_id: str) -> Dict[str, str]:
+        """Return chunk id -> metadata fingerprint for every stored chunk of a document."""
+        return self.catalog.get_chunk_fingerprints(doc_id)
+
+    def get_reusable_chunks(self, doc_id: str, namespace: str, incremental: bool = True) -> Dict[str, str]:
+        """Stored chunks a re-index can build on; anything else of the document is deleted first.
+
+        Chunks are only reusable when incremental is set and the document was
+        indexed into the same namespace it is being indexed into now.
+        """
+        existing = self.get_document_chunks(doc_id)
+        previous_namespace = self.catalog.get_namespace(doc_id) or ""
+        if existing and (not incremental or previous_namespace != namespace):
+            if not self.delete_document_chunks(list(existing), namespace=previous_namespace):
+                raise Exception("Failed to delete existing document chunks")
+            return {}
+        return existing
+
+    def fetch_vectors(self, chunk_ids: List[str], namespace: str = "", batch_size: int = 100) -> Dict[str, List[float]]:
+        """Fetch stored vectors for chunk ids, batch_size ids per request."""
+        vectors = {}
+        for i in range(0, len(chunk_ids), batch_size):
+            fetched = self.index.fetch(chunk_ids[i:i+batch_size], namespace=namespace)
+            vectors.update({chunk_id: match.values for chunk_id, match in fetched.items()})
+        return vectors
+
+    def build_chunk_metadata(
+        self,
+        doc: Dict[str, Any],
+        chunk_id: str,
+        content: str,
+        prechunk_id: str,
+        postchunk_id: str
+    ) -> Dict[str, Any]:
+        """Create metadata for one chunk of a document."""
+        metadata = {
+            "id": chunk_id,
+            "title": doc["title"],
+            "content": content,
+            "prechunk_id": prechunk_id,
+            "postchunk_id": postchunk_id,
+            "doc_id": doc["doc_id"],
+            "pages": doc["pages"],
+            "processed_date": doc["processed_date"],
+            "references": doc["references"]
+        }
+        # Owner fields let queries be scoped to a file even inside a shared namespace
+        for key in ("file_id", "user_id"):
+            if doc.get(key):
+                metadata[key] = doc[key]
+        return metadata
+
+    def iter_chunk_metadata(
+        self,
+        doc: Dict[str, Any],
+        items: Iterable[Tuple[str, Any]]
+    ) -> Iterator[Tuple[Dict[str, Any], Any]]:
+        """Yield (metadata, payload) for (content, payload) items in document order.
+
+        Chunk ids are derived from the chunk text, so a chunk keeps its id
+        (and its stored vector) when other parts of the document change.
+        When chunk text is kept in the index, each chunk also stores
+        context_window_chars of its neighbours' text.
+        """
+        chunks = (
+            (self.build_chunk_metadata(doc, chunk_id, content, prechunk_id, postchunk_id), payload)
+            for chunk_id, prechunk_id, postchunk_id, content, payload in iter_linked_chunks(doc["doc_id"], items)
+        )
+        if self.context_window_chars > 0 and self.chunk_store is None:
+            chunks = iter_with_context_windows(chunks, self.context_window_chars)
+        yield from chunks
+
     def build_metadata(self, doc: Dict[str, Any], doc_splits: List[DocumentSplit]) -> List[Dict[str, Any]]:
         """Create metadata for each chunk including contextual information."""
-        metadata = []
-        for i, split in enumerate(doc_splits):
-            chunk_id = f"{doc['doc_id']}#{i}"
-            prechunk_id = "" if i == 0 else f"{doc['doc_id']}#{i-1}"
-            postchunk_id = "" if i+1 == len(doc_splits) else f"{doc['doc_id']}#{i+1}"
-            
-            metadata.append({
-                "id": chunk_id,
-                "title": doc["title"],
-                "content": split.content,
-                "prechunk_id": prechunk_id,
-                "postchunk_id": postchunk_id,
-                "doc_id": doc["doc_id"],
-                "pages": doc["pages"],
-                "processed_date": doc["processed_date"],
-                "references": doc["references"]
-            })
-        return metadata
+        return [m for m, _ in self.iter_chunk_metadata(doc, ((split.content, None) for split in doc_splits))]
+
+    def read_pdf(self, file_path: str, workers: Optional[int] = None, backend: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Read PDF and extract content with metadata.
 
-    def read_pdf(self, file_path: str) -> Optional[Dict[str, Any]]:
-        """Read PDF and extract content with metadata."""
+        With workers > 1 pages are extracted in parallel worker processes
+        (defaults to the PDF_EXTRACT_WORKERS env var, serial when unset).
+        backend picks the parser (defaults to PDF_PARSER_BACKEND, then PyPDF2).
+        """
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                
-                doc_info = {
-                    "file_path": file_path,
-                    "title": os.path.splitext(os.path.basename(file_path))[0],
-                    "pages": len(pdf_reader.pages),
-                    "content": text,
-                    "processed_date": datetime.now().isoformat(),
-                    "doc_id": f"doc_{hash(file_path)}",
-                    "references": []
-                }
-                return doc_info
+            extracted = extract_text(file_path, workers=workers, backend=backend)
+
+            doc_info = self.describe_pdf(file_path, pages=extracted.pages)
+            doc_info.update({
+                "content": extracted.content,
+                "page_char_offsets": extracted.page_char_offsets,
+                "page_byte_offsets": extracted.page_byte_offsets
+            })
+            return doc_info
         except Exception as e:
             print(f"Error reading PDF: {str(e)}")
             return None
 
-    def index_document(self, doc_info: Dict[str, Any], batch_size: int = 128, overwrite: bool = False) -> Tuple[int, bool]:
-        """Index document chunks with validation."""
+    def describe_pdf(self, file_path: str, pages: Optional[int] = None) -> Dict[str, Any]:
+        """Build document metadata without extracting the PDF text."""
+        if pages is None:
+            pages = get_backend().page_count(file_path)
+        return {
+            "file_path": file_path,
+            "title": os.path.splitext(os.path.basename(file_path))[0],
+            "pages": pages,
+            "processed_date": datetime.now().isoformat(),
+            "doc_id": f"doc_{hashlib.sha256(file_path.encode()).hexdigest()[:16]}",
+            "references": []
+        }
+
+    def split_text(self, text: str, pooled: bool = False) -> Tuple[List[DocumentSplit], Optional[List[List[float]]]]:
+        """Split text, also returning pooled chunk vectors when pooled is set."""
+        if not pooled:
+            return self.splitter([text]), None
+        splits, sentence_embeddings = self.splitter.split_with_embeddings([text])
+        return splits, pool_split_embeddings(splits, sentence_embeddings)
+
+    def iter_document_splits(
+        self,
+        file_path: str,
+        window_pages: int,
+        pooled: bool = False
+    ) -> Iterator[Tuple[DocumentSplit, Optional[List[float]]]]:
+        """Split a PDF window by window instead of all at once, yielding (split, pooled vector).
+
+        The last split of every window is held back and prepended to the next
+        window, so chunk boundaries near a window edge are still chosen with
+        text on both sides. Memory is bounded by one window plus that overlap.
+        The vector is None unless pooled is set.
+        """
+        carry = ""
+        windows = iter_page_windows(file_path, window_pages)
+        window = next(windows, None)
+        while window is not None:
+            next_window = next(windows, None)
+            text = f"{carry} {window[2]}" if carry else window[2]
+            window = next_window
+            if not text.strip():
+                continue
+
+            splits, vectors = self.split_text(text, pooled)
+            pairs = list(zip(splits, vectors or [None] * len(splits)))
+            if next_window is None:
+                yield from pairs
+                break
+            yield from pairs[:-1]
+            carry = splits[-1].content
+
+    def index_document_stream(
+        self,
+        file_path: str,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        window_pages: Optional[int] = None,
+        batch_size: int = 128,
+        overwrite: bool = False,
+        embedding_mode: Optional[str] = None
+    ) -> Tuple[int, bool]:
+        """Index a PDF with bounded memory: read, split, embed and upsert window by window.
+
+        Unlike index_document the full text is never materialised, so the
+        document hash is taken over the raw file bytes.
+        """
+        if not self.index:
+            raise ValueError("Index not initialized. Call create_index() first.")
+        if window_pages is None:
+            window_pages = int(os.getenv("PDF_STREAM_WINDOW_PAGES", "20"))
+
+        doc_info = self.describe_pdf(file_path)
+        doc_info.update(extra_metadata or {})
+        doc_hash = self.calculate_file_hash(file_path, doc_info)
+
+        exists, _ = self.check_document_exists(doc_hash)
+
+        if exists and not overwrite:
+            print(f"Document '{doc_info['title']}' already exists in the index.")
+            return 0, False
+
+        # Chunk ids are content-addressed: unchanged chunks are upserted in place
+        # (their embeddings come from the cache) and stale ones are removed afterwards
+        namespace = self.namespace_for(doc_info.get("user_id"), doc_info.get("file_id"), doc_info.get("doc_id"))
+        existing_ids = set(self.get_reusable_chunks(doc_info["doc_id"], namespace))
+        indexed_chunks = []
+        num_chunks = 0
+        pooled = (embedding_mode or self.chunk_embedding_mode) == "pooled"
+        pooled_vectors = {} if pooled else None
+        # The mean chunk length is only known at the end, so chunks are weighted by the running mean
+        term_stats = BM25Stats() if self.sparse_mode == "bm25" else None
+
+        def metadata_batches() -> Iterator[List[Dict[str, Any]]]:
+            nonlocal num_chunks
+            metadata_batch = []
+            splits = self.iter_document_splits(file_path, window_pages, pooled)
+            for m, vector in self.iter_chunk_metadata(doc_info, ((split.content, v) for split, v in splits)):
+                m["doc_hash"] = doc_hash
+                if term_stats is not None:
+                    term_stats.add(tokenize(m["content"]))
+                if pooled:
+                    pooled_vectors[m["id"]] = vector
+                metadata_batch.append(m)
+                indexed_chunks.append((m["id"], chunk_fingerprint(m)))
+                num_chunks += 1
+
+                if len(metadata_batch) == batch_size:
+                    yield metadata_batch
+                    metadata_batch = []
+            if metadata_batch:
+                yield metadata_batch
+
+        self.catalog.begin_indexing(doc_info, embedding_model=self.encoder.name, namespace=namespace)
+        try:
+            # Splitting runs in the pipeline's producer thread, so it overlaps with upserts too
+            self.embed_and_upsert(
+                metadata_batches(),
+                vectors=pooled_vectors,
+                namespace=namespace,
+                sparse_encoder=self.sparse_encoder(term_stats)
+            )
+
+            stale_ids = list(existing_ids - {chunk_id for chunk_id, _ in indexed_chunks})
+            if not self.delete_document_chunks(stale_ids, namespace=namespace):
+                raise Exception("Failed to delete stale document chunks")
+            self.catalog.complete_indexing(doc_info["doc_id"], doc_hash, indexed_chunks, term_stats=term_stats)
+        except Exception:
+            self.catalog.mark_failed(doc_info["doc_id"])
+            raise
+        finally:
+            self.invalidate_retrieval(doc_info)
+
+        return num_chunks, exists or bool(existing_ids)
+
+    def index_document(
+        self,
+        doc_info: Dict[str, Any],
+        batch_size: int = 128,
+        overwrite: bool = False,
+        embedding_mode: Optional[str] = None,
+        incremental: bool = True
+    ) -> Tuple[int, bool]:
+        """Index document chunks with validation.
+
+        embedding_mode overrides CHUNK_EMBEDDING_MODE: "reembed" embeds every
+        chunk, "pooled" derives chunk vectors from the splitter's sentence
+        embeddings and makes no further embedding calls.
+
+        When incremental is set and the document (by doc_id) is already
+        indexed, only new chunks are embedded; unchanged chunks whose
+        neighbours moved keep their stored vector and only get new metadata,
+        and chunks that no longer exist are deleted.
+        """
         if not self.index:
             raise ValueError("Index not initialized. Call create_index() first.")
             
@@ -191,18 +458,18 @@ class PDFProcessor:
         doc_hash = self.calculate_document_hash(doc_info["content"], doc_info)
         
         # Check if document exists
-        exists, existing_chunks = self.check_document_exists(doc_hash)
+        exists, _ = self.check_document_exists(doc_hash)
         
         if exists and not overwrite:
             print(f"Document '{doc_info['title']}' already exists in the index.")
             return 0, False
             
-        if exists and overwrite:
-            if not self.delete_document_chunks(existing_chunks):
-                raise Exception("Failed to delete existing document chunks")
+        namespace = self.namespace_for(doc_info.get("user_id"), doc_info.get("file_id"), doc_info.get("doc_id"))
+        existing = self.get_reusable_chunks(doc_info["doc_id"], namespace, incremental)
         
         # Create splits
-        splits = self.splitter([doc_info["content"]])
+        pooled = (embedding_mode or self.chunk_embedding_mode) == "pooled"
+        splits, vectors = self.split_text(doc_info["content"], pooled)
         
         # Create metadata
         metadata = self.build_metadata(doc=doc_info, doc_splits=splits)
@@ -210,103 +477,454 @@ class PDFProcessor:
         # Add document hash
         for m in metadata:
             m["doc_hash"] = doc_hash
+
+        diff = diff_chunks(existing, metadata)
+        term_stats = BM25Stats.from_texts(m["content"] for m in metadata) if self.sparse_mode == "bm25" else None
+        # Sparse vectors are weighted by the mean chunk length, so when it moved (or the
+        # document had no sparse vectors yet) unchanged chunks are upserted again as well
+        resparse = []
+        if existing and term_stats is not None:
+            previous = self.catalog.get_term_stats(doc_info["doc_id"], [])
+            if previous is None or not math.isclose(previous.avg_length, term_stats.avg_length):
+                changed_ids = {m["id"] for m in diff.to_embed + diff.to_relink}
+                resparse = [m for m in metadata if m["id"] not in changed_ids]
+        precomputed = {m["id"]: v for m, v in zip(metadata, vectors)} if pooled else {}
+        # Relinked chunks keep their stored vector; any that cannot be fetched are embedded again
+        precomputed.update(self.fetch_vectors(
+            [m["id"] for m in diff.to_relink + resparse if m["id"] not in precomputed], namespace=namespace
+        ))
+        changed = diff.to_embed + diff.to_relink + resparse
         
-        # Process in batches
-        for i in range(0, len(splits), batch_size):
-            i_end = min(len(splits), i+batch_size)
-            metadata_batch = metadata[i:i_end]
+        self.catalog.begin_indexing(doc_info, embedding_model=self.encoder.name, namespace=namespace)
+        try:
+            # Process in batches
+            self.embed_and_upsert(
+                (changed[i:i+batch_size] for i in range(0, len(changed), batch_size)),
+                vectors=precomputed,
+                namespace=namespace,
+                sparse_encoder=self.sparse_encoder(term_stats)
+            )
+
+            # Stale chunks are removed only after their replacements are stored
+            if not self.delete_document_chunks(diff.to_delete, namespace=namespace):
+                raise Exception("Failed to delete stale document chunks")
+            self.catalog.complete_indexing(
+                doc_info["doc_id"],
+                doc_hash,
+                [(m["id"], chunk_fingerprint(m)) for m in metadata],
+                term_stats=term_stats
+            )
+        except Exception:
+            self.catalog.mark_failed(doc_info["doc_id"])
+            raise
+        finally:
+            self.invalidate_retrieval(doc_info)
+        print(
+            f"Indexed '{doc_info['title']}': {len(diff.to_embed)} new, {len(diff.to_relink)} relinked, "
+            f"{len(diff.to_delete)} removed, {diff.unchanged} unchanged chunks ({len(resparse)} sparse-only updates)"
+        )
             
+        return len(splits), exists or bool(existing)
+
+    def embed_and_upsert(
+        self,
+        metadata_batches: Iterable[List[Dict[str, Any]]],
+        vectors: Optional[Dict[str, List[float]]] = None,
+        namespace: str = "",
+        sparse_encoder: Optional[Callable[[Dict[str, Any]], Optional[SparseVector]]] = None
+    ) -> None:
+        """Embed and upsert chunk batches, overlapping the embedding of later batches with earlier upserts.
+
+        Several batches are embedded per dispatch so they run concurrently.
+        Chunks whose id is in vectors use that precomputed vector instead of
+        being embedded. sparse_encoder, when given, builds each chunk's sparse
+        vector from its metadata. Failed batches are reported together once
+        every other batch is stored.
+        """
+        precomputed = vectors if vectors is not None else {}
+
+        def embed(metadata: List[Dict[str, Any]]) -> List[List[float]]:
+            missing = [m for m in metadata if m["id"] not in precomputed]
+            embeds = self.chunk_encoder(
+                [self.build_chunk(title=x["title"], content=x["content"]) for x in missing]
+            ) if missing else []
+            fresh = dict(zip((m["id"] for m in missing), embeds))
+            return [precomputed.pop(m["id"]) if m["id"] in precomputed else fresh[m["id"]] for m in metadata]
+
+        def upsert(metadata_batch: List[Dict[str, Any]], embeds: List[List[float]]) -> None:
             ids = [m["id"] for m in metadata_batch]
-            content = [self.build_chunk(title=x["title"], content=x["content"]) 
-                      for x in metadata_batch]
-            
-            embeds = self.encoder(content)
-            self.index.upsert(vectors=zip(ids, embeds, metadata_batch))
-            
-        return len(splits), exists
+            sparse = [sparse_encoder(m) if sparse_encoder else None for m in metadata_batch]
+            if self.chunk_store is not None:
+                # Text is stored first so a vector is never visible without it
+                self.chunk_store.put_many(metadata_batch)
+                metadata_batch = [split_chunk_metadata(m) for m in metadata_batch]
+            self.index.upsert(zip(ids, embeds, metadata_batch, sparse), namespace=namespace)
+
+        results = run_embed_upsert_pipeline(
+            metadata_batches,
+            embed_fn=embed,
+            upsert_fn=upsert,
+            group_size=self.embedding_dispatcher.max_concurrency,
+            max_pending=2 * self.embedding_dispatcher.max_concurrency
+        )
+        failed = [r for r in results if r.error]
+        if failed:
+            raise Exception(
+                f"Failed to index {len(failed)} of {len(results)} batches "
+                f"(first failure in batch {failed[0].index}: {failed[0].error})"
+            )
+
+    def sparse_encoder(self, term_stats: Optional[BM25Stats]) -> Optional[Callable[[Dict[str, Any]], Optional[SparseVector]]]:
+        """Builds a chunk's BM25 sparse vector from its metadata against the document's (running) statistics."""
+        if term_stats is None:
+            return None
+        return lambda m: encode_document(tokenize(m["content"]), term_stats.avg_length)
+
+    def hybrid_query(
+        self,
+        text: str,
+        xq: List[float],
+        filter_dict: Dict[str, Any],
+        alpha: float
+    ) -> Tuple[List[float], Optional[SparseVector]]:
+        """Alpha-weighted dense and sparse query vectors for a document-scoped query.
+
+        The sparse vector is None (and xq is returned as is) when alpha is 1,
+        the query is not scoped to a document, the document has no sparse
+        statistics or none of the query terms occur in it.
+        """
+        return self.hybrid_queries([text], [xq], filter_dict, alpha)[0]
+
+    def hybrid_queries(
+        self,
+        texts: Sequence[str],
+        vectors: Sequence[List[float]],
+        filter_dict: Dict[str, Any],
+        alpha: float
+    ) -> List[Tuple[List[float], Optional[SparseVector]]]:
+        """hybrid_query for several queries against one document, with one catalog lookup for all their terms."""
+        doc_id = filter_dict.get("doc_id")
+        if alpha >= 1 or self.sparse_mode != "bm25" or not doc_id:
+            return [(xq, None) for xq in vectors]
+        tokens = [tokenize(text) for text in texts]
+        term_stats = self.catalog.get_term_stats(doc_id, sorted({token for t in tokens for token in t}))
+        queries = []
+        for query_tokens, xq in zip(tokens, vectors):
+            sparse = encode_query(
+                query_tokens, term_stats.chunk_count, term_stats.document_frequencies
+            ) if term_stats else None
+            queries.append(hybrid_scale(xq, sparse, alpha) if sparse is not None else (xq, None))
+        return queries
+
+    def invalidate_retrieval(self, doc_info: Dict[str, Any]) -> None:
+        """Drop cached query results of a document, its file and its title."""
+        self.invalidate_tags(
+            retrieval_tags(doc_info.get("file_id"), doc_info.get("doc_id"), doc_info.get("title"))
+        )
+
+    def invalidate_tags(self, tags: List[str]) -> None:
+        """Drop cached query results and conversation working sets carrying any of tags."""
+        self.retrieval_cache.invalidate(tags)
+        self.retrieval_sessions.invalidate(tags)
 
     def get_available_pdfs(self) -> List[str]:
         """Retrieve list of all indexed PDF titles."""
-        if not self.index:
-            raise ValueError("Index not initialized. Call create_index() first.")
-        
-        # Query with dummy vector to get unique titles
-        response = self.index.query(
-            vector=[0] * self.dims,
-            top_k=10000,  # Large number to get all possible matches
-            include_metadata=True
+        return self.catalog.list_titles()
+
+    def hydrate_matches(self, results: List[Dict[str, Any]], window_chars: int) -> None:
+        """Load text for matches whose vectors only carry ids, in one lookup.
+
+        With window_chars > 0 their neighbours are loaded in the same lookup
+        and give the matches their context windows.
+        """
+        bare = [r for r in results if "content" not in r["metadata"]]
+        if self.chunk_store is None or not bare:
+            return
+        neighbour_keys = ("prechunk_id", "postchunk_id") if window_chars > 0 else ()
+        rows = self.chunk_store.get_many(
+            chunk_id
+            for r in bare
+            for chunk_id in (r["id"], *(r["metadata"].get(key) for key in neighbour_keys))
+            if chunk_id
         )
-        
-        # Extract unique titles from metadata
-        titles = set()
-        for match in response.matches:
-            if 'title' in match.metadata:
-                titles.add(match.metadata['title'])
-        
-        return sorted(list(titles))
+        for r in bare:
+            metadata = r["metadata"] = {**r["metadata"], **rows.get(r["id"], {"content": ""})}
+            if window_chars > 0:
+                pre, post = rows.get(metadata.get("prechunk_id")), rows.get(metadata.get("postchunk_id"))
+                metadata.setdefault(CONTEXT_BEFORE, pre["content"][-window_chars:] if pre else "")
+                metadata.setdefault(CONTEXT_AFTER, post["content"][:window_chars] if post else "")
+
+    def fill_context_windows(self, results: List[Dict[str, Any]], window_chars: int, namespace: str = "") -> None:
+        """Add context windows to matches indexed without them, with one fetch for all their neighbours."""
+        if window_chars <= 0:
+            return
+        missing = [r for r in results if CONTEXT_BEFORE not in r["metadata"]]
+        neighbour_ids = list({
+            chunk_id
+            for r in missing
+            for chunk_id in (r["metadata"].get("prechunk_id"), r["metadata"].get("postchunk_id"))
+            if chunk_id
+        })
+        if not neighbour_ids:
+            return
+        neighbours = self.index.fetch(neighbour_ids, namespace=namespace)
+        for r in missing:
+            metadata = r["metadata"] = dict(r["metadata"])
+            pre_id, post_id = metadata.get("prechunk_id"), metadata.get("postchunk_id")
+            metadata[CONTEXT_BEFORE] = neighbours[pre_id].metadata["content"][-window_chars:] if pre_id in neighbours else ""
+            metadata[CONTEXT_AFTER] = neighbours[post_id].metadata["content"][:window_chars] if post_id in neighbours else ""
+
+    def query_scope(self, pdf_title: Optional[str] = None, file_id: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Namespace and metadata filter that restrict a query to one document.
+
+        Files in the catalog are resolved to their (possibly shared)
+        document and addressed by doc_id inside its namespace; documents
+        indexed before namespaces existed are still found by title in the
+        default namespace.
+        """
+        documents = self.catalog.get_documents_by_file(file_id) if file_id else []
+        if documents:
+            doc_id, namespace = documents[0]
+            return namespace, {"doc_id": doc_id}
+        if pdf_title:
+            return "", {"title": pdf_title}
+        raise ValueError("A file ID or PDF title is required for querying.")
+
+    def query(
+        self,
+        text: str,
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        alpha: Optional[float] = None
+    ) -> List[str]:
+        """Query the index for similar chunks of one file (by file_id) or PDF title.
 
-    def query(self, text: str, pdf_title: Optional[str] = None, top_k: int = 3) -> List[str]:
-        """Query the index for similar chunks, optionally filtering by PDF title."""
+        Each result carries its neighbours' text from the stored context
+        windows; matches that are adjacent in the document come back merged
+        into a single passage. alpha (default HYBRID_ALPHA) weights dense
+        against BM25 sparse scores for documents indexed with sparse vectors.
+        """
         if not self.index:
             raise ValueError("Index not initialized. Call create_index() first.")
+
+        alpha = self.hybrid_alpha if alpha is None else alpha
+        key = RetrievalCache.make_key(text, top_k, self.encoder.name, file_id, pdf_title, alpha)
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.retrieval_cache.generation
             
-        if not pdf_title:
-            raise ValueError("PDF title is required for querying.")
+        namespace, filter_dict = self.query_scope(pdf_title, file_id)
     
         # Create query embedding
-        xq = self.encoder([text])[0]
-        print(f"DEBUG in QUERY: {self.index.describe_index_stats()}")
-        print(f"DEBUG in QUERY: {pdf_title}")
-        # Prepare filter if pdf_title is specified
-        filter_dict = {"title": pdf_title}
-        
-        # Query index
-        matches = self.index.query(
-            vector=xq,
-            top_k=top_k,
-            filter=filter_dict,
-            include_metadata=True
+        xq = self.query_embeddings.embed(text)
+        logger.debug(f"Query scope: {namespace or 'default namespace'} {filter_dict}")
+        xq, sparse = self.hybrid_query(text, xq, filter_dict, alpha)
+
+        chunks = self.retrieve_passages(xq, namespace, filter_dict, top_k, sparse_vector=sparse)
+        self.retrieval_cache.put(
+            key, chunks, retrieval_tags(file_id, filter_dict.get("doc_id"), filter_dict.get("title")), generation
         )
-        
-        # Format results
-        chunks = []
-        for m in matches["matches"]:
-            content = m["metadata"]["content"]
-            title = m["metadata"]["title"]
-            pre_id = m["metadata"]["prechunk_id"]
-            post_id = m["metadata"]["postchunk_id"]
+        logger.debug(f"Query for '{file_id or pdf_title}' returned {len(chunks)} passages")
             
-            # Fetch surrounding chunks if they exist
-            context = ""
-            if pre_id or post_id:
-                ids_to_fetch = [id for id in [pre_id, post_id] if id]
-                if ids_to_fetch:
-                    other_chunks = self.index.fetch(ids=ids_to_fetch)["vectors"]
-                    
-                    if pre_id and pre_id in other_chunks:
-                        context += other_chunks[pre_id]["metadata"]["content"][-400:]
-                    
-                    context += f"\n{content}\n"
-                    
-                    if post_id and post_id in other_chunks:
-                        context += other_chunks[post_id]["metadata"]["content"][:400]
-            
-            chunk = f"# {title}\n\n{context if context else content}"
-            chunks.append(chunk)
+        return chunks
 
-        print(f"Query Results for '{pdf_title}'")
-        print(f"Number of Matches: {len(chunks)}")
-            
+    async def aquery(
+        self,
+        text: str,
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        alpha: Optional[float] = None
+    ) -> List[str]:
+        """Async query: the embedding uses the encoder's async client, catalog and vector calls run in worker threads."""
+        if not self.index:
+            raise ValueError("Index not initialized. Call create_index() first.")
+
+        alpha = self.hybrid_alpha if alpha is None else alpha
+        key = RetrievalCache.make_key(text, top_k, self.encoder.name, file_id, pdf_title, alpha)
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.retrieval_cache.generation
+
+        namespace, filter_dict = await asyncio.to_thread(self.query_scope, pdf_title, file_id)
+        xq = await self.query_embeddings.aembed(text)
+        xq, sparse = await asyncio.to_thread(self.hybrid_query, text, xq, filter_dict, alpha)
+        chunks = await asyncio.to_thread(self.retrieve_passages, xq, namespace, filter_dict, top_k, sparse)
+        self.retrieval_cache.put(
+            key, chunks, retrieval_tags(file_id, filter_dict.get("doc_id"), filter_dict.get("title")), generation
+        )
         return chunks
 
+    async def aquery_session(
+        self,
+        conversation_id: str,
+        text: str,
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        alpha: Optional[float] = None
+    ) -> List[str]:
+        """aquery for one turn of a conversation, reusing the passages earlier turns retrieved.
+
+        The decision looks at the new turn's embedding alone. Close to the
+        session centroid the working set is returned without a vector
+        search; moderately close, the turn is searched together with the
+        question it follows up on and the passages found are put in front
+        of the set; otherwise the question alone is searched and the set
+        starts over.
+        """
+        key = (file_id, pdf_title, conversation_id)
+        session = self.retrieval_sessions.get(key)
+        xq = await self.query_embeddings.aembed(text)
+        action = self.retrieval_sessions.decide(session, xq)
+        if action == REUSE:
+            passages = self.retrieval_sessions.update(key, REUSE, xq, [], text)
+            if passages is not None:
+                return passages
+            # Invalidated or evicted while the turn was embedded
+            action = REFRESH
+
+        generation = self.retrieval_sessions.generation
+        search_text = f"{session.anchor}\n{text}" if action == EXTEND else text
+        _, filter_dict = await asyncio.to_thread(self.query_scope, pdf_title, file_id)
+        passages = await self.aquery(search_text, pdf_title, top_k, file_id=file_id, alpha=alpha)
+        return self.retrieval_sessions.update(
+            key, action, xq, passages, text,
+            tags=retrieval_tags(file_id, filter_dict.get("doc_id"), filter_dict.get("title") or pdf_title),
+            max_tokens=self.context_token_budget,
+            generation=generation
+        )
+
+    def query_batch(
+        self,
+        texts: Sequence[str],
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        alpha: Optional[float] = None,
+        max_workers: int = 8
+    ) -> List[List[str]]:
+        """query() for many questions about one file, returning each question's passages in order.
+
+        Questions not in the retrieval cache are embedded in one encoder
+        call and searched concurrently, and the chunk text and neighbour
+        windows of all their matches are loaded once.
+        """
+        if not self.index:
+            raise ValueError("Index not initialized. Call create_index() first.")
+
+        alpha = self.hybrid_alpha if alpha is None else alpha
+        keys = [RetrievalCache.make_key(text, top_k, self.encoder.name, file_id, pdf_title, alpha) for text in texts]
+        results: List[Optional[List[str]]] = [self.retrieval_cache.get(key) for key in keys]
+        # Repeated questions are retrieved once
+        missing: Dict[Any, int] = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, i)
+        if missing:
+            generation = self.retrieval_cache.generation
+            namespace, filter_dict = self.query_scope(pdf_title, file_id)
+            missing_texts = [texts[i] for i in missing.values()]
+            queries = self.hybrid_queries(
+                missing_texts, self.query_embeddings.embed_many(missing_texts), filter_dict, alpha
+            )
+            tags = retrieval_tags(file_id, filter_dict.get("doc_id"), filter_dict.get("title"))
+            passages = dict(zip(missing, self.retrieve_passages_batch(queries, namespace, filter_dict, top_k, max_workers)))
+            for key, chunks in passages.items():
+                self.retrieval_cache.put(key, chunks, tags, generation)
+            results = [passages[key] if chunks is None else chunks for key, chunks in zip(keys, results)]
+        return results
+
+    def retrieve_passages(
+        self,
+        xq: List[float],
+        namespace: str,
+        filter_dict: Dict[str, Any],
+        top_k: int,
+        sparse_vector: Optional[SparseVector] = None
+    ) -> List[str]:
+        """Search the index with a query vector and assemble the matches into titled passages.
+
+        Overlapping passages are merged and the rest are packed into the
+        context token budget in MMR order, using the match vectors returned
+        by the search.
+        """
+        return self.retrieve_passages_batch([(xq, sparse_vector)], namespace, filter_dict, top_k)[0]
+
+    def retrieve_passages_batch(
+        self,
+        queries: Sequence[Tuple[List[float], Optional[SparseVector]]],
+        namespace: str,
+        filter_dict: Dict[str, Any],
+        top_k: int,
+        max_workers: int = 8
+    ) -> List[List[str]]:
+        """retrieve_passages for several (dense, sparse) query vectors.
+
+        The searches run concurrently; a chunk matched by several queries
+        has its text and neighbour windows loaded once.
+        """
+        diverse = self.context_mmr_lambda < 1
+
+        def search(query: Tuple[List[float], Optional[SparseVector]]):
+            xq, sparse_vector = query
+            return self.index.query(
+                vector=xq,
+                top_k=top_k,
+                filter=filter_dict,
+                namespace=namespace,
+                include_values=diverse,
+                sparse_vector=sparse_vector
+            )
+
+        if len(queries) == 1:
+            match_lists = [search(queries[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as executor:
+                match_lists = list(executor.map(search, queries))
+
+        # One result per distinct chunk, shared by every query that matched it
+        shared: Dict[str, Dict[str, Any]] = {}
+        for matches in match_lists:
+            for m in matches:
+                shared.setdefault(m.id, {"id": m.id, "metadata": m.metadata})
+        self.hydrate_matches(list(shared.values()), self.context_window_chars)
+        self.fill_context_windows(list(shared.values()), self.context_window_chars, namespace)
+
+        assembled = []
+        for (xq, _), matches in zip(queries, match_lists):
+            results = [shared[m.id] for m in matches]
+            values = {m.id: m.values for m in matches}
+            passages, vectors = [], []
+            for metadata, context, ids in assemble_context_windows(results, with_ids=True):
+                passages.append((metadata["title"], context))
+                chunk_vectors = [values[chunk_id] for chunk_id in ids if values.get(chunk_id)]
+                vectors.append(np.mean(chunk_vectors, axis=0) if diverse and chunk_vectors else None)
+            assembled.append(pack_context(
+                passages,
+                vectors,
+                xq,
+                max_tokens=self.context_token_budget,
+                mmr_lambda=self.context_mmr_lambda
+            ))
+        return assembled
+
+    def close(self) -> None:
+        """Flush and close the vector store's local files (called on application shutdown)."""
+        if self.index:
+            self.index.close()
+
     def delete_index(self, confirm: bool = True) -> bool:
-        """Delete the Pinecone index."""
+        """Delete the vector index."""
         if not self.index:
             print("No active index to delete")
             return False
             
         try:
-            index_name = self.index._index_name
+            index_name = self.index_name
 
             if confirm:
                 answer = input(f"Type 'y' to confirm deletion of index '{index_name}'...\n>> ")
@@ -314,7 +932,7 @@ class PDFProcessor:
                     print("Deletion Cancelled")
                     return False
                     
-            self.pc.delete_index(index_name)
+            self.index.drop()
             self.index = None
             print(f"Index '{index_name}' Deleted!")
             return True
@@ -324,31 +942,58 @@ class PDFProcessor:
             return False
         
     async def delete_document_by_file_id(self, file_id: str) -> bool:
-        """Delete all vectors associated with a file ID using ID-based deletion."""
+        """Delete all vectors associated with a file ID, dropping the file's namespace when it has one.
+
+        A file linked to a shared document only drops its reference; the
+        chunks are deleted with the last reference.
+        """
         try:
             if not self.index:
                 raise ValueError("Index not initialized.")
 
-            # First, query to get all vector IDs associated with this file
-            # We'll use a dummy vector for the query
-            response = self.index.query(
-                vector=[0] * self.dims,
-                top_k=10000,  # Large enough to get all chunks
-                include_metadata=True
-            )
-
-            # Filter matches to find those associated with our file_id
-            chunk_ids = []
-            for match in response.matches:
-                if match.metadata.get("file_id") == file_id:
-                    chunk_ids.append(match.id)
-
-            if chunk_ids:
-                # Delete vectors by their IDs
-                self.index.delete(ids=chunk_ids)
+            linked = self.catalog.unlink_file(file_id)
+            self.invalidate_tags(retrieval_tags(file_id=file_id))
+            if linked is None:
+                documents = self.catalog.get_documents_by_file(file_id)
+            elif linked[1]:
+                print(f"Unlinked file {file_id}; {linked[1]} other file(s) still use '{linked[0]}'")
                 return True
-            return False
+            else:
+                documents = [(linked[0], self.catalog.get_namespace(linked[0]) or "")]
+            if not documents:
+                return False
+            return self.delete_documents(documents, file_id)
 
         except Exception as e:
             logger.error(f"Error deleting vectors for file {file_id}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def delete_documents(self, documents: List[Tuple[str, str]], file_id: Optional[str] = None) -> bool:
+        """Delete (doc_id, namespace) documents with their chunks; file_id is the file whose namespace they may own."""
+        for doc_id, namespace in documents:
+            if namespace in (f"file_{file_id}", doc_id):
+                # The document owns the whole namespace, so drop it in one call
+                self.index.delete(namespace=namespace, delete_all=True)
+            elif not self.delete_document_chunks(self.catalog.get_chunk_ids(doc_id), namespace=namespace):
+                return False
+        doc_ids = [doc_id for doc_id, _ in documents]
+        self.invalidate_tags([tag for doc_id in doc_ids for tag in retrieval_tags(doc_id=doc_id)])
+        if self.chunk_store is not None:
+            self.chunk_store.delete_documents(doc_ids)
+        self.catalog.delete_documents(doc_ids)
+        return True
+
+    def file_doc_id(self, file_id: str) -> str:
+        """doc_id of a file's own (unshared) document; it stays the same across re-uploads so they index incrementally."""
+        return f"doc_{file_id}"
+
+    def detach_shared_document(self, file_id: str) -> bool:
+        """Drop a file's link to a shared document once the file has its own version, deleting the shared
+        document with its last link. Returns whether the file had a link."""
+        linked = self.catalog.unlink_file(file_id)
+        if linked is None:
+            return False
+        self.invalidate_tags(retrieval_tags(file_id=file_id))
+        if not linked[1]:
+            self.delete_documents([(linked[0], self.catalog.get_namespace(linked[0]) or "")])
+        return True
@@ -1,6 +1,7 @@
 
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
@@ -12,17 +13,19 @@ load_dotenv()
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 
 class RAGApplication:
-    def __init__(self):
-        """Initialize RAG application with necessary components."""
+    def __init__(self, pdf_processor: Optional[PDFProcessor] = None):
+        """Initialize RAG application with necessary components, reusing pdf_processor when given."""
         openai_api_key = os.getenv("OPENAI_API_KEY")
         pinecone_api_key = os.getenv("PINECONE_API_KEY")
         pinecone_index_name = os.getenv("PINECONE_INDEX_NAME","pdf-semantic-chunking")
         
-        if not openai_api_key or not pinecone_api_key or not pinecone_index_name:
+        # Only the Pinecone vector store needs a Pinecone key
+        needs_pinecone = os.getenv("VECTOR_STORE", "pinecone") == "pinecone"
+        if not openai_api_key or (needs_pinecone and not pinecone_api_key) or not pinecone_index_name:
             raise ValueError("Missing API keys. Check your .env file.")
 
         self.llm = ChatOpenAI(model="learnlm-1.5-pro-experimental",base_url="https://generativelanguage.googleapis.com/v1beta/openai/", temperature=0.7, api_key=gemini_api_key)
-        self.pdf_processor = PDFProcessor(
+        self.pdf_processor = pdf_processor or PDFProcessor(
             openai_api_key=openai_api_key,
             pinecone_api_key=pinecone_api_key,
             pinecone_index_name=pinecone_index_name
@@ -63,8 +66,18 @@ class RAGApplication:
     def generate_answer(self, query: str, context_chunks: List[str]) -> str:
         """Generate answer using LangChain with retrieved context."""
         context = "\n\n".join(context_chunks)
+        chain = self.answer_prompt() | self.llm
         
-        prompt = ChatPromptTemplate.from_messages([
+        response = chain.invoke({
+            "context": context,
+            "question": query
+        })
+        
+        return response.content
+
+    def answer_prompt(self) -> ChatPromptTemplate:
+        """Prompt that answers a question from retrieved context."""
+        return ChatPromptTemplate.from_messages([
             ("system", "You are a helpful assistant that answers questions based on the provided context."),
             ("user", """Answer the question based on the following context. 
 If the answer cannot be found in the context, say "I cannot answer this based on the provided context."
@@ -76,24 +89,44 @@ Question: {question}
 
 Answer:""")
         ])
-        
-        chain = prompt | self.llm
-        
-        response = chain.invoke({
-            "context": context,
+
+    def rag_messages(self, messages: List[Dict[str, str]], context_chunks: List[str]) -> List[Dict[str, str]]:
+        """Chat messages for a single streamed completion: the retrieved context as a system message, then the conversation."""
+        context = "\n\n".join(context_chunks)
+        system = f"""You are a helpful assistant that answers questions based on the provided context.
+If the answer cannot be found in the context, say "I cannot answer this based on the provided context."
+
+Context:
+{context}"""
+        return [{"role": "system", "content": system}, *messages]
+
+    async def agenerate_answer(self, query: str, context_chunks: List[str]) -> str:
+        """Async variant of generate_answer."""
+        chain = self.answer_prompt() | self.llm
+        response = await chain.ainvoke({
+            "context": "\n\n".join(context_chunks),
             "question": query
         })
-        
         return response.content
 
-    def query_document(self, question: str, pdf_title: Optional[str] = None, top_k: int = 3) -> Dict[str, Any]:
-        """Query the document using the existing Pinecone index."""
+    def query_document(
+        self,
+        question: str,
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Query the document using the existing Pinecone index.
+
+        With file_id only that file's namespace is searched; pdf_title is the
+        fallback for documents indexed before per-file namespaces.
+        """
         try:
             # Determine which PDF to query
             target_pdf = pdf_title or self.current_pdf
             
             # Get relevant chunks using Pinecone
-            relevant_chunks = self.pdf_processor.query(question, target_pdf, top_k)
+            relevant_chunks = self.pdf_processor.query(question, target_pdf, top_k, file_id=file_id)
             
             # Debug logging
             print(f"DEBUG: Querying document '{pdf_title}' with question: {question}")
@@ -115,6 +148,76 @@ Answer:""")
                 "question": question
             }
 
+    async def aretrieve(
+        self,
+        question: str,
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> List[str]:
+        """Retrieve the context chunks for a question without generating an answer.
+
+        With conversation_id the chunks earlier turns retrieved are reused
+        when the question stays on their topic.
+        """
+        target_pdf = pdf_title or self.current_pdf
+        if conversation_id:
+            return await self.pdf_processor.aquery_session(conversation_id, question, target_pdf, top_k, file_id=file_id)
+        return await self.pdf_processor.aquery(question, target_pdf, top_k, file_id=file_id)
+
+    async def aquery_documents(
+        self,
+        questions: List[str],
+        pdf_title: Optional[str] = None,
+        top_k: int = 3,
+        file_id: Optional[str] = None,
+        max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Answer many questions about one document, yielding each result as soon as its answer is ready.
+
+        Retrieval for all questions runs as one batch (a single embedding
+        call, concurrent searches, shared chunk fetches); at most
+        max_concurrency (default BATCH_QA_CONCURRENCY) answers are generated
+        at once. Every result carries the question's index.
+        """
+        target_pdf = pdf_title or self.current_pdf
+        try:
+            contexts = await asyncio.to_thread(
+                self.pdf_processor.query_batch, questions, target_pdf, top_k, file_id
+            )
+        except Exception as e:
+            for index, question in enumerate(questions):
+                yield {"index": index, "error": f"Error processing query: {str(e)}", "question": question}
+            return
+
+        semaphore = asyncio.Semaphore(max_concurrency or int(os.getenv("BATCH_QA_CONCURRENCY", "8")))
+
+        async def answer(index: int, question: str, relevant_chunks: List[str]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return {
+                        "index": index,
+                        "question": question,
+                        "answer": await self.agenerate_answer(question, relevant_chunks),
+                        "relevant_chunks": relevant_chunks,
+                        "pdf_title": target_pdf
+                    }
+                except Exception as e:
+                    return {"index": index, "error": f"Error processing query: {str(e)}", "question": question}
+
+        tasks = [
+            asyncio.create_task(answer(index, question, chunks))
+            for index, (question, chunks) in enumerate(zip(questions, contexts))
+        ]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            # Stop outstanding answers when the consumer goes away early
+            for task in tasks:
+                task.cancel()
+
 def main():
     try:
         # Initialize RAG application
@@ -186,6 +289,6 @@ def main():
                 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-rag = RAGApplication()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
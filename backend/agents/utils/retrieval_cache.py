@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from agents.utils.embedding_cache import normalize_query
+
+RetrievalKey = Tuple[Hashable, ...]
+
+
+class RetrievalCache:
+    """In-process LRU of retrieval results (assembled passages) with a TTL.
+
+    Entries are keyed by query scope, normalized query text, top_k,
+    embedding model and hybrid weight, so a hit needs no catalog, embedding
+    or vector call. Each entry carries tags ("doc:<doc_id>",
+    "file:<file_id>", "title:<title>") that re-indexing and deletion
+    invalidate. Results
+    computed while an invalidation happened are not stored, so an in-flight
+    query cannot put a stale result back.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[RetrievalKey, Tuple[List[str], float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[RetrievalKey]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RetrievalCache":
+        """Cache sized by RETRIEVAL_CACHE_SIZE (0 disables it) and RETRIEVAL_CACHE_TTL seconds."""
+        return cls(
+            max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+        )
+
+    @staticmethod
+    def make_key(
+        text: str,
+        top_k: int,
+        model: str,
+        file_id: Optional[str] = None,
+        pdf_title: Optional[str] = None,
+        alpha: Optional[float] = None
+    ) -> RetrievalKey:
+        return (file_id, pdf_title, normalize_query(text), top_k, model, alpha)
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; pass the value read before retrieving to put()."""
+        return self._generation
+
+    def get(self, key: RetrievalKey) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0])
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: RetrievalKey, passages: List[str], tags: Iterable[str], generation: int) -> bool:
+        """Store passages unless the cache was invalidated since generation was read; returns whether stored."""
+        tags = tuple(tags)
+        with self._lock:
+            if self.max_entries <= 0 or generation != self._generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (list(passages), time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of tags; returns how many were dropped."""
+        with self._lock:
+            self._generation += 1
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key: RetrievalKey) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+def retrieval_tags(
+    file_id: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    title: Optional[str] = None
+) -> List[str]:
+    """Invalidation tags for a file, a document and/or a title."""
+    tags = []
+    if file_id:
+        tags.append(f"file:{file_id}")
+    if doc_id:
+        tags.append(f"doc:{doc_id}")
+    if title:
+        tags.append(f"title:{title}")
+    return tags
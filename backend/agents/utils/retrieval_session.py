@@ -0,0 +1,181 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agents.utils.embedding_dispatcher import count_tokens
+
+REUSE = "reuse"
+EXTEND = "extend"
+REFRESH = "refresh"
+
+
+class RetrievalSession:
+    """A conversation's working set of passages and the centroid of the query embeddings that built it."""
+
+    def __init__(self, centroid: np.ndarray, passages: List[str], anchor: str, tags: Tuple[str, ...]):
+        self.centroid = centroid
+        self.passages = passages
+        # Last question that triggered a search; follow-ups are embedded together with it
+        self.anchor = anchor
+        self.tags = tags
+        self.turns = 1
+        self.expires_at = 0.0
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class RetrievalSessionStore:
+    """Per-conversation retrieval working sets, kept in process.
+
+    A turn whose query embedding is at least reuse_threshold similar to the
+    session centroid reuses the working set without a vector search; one
+    at least extend_threshold similar searches and puts the new passages in
+    front of the set (extend); anything else starts the set over (refresh).
+    Sessions expire after ttl seconds without a turn, the least recently
+    used ones are dropped beyond max_sessions, and invalidating a tag drops
+    every session carrying it. Like RetrievalCache, a turn whose search
+    overlapped an invalidation is returned but not stored.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        ttl: float = 1800.0,
+        reuse_threshold: float = 0.8,
+        extend_threshold: float = 0.6,
+        decay: float = 0.7
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.reuse_threshold = reuse_threshold
+        self.extend_threshold = extend_threshold
+        self.decay = decay
+        self.actions = {REUSE: 0, EXTEND: 0, REFRESH: 0}
+        self._sessions: "OrderedDict[Hashable, RetrievalSession]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RetrievalSessionStore":
+        """Store configured by RETRIEVAL_SESSION_* env vars (RETRIEVAL_SESSION_MAX=0 disables sessions)."""
+        return cls(
+            max_sessions=int(os.getenv("RETRIEVAL_SESSION_MAX", "1024")),
+            ttl=float(os.getenv("RETRIEVAL_SESSION_TTL", "1800")),
+            reuse_threshold=float(os.getenv("RETRIEVAL_SESSION_REUSE", "0.8")),
+            extend_threshold=float(os.getenv("RETRIEVAL_SESSION_EXTEND", "0.6"))
+        )
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; pass the value read before searching to update()."""
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[RetrievalSession]:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and session.expires_at <= time.monotonic():
+                del self._sessions[key]
+                return None
+            return session
+
+    def decide(self, session: Optional[RetrievalSession], query_vector: Sequence[float]) -> str:
+        """REUSE, EXTEND or REFRESH for a turn, by cosine similarity of its query embedding to the centroid."""
+        if session is None or not session.passages:
+            return REFRESH
+        similarity = float(_unit(query_vector) @ session.centroid)
+        if similarity >= self.reuse_threshold:
+            return REUSE
+        if similarity >= self.extend_threshold:
+            return EXTEND
+        return REFRESH
+
+    def update(
+        self,
+        key: Hashable,
+        action: str,
+        query_vector: Sequence[float],
+        passages: List[str],
+        question: str,
+        tags: Iterable[str] = (),
+        max_tokens: int = 0,
+        generation: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """Record a turn and return the session's working set.
+
+        passages are the turn's search results (ignored on REUSE) and tags
+        the invalidation tags of the searched document. An extended set is
+        trimmed to max_tokens, newest passages first. With generation, the
+        session is not stored if an invalidation happened since it was read.
+        A REUSE whose session was dropped after decide() returns None and
+        records nothing; the turn has to be searched instead.
+        """
+        vector = _unit(query_vector)
+        with self._lock:
+            stale = generation is not None and generation != self._generation
+            session = self._sessions.get(key)
+            if action == REUSE and (session is None or session.expires_at <= time.monotonic()):
+                return None
+            self.actions[action] += 1
+            if session is None or action == REFRESH:
+                session = RetrievalSession(vector, list(passages), question, tuple(tags))
+            else:
+                if stale:
+                    # Work on a copy so the stored session is left alone
+                    session = copy.copy(session)
+                session.centroid = _unit(self.decay * session.centroid + (1 - self.decay) * vector)
+                session.turns += 1
+                if action == EXTEND:
+                    merged = list(passages) + [p for p in session.passages if p not in passages]
+                    session.passages = _trim_to_tokens(merged, max_tokens)
+                    session.anchor = question
+                    session.tags = tuple(dict.fromkeys((*session.tags, *tags)))
+            session.expires_at = time.monotonic() + self.ttl
+            if self.max_sessions > 0 and not stale:
+                self._sessions[key] = session
+                self._sessions.move_to_end(key)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            return list(session.passages)
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Drop every session carrying any of tags; returns how many were dropped."""
+        tags = set(tags)
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, session in self._sessions.items() if tags.intersection(session.tags)]
+            for key in stale:
+                del self._sessions[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Turns per action; reuse turns made no vector search."""
+        with self._lock:
+            turns = sum(self.actions.values())
+            return {
+                **self.actions,
+                "reuse_rate": self.actions[REUSE] / turns if turns else 0.0,
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions
+            }
+
+
+def _trim_to_tokens(passages: List[str], max_tokens: int) -> List[str]:
+    """Leading passages that fit in max_tokens (always at least one); 0 means no limit."""
+    if not max_tokens:
+        return passages
+    kept, used = [], 0
+    for passage in passages:
+        tokens = count_tokens(passage)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(passage)
+        used += tokens
+    return kept
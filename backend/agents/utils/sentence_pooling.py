@@ -0,0 +1,68 @@
+import threading
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from semantic_router.schema import DocumentSplit
+from semantic_router.splitters import RollingWindowSplitter
+from semantic_router.splitters.utils import tiktoken_length
+
+
+class RecordingRollingWindowSplitter(RollingWindowSplitter):
+    """RollingWindowSplitter that hands back the sentence embeddings it computed.
+
+    The base splitter embeds every sentence to find split points and then
+    throws the vectors away; split_with_embeddings keeps them so chunk vectors
+    can be pooled from them instead of embedding each chunk a second time.
+
+    If sentence_encoder is given, sentences are embedded through it instead of
+    the splitter's own encoder (e.g. a cached encoder, so re-splitting an
+    edited document only pays for the sentences that changed).
+    """
+
+    def __init__(self, *args, sentence_encoder: Optional[Callable[[List[str]], Any]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.record_lock = threading.Lock()
+        self.last_sentence_embeddings: Optional[np.ndarray] = None
+        self.sentence_encoder = sentence_encoder
+
+    def _encode_documents(self, docs: List[str]) -> np.ndarray:
+        if self.sentence_encoder is None:
+            embeddings = super()._encode_documents(docs)
+        else:
+            max_docs_per_batch = 2000
+            embeddings = np.array([
+                vector
+                for i in range(0, len(docs), max_docs_per_batch)
+                for vector in self.sentence_encoder(docs[i:i + max_docs_per_batch])
+            ])
+        self.last_sentence_embeddings = embeddings
+        return embeddings
+
+    def split_with_embeddings(self, docs: List[str]) -> Tuple[List[DocumentSplit], np.ndarray]:
+        """Split docs and return the splits together with their sentence embeddings."""
+        with self.record_lock:
+            self.last_sentence_embeddings = None
+            splits = self(docs)
+            return splits, self.last_sentence_embeddings
+
+
+def pool_split_embeddings(splits: Sequence[DocumentSplit], sentence_embeddings: np.ndarray) -> List[List[float]]:
+    """Token-weighted mean of each split's sentence embeddings, L2-normalised.
+
+    Splits partition the sentences in order, so split i owns the next
+    len(split.docs) rows of sentence_embeddings.
+    """
+    total_sentences = sum(len(split.docs) for split in splits)
+    if sentence_embeddings is None or len(sentence_embeddings) != total_sentences:
+        raise ValueError("Sentence embeddings do not line up with the splits")
+
+    vectors = []
+    row = 0
+    for split in splits:
+        rows = sentence_embeddings[row:row + len(split.docs)]
+        weights = np.array([max(1, tiktoken_length(doc)) for doc in split.docs], dtype=np.float64)
+        pooled = weights @ rows / weights.sum()
+        norm = np.linalg.norm(pooled)
+        vectors.append((pooled / norm if norm else pooled).tolist())
+        row += len(split.docs)
+    return vectors
@@ -0,0 +1,105 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SparseVector = Dict[str, List]
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have he her his i if in into is it its of on or our she so "
+    "such that the their them then there these they this to was we were what when where which who will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords; acronyms, numbers and formula names are kept whole."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def term_index(term: str) -> int:
+    """Stable 32-bit sparse dimension of a term, so no global vocabulary is needed."""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), "little")
+
+
+def _merge(weights: Dict[str, float]) -> SparseVector:
+    # Distinct terms can hash to the same dimension; their weights add up
+    merged: Dict[int, float] = {}
+    for term, weight in weights.items():
+        index = term_index(term)
+        merged[index] = merged.get(index, 0.0) + weight
+    indices = sorted(merged)
+    return {"indices": indices, "values": [merged[i] for i in indices]}
+
+
+class BM25Stats:
+    """Chunk count, mean chunk length and per-term document frequencies of one document."""
+
+    def __init__(
+        self,
+        chunk_count: int = 0,
+        total_length: int = 0,
+        document_frequencies: Optional[Dict[str, int]] = None
+    ):
+        self.chunk_count = chunk_count
+        self.total_length = total_length
+        self.document_frequencies = Counter(document_frequencies or {})
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "BM25Stats":
+        stats = cls()
+        for text in texts:
+            stats.add(tokenize(text))
+        return stats
+
+    def add(self, tokens: Sequence[str]) -> None:
+        self.chunk_count += 1
+        self.total_length += len(tokens)
+        self.document_frequencies.update(set(tokens))
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / self.chunk_count if self.chunk_count else 0.0
+
+
+def encode_document(tokens: Sequence[str], avg_length: float, k1: float = 1.2, b: float = 0.75) -> Optional[SparseVector]:
+    """BM25 term-frequency side of a chunk; the query side carries the IDF, so their dot product is the BM25 score."""
+    if not tokens:
+        return None
+    length_norm = 1 - b + b * len(tokens) / avg_length if avg_length else 1.0
+    return _merge({
+        term: tf * (k1 + 1) / (tf + k1 * length_norm)
+        for term, tf in Counter(tokens).items()
+    })
+
+
+def encode_query(tokens: Sequence[str], chunk_count: int, document_frequencies: Dict[str, int]) -> Optional[SparseVector]:
+    """IDF weights of the query terms that occur in the document, normalized to sum to 1.
+
+    Returns None when no query term occurs in the document.
+    """
+    weights = {}
+    for term in set(tokens):
+        df = document_frequencies.get(term, 0)
+        if df:
+            weights[term] = math.log((chunk_count - df + 0.5) / (df + 0.5) + 1)
+    total = sum(weights.values())
+    if not total:
+        return None
+    return _merge({term: weight / total for term, weight in weights.items()})
+
+
+def hybrid_scale(
+    dense: Sequence[float],
+    sparse: SparseVector,
+    alpha: float
+) -> Tuple[List[float], SparseVector]:
+    """Convex weighting of a dense and a sparse query vector: alpha 1 is dense only, 0 sparse only."""
+    if not 0 <= alpha <= 1:
+        raise ValueError("alpha must be between 0 and 1")
+    return (
+        [v * alpha for v in dense],
+        {"indices": list(sparse["indices"]), "values": [v * (1 - alpha) for v in sparse["values"]]}
+    )
@@ -0,0 +1,233 @@
+"""Snapshot the vector index to local Parquet files and restore it without re-embedding.
+
+Usage:
+    python -m agents.utils.vector_snapshot snapshot /backups/vectors [--namespace file_<id>]
+    python -m agents.utils.vector_snapshot restore /backups/vectors [--namespace file_<id>] [--workers 8]
+
+A snapshot directory holds one Parquet file per catalogued document (id,
+float32 values, JSON metadata and JSON sparse values, in row groups of
+ROW_GROUP_SIZE vectors)
+and manifest.json, which records each document's doc_hash and namespace.
+Snapshots are incremental: documents whose doc_hash matches the manifest
+are skipped, changed ones are rewritten and documents that left the
+catalog are dropped. Restore streams the files back as parallel upsert
+batches. Requires pyarrow.
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agents.utils.document_catalog import DocumentCatalog
+from agents.utils.vector_store import VectorStore, build_vector_store
+
+MANIFEST = "manifest.json"
+ROW_GROUP_SIZE = 2000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"pyarrow is required for vector snapshots: {str(e)}") from e
+    return pyarrow, pyarrow.parquet
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {"dims": None, "documents": {}}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def _save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    manifest_path = os.path.join(path, MANIFEST)
+    with open(f"{manifest_path}.tmp", "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def _snapshot_file(doc_id: str) -> str:
+    # doc ids may hold any character, so files are named by hash
+    return f"{hashlib.sha256(doc_id.encode()).hexdigest()[:32]}.parquet"
+
+
+def _write_document(
+    store: VectorStore,
+    path: str,
+    file_name: str,
+    chunk_ids: List[str],
+    namespace: str,
+    fetch_batch_size: int
+) -> Optional[int]:
+    """Stream a document's vectors into file_name; None (and nothing replaced) if any are missing."""
+    pa, pq = _pyarrow()
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("values", pa.list_(pa.float32(), store.dims)),
+        ("metadata", pa.string()),
+        ("sparse", pa.string())
+    ])
+    target = os.path.join(path, file_name)
+    written = 0
+    ids, values, metadata, sparse = [], [], [], []
+    with pq.ParquetWriter(f"{target}.tmp", schema) as writer:
+        for i in range(0, len(chunk_ids), fetch_batch_size):
+            batch = chunk_ids[i:i+fetch_batch_size]
+            fetched = store.fetch(batch, namespace=namespace)
+            if len(fetched) < len(batch):
+                break
+            for chunk_id in batch:
+                ids.append(chunk_id)
+                values.append(fetched[chunk_id].values)
+                metadata.append(json.dumps(fetched[chunk_id].metadata))
+                sparse_values = fetched[chunk_id].sparse_values
+                sparse.append(json.dumps(sparse_values) if sparse_values else None)
+            if len(ids) >= ROW_GROUP_SIZE or i + fetch_batch_size >= len(chunk_ids):
+                flat = pa.array(np.asarray(values, dtype=np.float32).reshape(-1))
+                writer.write_table(pa.table(
+                    [
+                        pa.array(ids),
+                        pa.FixedSizeListArray.from_arrays(flat, store.dims),
+                        pa.array(metadata),
+                        pa.array(sparse, type=pa.string())
+                    ],
+                    schema=schema
+                ), row_group_size=ROW_GROUP_SIZE)
+                written += len(ids)
+                ids, values, metadata, sparse = [], [], [], []
+
+    if written < len(chunk_ids):
+        os.remove(f"{target}.tmp")
+        return None
+    os.replace(f"{target}.tmp", target)
+    return written
+
+
+def snapshot_index(
+    store: VectorStore,
+    catalog: DocumentCatalog,
+    path: str,
+    namespace: Optional[str] = None,
+    fetch_batch_size: int = 100,
+    workers: int = 4
+) -> Dict[str, int]:
+    """Write every ready document (or those in one namespace) to path, skipping unchanged ones.
+
+    A document whose vectors are not all in the index (e.g. the index was
+    lost) keeps its previous snapshot instead of being overwritten.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = load_manifest(path)
+    if manifest["dims"] not in (None, store.dims):
+        raise ValueError(f"Snapshot at {path} holds {manifest['dims']}-dimensional vectors, not {store.dims}")
+    manifest["dims"] = store.dims
+    entries = manifest["documents"]
+
+    documents = catalog.list_documents(namespace)
+    changed = [
+        (doc_id, ns, doc_hash) for doc_id, ns, doc_hash in documents
+        if entries.get(doc_id, {}).get("doc_hash") != doc_hash or entries[doc_id].get("namespace") != ns
+    ]
+    catalogued = {doc_id for doc_id, _, _ in documents}
+    removed = [
+        doc_id for doc_id, entry in entries.items()
+        if doc_id not in catalogued and (namespace is None or entry["namespace"] == namespace)
+    ]
+
+    def write(document: Tuple[str, str, str]) -> Tuple[str, str, str, str, Optional[int]]:
+        doc_id, ns, doc_hash = document
+        file_name = _snapshot_file(doc_id)
+        count = _write_document(store, path, file_name, catalog.get_chunk_ids(doc_id), ns, fetch_batch_size)
+        return doc_id, ns, doc_hash, file_name, count
+
+    stats = {"written": 0, "skipped": len(documents) - len(changed), "incomplete": 0, "removed": len(removed), "vectors": 0}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for doc_id, ns, doc_hash, file_name, count in executor.map(write, changed):
+            if count is None:
+                print(f"Skipping '{doc_id}': not all of its vectors are in the index")
+                stats["incomplete"] += 1
+                continue
+            entries[doc_id] = {"doc_hash": doc_hash, "namespace": ns, "file": file_name, "vectors": count}
+            stats["written"] += 1
+            stats["vectors"] += count
+
+    for doc_id in removed:
+        file_path = os.path.join(path, entries.pop(doc_id)["file"])
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    _save_manifest(path, manifest)
+    return stats
+
+
+def restore_snapshot(
+    store: VectorStore,
+    path: str,
+    namespace: Optional[str] = None,
+    batch_size: int = 200,
+    workers: int = 4
+) -> int:
+    """Upsert every vector of a snapshot (or of one namespace) into store; returns how many were written."""
+    _, pq = _pyarrow()
+    manifest = load_manifest(path)
+    if manifest["dims"] not in (None, store.dims):
+        raise ValueError(f"Snapshot at {path} holds {manifest['dims']}-dimensional vectors, not {store.dims}")
+
+    restored = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for entry in manifest["documents"].values():
+            if namespace is not None and entry["namespace"] != namespace:
+                continue
+            for batch in pq.ParquetFile(os.path.join(path, entry["file"])).iter_batches(batch_size=batch_size):
+                values = batch.column("values").values.to_numpy(zero_copy_only=False).reshape(-1, store.dims)
+                # Snapshots written before sparse vectors existed have no sparse column
+                sparse = (
+                    batch.column("sparse").to_pylist() if "sparse" in batch.schema.names else [None] * batch.num_rows
+                )
+                vectors = list(zip(
+                    batch.column("id").to_pylist(),
+                    values.tolist(),
+                    (json.loads(m) for m in batch.column("metadata").to_pylist()),
+                    (json.loads(s) if s else None for s in sparse)
+                ))
+                # Keep at most two batches per worker in flight to bound memory
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    restored += sum(future.result() for future in done)
+                pending.add(executor.submit(store.upsert, vectors, entry["namespace"]))
+        restored += sum(future.result() for future in pending)
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot or restore the vector index")
+    parser.add_argument("command", choices=["snapshot", "restore"])
+    parser.add_argument("path")
+    parser.add_argument("--namespace", default=None)
+    parser.add_argument("--index", default=os.getenv("PINECONE_INDEX_NAME", "pdf-semantic-chunking"))
+    parser.add_argument("--dims", type=int, default=None, help="Embedding dimensions (defaults to the snapshot's)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    dims = args.dims or load_manifest(args.path)["dims"] or 1536
+    store = build_vector_store(dims, args.index)
+    if args.command == "snapshot":
+        stats = snapshot_index(store, DocumentCatalog.from_env(), args.path, args.namespace, workers=args.workers)
+        print(
+            f"Snapshot: {stats['written']} documents written ({stats['vectors']} vectors), "
+            f"{stats['skipped']} unchanged, {stats['incomplete']} incomplete, {stats['removed']} removed"
+        )
+    else:
+        restored = restore_snapshot(store, args.path, args.namespace, workers=args.workers)
+        print(f"Restored {restored} vectors into '{args.index}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class VectorMatch:
+    """A stored vector as returned by query and fetch."""
+    id: str
+    score: float = 0.0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    values: Optional[List[float]] = None
+    sparse_values: Optional[Dict[str, List]] = None
+
+    def __getitem__(self, key: str) -> Any:
+        # Dict-style access, like Pinecone's response objects
+        return getattr(self, key)
+
+
+class VectorStore:
+    """Interface of the vector index that holds chunk embeddings.
+
+    Vectors are addressed by (namespace, id); "" is the default namespace.
+    Filters use Pinecone's metadata filter syntax. A vector can also carry
+    sparse values ({"indices": [...], "values": [...]}); a query with a
+    sparse vector scores dense dot product plus sparse dot product.
+    """
+    name: str = ""
+    dims: int = 0
+
+    def upsert(self, vectors: Iterable[Tuple], namespace: str = "") -> int:
+        """Insert or replace (id, values, metadata[, sparse_values]) tuples, returning how many were written."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: str = "",
+        include_values: bool = False,
+        sparse_vector: Optional[Dict[str, List]] = None
+    ) -> List[VectorMatch]:
+        """Best-scoring vectors of a namespace, highest score first."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def fetch(self, ids: Sequence[str], namespace: str = "") -> Dict[str, VectorMatch]:
+        """Stored vectors by id; unknown ids are left out."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def delete(self, ids: Optional[Sequence[str]] = None, namespace: str = "", delete_all: bool = False) -> None:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def list_namespaces(self) -> List[str]:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def stats(self) -> Dict[str, Any]:
+        """Dimension, total vector count and per-namespace counts."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def drop(self) -> None:
+        """Delete the whole index."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def close(self) -> None:
+        """Release local files and connections; remote stores have none."""
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style metadata filter ($eq, $ne, $in, $nin, $gt(e), $lt(e), $exists, $and, $or)."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$exists":
+                ok = (key in metadata) == bool(expected)
+            elif key not in metadata:
+                ok = op in ("$ne", "$nin")
+            elif op == "$eq":
+                ok = expected in value if isinstance(value, list) else value == expected
+            elif op == "$ne":
+                ok = expected not in value if isinstance(value, list) else value != expected
+            elif op == "$in":
+                ok = any(v in expected for v in value) if isinstance(value, list) else value in expected
+            elif op == "$nin":
+                ok = all(v not in expected for v in value) if isinstance(value, list) else value not in expected
+            elif op == "$gt":
+                ok = value > expected
+            elif op == "$gte":
+                ok = value >= expected
+            elif op == "$lt":
+                ok = value < expected
+            elif op == "$lte":
+                ok = value <= expected
+            else:
+                raise ValueError(f"Unsupported filter operator '{op}'")
+            if not ok:
+                return False
+    return True
+
+
+class PineconeVectorStore(VectorStore):
+    """Adapter for a Pinecone serverless index, created on first use."""
+    name = "pinecone"
+
+    def __init__(
+        self,
+        index_name: str,
+        dims: int,
+        api_key: Optional[str] = None,
+        metric: str = "dotproduct",
+        cloud: str = "aws",
+        region: str = "us-east-1"
+    ):
+        from pinecone import Pinecone, ServerlessSpec
+
+        self.pc = Pinecone(api_key=api_key or os.getenv("PINECONE_API_KEY"))
+        self.index_name = index_name
+        self.dims = dims
+        if index_name not in self.pc.list_indexes().names():
+            self.pc.create_index(
+                name=index_name,
+                dimension=dims,
+                metric=metric,
+                spec=ServerlessSpec(cloud=cloud, region=region)
+            )
+            # Wait for index to be initialized
+            while not self.pc.describe_index(index_name).status['ready']:
+                time.sleep(5)
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors: Iterable[Tuple], namespace: str = "") -> int:
+        # Pinecone only takes sparse values in the dict form of a vector
+        vectors = [
+            {"id": v[0], "values": list(v[1]), "metadata": v[2], "sparse_values": v[3]} if len(v) > 3 and v[3]
+            else tuple(v[:3])
+            for v in vectors
+        ]
+        if vectors:
+            self.index.upsert(vectors=vectors, namespace=namespace)
+        return len(vectors)
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: str = "",
+        include_values: bool = False,
+        sparse_vector: Optional[Dict[str, List]] = None
+    ) -> List[VectorMatch]:
+        response = self.index.query(
+            vector=list(vector),
+            top_k=top_k,
+            filter=filter,
+            namespace=namespace,
+            include_metadata=True,
+            include_values=include_values,
+            **({"sparse_vector": sparse_vector} if sparse_vector else {})
+        )
+        return [
+            VectorMatch(
+                id=m.id,
+                score=m.score,
+                metadata=dict(m.metadata or {}),
+                values=list(m.values) if include_values and m.values else None
+            )
+            for m in response.matches
+        ]
+
+    def fetch(self, ids: Sequence[str], namespace: str = "") -> Dict[str, VectorMatch]:
+        if not ids:
+            return {}
+        vectors = self.index.fetch(ids=list(ids), namespace=namespace).vectors
+        return {
+            vector_id: VectorMatch(
+                id=vector_id,
+                metadata=dict(v.metadata or {}),
+                values=list(v.values),
+                sparse_values={
+                    "indices": list(v.sparse_values.indices), "values": list(v.sparse_values.values)
+                } if getattr(v, "sparse_values", None) else None
+            )
+            for vector_id, v in vectors.items()
+        }
+
+    def delete(self, ids: Optional[Sequence[str]] = None, namespace: str = "", delete_all: bool = False) -> None:
+        if delete_all:
+            self.index.delete(delete_all=True, namespace=namespace)
+        elif ids:
+            self.index.delete(ids=list(ids), namespace=namespace)
+
+    def list_namespaces(self) -> List[str]:
+        return sorted(self.stats()["namespaces"])
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.index.describe_index_stats()
+        return {
+            "dimension": stats.dimension,
+            "total_vector_count": stats.total_vector_count,
+            "namespaces": {ns: {"vector_count": s.vector_count} for ns, s in (stats.namespaces or {}).items()}
+        }
+
+    def drop(self) -> None:
+        self.pc.delete_index(self.index_name)
+
+
+class _NamespaceView:
+    """Search structures for one namespace, rebuilt after the namespace changes."""
+
+    def __init__(self, ids: List[str], rows: np.ndarray):
+        self.ids = ids
+        self.rows = rows
+        self.norms: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        # Sparse dimension -> (positions in ids, weights), built on the first sparse query
+        self.postings: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]] = None
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector index for small deployments and offline runs.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) and ids and
+    metadata in a SQLite table next to it, so the index survives restarts.
+    Search is exact by default. With ivf_lists > 0, namespaces of at least
+    ivf_min_vectors vectors are searched through an inverted file index:
+    spherical k-means centroids are trained on the first query after a
+    write, and only the ivf_probes closest lists are scanned. Metadata
+    filters are applied to the scanned candidates. Sparse values are kept
+    as JSON next to the metadata and searched through per-namespace
+    postings; vectors with a sparse match are always scored, even outside
+    the probed lists.
+    """
+    name = "numpy"
+    block_rows = 8192
+
+    def __init__(
+        self,
+        path: str,
+        dims: int,
+        metric: str = "dotproduct",
+        ivf_lists: int = 0,
+        ivf_probes: int = 8,
+        ivf_min_vectors: int = 20_000,
+        initial_capacity: int = 1024
+    ):
+        if metric not in ("dotproduct", "cosine"):
+            raise ValueError(f"Unsupported metric '{metric}'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dims = dims
+        self.metric = metric
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.ivf_min_vectors = ivf_min_vectors
+        self._lock = threading.RLock()
+
+        # Autocommit mode so transactions are opened explicitly with BEGIN
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "namespace TEXT NOT NULL, id TEXT NOT NULL, row INTEGER NOT NULL UNIQUE, metadata TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, id))"
+        )
+        if "sparse" not in {column[1] for column in self.db.execute("PRAGMA table_info(vectors)")}:
+            self.db.execute("ALTER TABLE vectors ADD COLUMN sparse TEXT")
+        self.db.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self.db.execute("SELECT value FROM settings WHERE name = 'dims'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO settings (name, value) VALUES ('dims', ?)", (str(dims),))
+        elif int(row[0]) != dims:
+            raise ValueError(f"Vector store at {path} holds {row[0]}-dimensional vectors, not {dims}")
+
+        self.rows: Dict[str, Dict[str, int]] = {}
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self.sparse: Dict[int, Dict[str, List]] = {}
+        for namespace, vector_id, vector_row, metadata, sparse in self.db.execute(
+            "SELECT namespace, id, row, metadata, sparse FROM vectors"
+        ):
+            self.rows.setdefault(namespace, {})[vector_id] = vector_row
+            self.metadata[vector_row] = json.loads(metadata)
+            if sparse:
+                self.sparse[vector_row] = json.loads(sparse)
+
+        self.next_row = max(self.metadata, default=-1) + 1
+        self.free_rows = sorted(set(range(self.next_row)) - set(self.metadata), reverse=True)
+        capacity = initial_capacity
+        while capacity < self.next_row:
+            capacity *= 2
+        self.vectors = self._open_matrix(capacity)
+        self._views: Dict[str, _NamespaceView] = {}
+
+    def _open_matrix(self, capacity: int) -> np.memmap:
+        """Map vectors.f32 with room for capacity rows, growing the file if needed."""
+        matrix_path = os.path.join(self.path, "vectors.f32")
+        nbytes = capacity * self.dims * 4
+        with open(matrix_path, "ab") as file:
+            if file.tell() < nbytes:
+                file.truncate(nbytes)
+        return np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims))
+
+    def _allocate_row(self) -> int:
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.next_row >= len(self.vectors):
+            self.vectors.flush()
+            self.vectors = self._open_matrix(2 * len(self.vectors))
+        self.next_row += 1
+        return self.next_row - 1
+
+    def upsert(self, vectors: Iterable[Tuple], namespace: str = "") -> int:
+        records = []
+        with self._lock:
+            ns_rows = self.rows.setdefault(namespace, {})
+            for vector_id, values, metadata, *sparse in vectors:
+                values = np.asarray(values, dtype=np.float32)
+                if values.shape != (self.dims,):
+                    raise ValueError(f"Vector '{vector_id}' has shape {values.shape}, expected ({self.dims},)")
+                vector_row = ns_rows.get(vector_id)
+                if vector_row is None:
+                    vector_row = ns_rows[vector_id] = self._allocate_row()
+                self.vectors[vector_row] = values
+                self.metadata[vector_row] = dict(metadata or {})
+                sparse = sparse[0] if sparse and sparse[0] and sparse[0]["indices"] else None
+                if sparse is None:
+                    self.sparse.pop(vector_row, None)
+                else:
+                    self.sparse[vector_row] = {"indices": list(sparse["indices"]), "values": list(sparse["values"])}
+                records.append((
+                    namespace, vector_id, vector_row, json.dumps(self.metadata[vector_row]),
+                    json.dumps(self.sparse[vector_row]) if sparse is not None else None
+                ))
+            if not ns_rows:
+                del self.rows[namespace]
+            if records:
+                self.vectors.flush()
+                self.db.execute("BEGIN")
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO vectors (namespace, id, row, metadata, sparse) VALUES (?, ?, ?, ?, ?)",
+                    records
+                )
+                self.db.execute("COMMIT")
+                self._views.pop(namespace, None)
+        return len(records)
+
+    def _view(self, namespace: str) -> Optional[_NamespaceView]:
+        view = self._views.get(namespace)
+        if view is None and self.rows.get(namespace):
+            ns_rows = self.rows[namespace]
+            view = _NamespaceView(list(ns_rows), np.fromiter(ns_rows.values(), dtype=np.int64, count=len(ns_rows)))
+            if self.metric == "cosine":
+                view.norms = np.concatenate([
+                    np.linalg.norm(self.vectors[view.rows[i:i + self.block_rows]], axis=1)
+                    for i in range(0, len(view.rows), self.block_rows)
+                ])
+            if self.ivf_lists and len(view.rows) >= self.ivf_min_vectors:
+                self._train_ivf(view)
+            self._views[namespace] = view
+        return view
+
+    def _train_ivf(self, view: _NamespaceView, iterations: int = 10, seed: int = 0) -> None:
+        """Spherical k-means on a sample of the namespace, then assign every vector to a list."""
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(view.rows, size=min(len(view.rows), 256 * self.ivf_lists), replace=False))
+        sample = self.vectors[sample_rows]
+        sample = sample / np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+        centroids = sample[rng.choice(len(sample), size=min(self.ivf_lists, len(sample)), replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for k in range(len(centroids)):
+                members = sample[labels == k]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[k] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        labels = np.concatenate([
+            np.argmax(self.vectors[view.rows[i:i + self.block_rows]] @ centroids.T, axis=1)
+            for i in range(0, len(view.rows), self.block_rows)
+        ])
+        view.centroids = centroids
+        view.lists = [np.flatnonzero(labels == k) for k in range(len(centroids))]
+
+    def _sparse_scores(self, view: _NamespaceView, sparse_vector: Dict[str, List]) -> np.ndarray:
+        """Sparse dot product of the query with every vector of the view."""
+        if view.postings is None:
+            entries: Dict[int, Tuple[List[int], List[float]]] = {}
+            for position, vector_row in enumerate(view.rows):
+                sparse = self.sparse.get(int(vector_row))
+                if sparse is None:
+                    continue
+                for index, value in zip(sparse["indices"], sparse["values"]):
+                    positions, weights = entries.setdefault(index, ([], []))
+                    positions.append(position)
+                    weights.append(value)
+            view.postings = {
+                index: (np.asarray(positions, dtype=np.int64), np.asarray(weights, dtype=np.float32))
+                for index, (positions, weights) in entries.items()
+            }
+        scores = np.zeros(len(view.rows), dtype=np.float32)
+        for index, value in zip(sparse_vector["indices"], sparse_vector["values"]):
+            posting = view.postings.get(index)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1] * value)
+        return scores
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        namespace: str = "",
+        include_values: bool = False,
+        sparse_vector: Optional[Dict[str, List]] = None
+    ) -> List[VectorMatch]:
+        if sparse_vector and self.metric != "dotproduct":
+            raise ValueError("Sparse-dense queries need the dotproduct metric")
+        q = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            view = self._view(namespace)
+            if view is None or top_k <= 0:
+                return []
+
+            sparse_scores = self._sparse_scores(view, sparse_vector) if sparse_vector else None
+            if view.centroids is None:
+                candidates = np.arange(len(view.rows))
+            else:
+                probes = np.argsort(-(view.centroids @ q))[:self.ivf_probes]
+                candidates = np.concatenate([view.lists[p] for p in probes])
+                if sparse_scores is not None:
+                    candidates = np.concatenate([candidates, np.flatnonzero(sparse_scores)])
+                candidates = np.unique(candidates)
+            if filter:
+                keep = [matches_filter(self.metadata[view.rows[c]], filter) for c in candidates]
+                candidates = candidates[np.array(keep, dtype=bool)]
+            if not len(candidates):
+                return []
+
+            scores = np.concatenate([
+                self.vectors[view.rows[candidates[i:i + self.block_rows]]] @ q
+                for i in range(0, len(candidates), self.block_rows)
+            ])
+            if self.metric == "cosine":
+                scores = scores / np.maximum(view.norms[candidates] * np.linalg.norm(q), 1e-12)
+            if sparse_scores is not None:
+                scores = scores + sparse_scores[candidates]
+
+            k = min(top_k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                VectorMatch(
+                    id=view.ids[candidates[b]],
+                    score=float(scores[b]),
+                    metadata=dict(self.metadata[view.rows[candidates[b]]]),
+                    values=self.vectors[view.rows[candidates[b]]].tolist() if include_values else None
+                )
+                for b in best
+            ]
+
+    def fetch(self, ids: Sequence[str], namespace: str = "") -> Dict[str, VectorMatch]:
+        with self._lock:
+            ns_rows = self.rows.get(namespace, {})
+            return {
+                vector_id: VectorMatch(
+                    id=vector_id,
+                    metadata=dict(self.metadata[ns_rows[vector_id]]),
+                    values=self.vectors[ns_rows[vector_id]].tolist(),
+                    sparse_values=self.sparse.get(ns_rows[vector_id])
+                )
+                for vector_id in ids if vector_id in ns_rows
+            }
+
+    def delete(self, ids: Optional[Sequence[str]] = None, namespace: str = "", delete_all: bool = False) -> None:
+        with self._lock:
+            ns_rows = self.rows.get(namespace, {})
+            targets = list(ns_rows) if delete_all else [vector_id for vector_id in ids or [] if vector_id in ns_rows]
+            if not targets:
+                return
+            for vector_id in targets:
+                vector_row = ns_rows.pop(vector_id)
+                del self.metadata[vector_row]
+                self.sparse.pop(vector_row, None)
+                self.free_rows.append(vector_row)
+            if not ns_rows:
+                self.rows.pop(namespace, None)
+
+            self.db.execute("BEGIN")
+            if delete_all:
+                self.db.execute("DELETE FROM vectors WHERE namespace = ?", (namespace,))
+            else:
+                self.db.executemany(
+                    "DELETE FROM vectors WHERE namespace = ? AND id = ?",
+                    [(namespace, vector_id) for vector_id in targets]
+                )
+            self.db.execute("COMMIT")
+            self._views.pop(namespace, None)
+
+    def list_namespaces(self) -> List[str]:
+        with self._lock:
+            return sorted(self.rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "dimension": self.dims,
+                "total_vector_count": len(self.metadata),
+                "namespaces": {ns: {"vector_count": len(rows)} for ns, rows in self.rows.items()},
+                "capacity": len(self.vectors)
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self.vectors.flush()
+            self.db.close()
+
+    def drop(self) -> None:
+        with self._lock:
+            self.db.close()
+            del self.vectors
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.rows, self.metadata, self.sparse, self._views = {}, {}, {}, {}
+
+
+VECTOR_STORES = ("pinecone", "numpy")
+
+
+def build_vector_store(dims: int, index_name: str, backend: Optional[str] = None) -> VectorStore:
+    """Open the vector store named by backend (defaults to VECTOR_STORE, then Pinecone)."""
+    backend = backend or os.getenv("VECTOR_STORE", "pinecone")
+    if backend == "pinecone":
+        return PineconeVectorStore(index_name, dims)
+    if backend == "numpy":
+        return NumpyVectorStore(
+            os.path.join(os.getenv("VECTOR_STORE_PATH", "/tmp/vector_store"), index_name),
+            dims,
+            ivf_lists=int(os.getenv("VECTOR_STORE_IVF_LISTS", "0")),
+            ivf_probes=int(os.getenv("VECTOR_STORE_IVF_PROBES", "8"))
+        )
+    raise ValueError(f"Unknown vector store '{backend}'. Available: {', '.join(VECTOR_STORES)}")
@@ -1,20 +1,22 @@
 import json
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from openai import OpenAI
+from starlette.background import BackgroundTask
+from openai import AsyncOpenAI
+from starlette.concurrency import run_in_threadpool
 from openai.types.chat import ChatCompletionChunk, ChatCompletionMessageParam
-from langchain.embeddings import OpenAIEmbeddings
-from pinecone import Pinecone
-from langchain.schema import HumanMessage, AIMessage
 from app.core.deps import get_current_user
 from app.models.user import User
 from sqlalchemy.orm import Session
-from app.schemas.chat.models import ChatRequest, Message
+from app.schemas.chat.models import BatchQuestionRequest, ChatRequest, Message
 from app.core.config import settings
 from app.core.logger import setup_logger, log_error
-from agents.utils.rag_application import rag
+from agents.utils.rag_application import RAGApplication
+from app.core.resources import get_rag
+from app.services.chat_history_service import ChatHistoryService
 from ....models.file import File as FileModel
 from app.core.deps import (
     get_db,
@@ -25,91 +27,50 @@ router = APIRouter()
 logger = setup_logger(__name__)
 
 
-class RAGTools:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index("researchagent")
-        self.namespace = "investment_research"
-
-    def create_embedding(self, text: str) -> List[float]:
-        """Create embedding for the input text"""
-        try:
-            embedding = self.openai_client.embeddings.create(
-                input=text,
-                model="text-embedding-3-small"
-            ).data[0].embedding
-            return embedding
-        except Exception as e:
-            logger.error(f"Error creating embedding: {e}")
-            raise
-
-
 # Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# Initialize Pinecone
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-index = pc.Index(settings.PINECONE_INDEX_NAME)
-
-# Initialize vector store
-embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
-vectorstore = Pinecone(index)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+chat_history = ChatHistoryService(client)
 
 
 def convert_to_chat_messages(messages: List[Message]) -> List[ChatCompletionMessageParam]:
     return [{"role": msg.role, "content": msg.content} for msg in messages]
 
 
-def convert_to_langchain_messages(messages: List[Message]):
-    message_map = {
-        "user": HumanMessage,
-        "assistant": AIMessage
-    }
-    return [message_map[msg.role](content=msg.content) for msg in messages]
-
-
-async def stream_langchain_response(chain, question: str, chat_history: List):
-    """Stream responses from LangChain"""
-    try:
-        response = await chain.ainvoke({
-            "question": question,
-            "chat_history": chat_history
-        })
-
-        # Stream the response in chunks
-        chunks = response['answer'].split()
-        for chunk in chunks:
-            yield f'0:{json.dumps(chunk + " ")}\n'
-
-        # Send completion signal
-        usage = {
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "total_tokens": 0
-        }
-        yield f'e:{{"finishReason":"stop","usage":{json.dumps(usage)},"isContinued":false}}\n'
-
-    except Exception as e:
-        log_error(logger, e, {'operation': 'stream_langchain_response'})
-        raise
-
+async def stream_chat_completion(
+    messages: List[ChatCompletionMessageParam],
+    started: Optional[float] = None,
+    retrieval_ms: Optional[float] = None,
+    reply: Optional[List[str]] = None
+):
+    """Stream a completion token by token.
 
-async def stream_chat_completion(messages: List[ChatCompletionMessageParam]):
-    """Fallback streaming using direct OpenAI completion"""
+    With started (a time.perf_counter() value, usually when the request
+    arrived) the time to the first token is logged and sent as a message
+    annotation before the finish message. Streamed text is also appended
+    to reply when given.
+    """
     try:
-        stream = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model="gpt-4-turbo",
             messages=messages,
             stream=True,
             temperature=0.7,
         )
 
-        for chunk in stream:
+        ttft_ms = None
+        async for chunk in stream:
             if chunk.choices:
                 choice = chunk.choices[0]
                 if choice.finish_reason is not None:
                     if choice.finish_reason == "stop":
+                        if started is not None:
+                            timings = {
+                                "ttftMs": ttft_ms,
+                                "retrievalMs": retrieval_ms,
+                                "totalMs": round((time.perf_counter() - started) * 1000, 1)
+                            }
+                            logger.info(f"Chat stream timings: {timings}")
+                            yield f'8:{json.dumps([timings])}\n'
                         usage = {
                             "prompt_tokens": 0,
                             "completion_tokens": 0,
@@ -119,6 +80,10 @@ async def stream_chat_completion(messages: List[ChatCompletionMessageParam]):
                     continue
 
                 if choice.delta.content:
+                    if ttft_ms is None and started is not None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    if reply is not None:
+                        reply.append(choice.delta.content)
                     yield f'0:{json.dumps(choice.delta.content)}\n'
 
     except Exception as e:
@@ -127,46 +92,111 @@ async def stream_chat_completion(messages: List[ChatCompletionMessageParam]):
         yield 'e:{"finishReason":"error"}\n'
 
 
+def conversation_id(request: ChatRequest, user: User) -> str:
+    """The client's conversation id, or the server-side conversation's (one per user and file)."""
+    return request.id or f"user:{user.id}"
+
+
 @router.post("")
-async def chat(request: ChatRequest,db: Session = Depends(get_db)):
-    """Chat endpoint with LangChain RAG and fallback to direct OpenAI"""
-    try:        
-        messages = convert_to_chat_messages(request.messages)        
-        print("-------------------------")
-        print(request.file_id)
-        file = db.query(FileModel).filter(
-            FileModel.id == request.file_id,            
+async def chat(
+    request: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    rag: RAGApplication = Depends(get_rag)
+):
+    """Chat endpoint: retrieved chunks feed one streamed completion, answering without them if retrieval fails
+
+    The conversation is kept per (user, file) on the server: clients may
+    send only the new message, and the model sees the running summary
+    plus the last few turns instead of the whole history.
+    """
+    started = time.perf_counter()
+    file = await run_in_threadpool(
+        lambda: db.query(FileModel).filter(
+            FileModel.id == request.file_id,
+            FileModel.user_id == current_user.id,
             FileModel.is_deleted == False
         ).first()
+    )
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    filename_without_extension = file.filename.rsplit('.', 1)[0]
 
-        if not file:
-            raise HTTPException(status_code=404, detail="File not found")
-        filename_without_extension = file.filename.rsplit('.', 1)[0]
-        print(filename_without_extension)
-        
-        results = rag.query_document(request.messages[-1].content, filename_without_extension)
-        messages = convert_to_chat_messages(request.messages)
-        messages[-1]["content"] = results["question"] + results["answer"]
-        response = StreamingResponse(
-            stream_chat_completion(messages),
-            media_type='text/plain',
-        )
-        response.headers['x-vercel-ai-data-stream'] = 'v1'
-
-        return response
+    state = await run_in_threadpool(chat_history.load, db, current_user.id, file.id)
+    new_messages = chat_history.new_messages(state, convert_to_chat_messages(request.messages))
+    history = chat_history.prompt_messages(state, new_messages)
 
+    try:
+        context_chunks = await rag.aretrieve(
+            request.messages[-1].content, filename_without_extension, file_id=str(file.id),
+            conversation_id=conversation_id(request, current_user)
+        )
+        retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+        messages = rag.rag_messages(history, context_chunks)
     except Exception as e:
         log_error(logger, e, {
-            'operation': 'chat_langchain_failed',
-            'fallback': 'using_direct_openai'
+            'operation': 'chat_retrieval_failed',
+            'fallback': 'answering_without_context'
         })
-
-        # Fallback to original OpenAI streaming
-        messages = convert_to_chat_messages(request.messages)
-        response = StreamingResponse(
-            stream_chat_completion(messages),
-            media_type='text/plain',
-        )
-        response.headers['x-vercel-ai-data-stream'] = 'v1'
-
-        return response
+        messages, retrieval_ms = history, None
+
+    reply: List[str] = []
+    response = StreamingResponse(
+        stream_chat_completion(messages, started=started, retrieval_ms=retrieval_ms, reply=reply),
+        media_type='text/plain',
+        # Runs after the last chunk is sent, so storing and summarizing never delays the reply
+        background=BackgroundTask(chat_history.record_turn, current_user.id, file.id, new_messages, reply),
+    )
+    response.headers['x-vercel-ai-data-stream'] = 'v1'
+
+    return response
+
+
+@router.delete("/history/{file_id}")
+async def clear_chat_history(
+    file_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Forget the stored conversation about a file"""
+    file = await run_in_threadpool(
+        lambda: db.query(FileModel).filter(
+            FileModel.id == file_id,
+            FileModel.user_id == current_user.id,
+            FileModel.is_deleted == False
+        ).first()
+    )
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    cleared = await run_in_threadpool(chat_history.clear, db, current_user.id, file.id)
+    return {"cleared": cleared}
+
+
+@router.post("/batch")
+async def batch_questions(
+    request: BatchQuestionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    rag: RAGApplication = Depends(get_rag)
+):
+    """Answer a list of questions about one file, streaming one JSON line per answer as it completes"""
+    file = await run_in_threadpool(
+        lambda: db.query(FileModel).filter(
+            FileModel.id == request.file_id,
+            FileModel.user_id == current_user.id,
+            FileModel.is_deleted == False
+        ).first()
+    )
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    filename_without_extension = file.filename.rsplit('.', 1)[0]
+
+    async def stream_answers():
+        async for result in rag.aquery_documents(
+            request.questions, filename_without_extension, request.top_k, file_id=str(file.id)
+        ):
+            if "error" in result:
+                logger.error(f"Batch question {result['index']} failed: {result['error']}")
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream_answers(), media_type="application/x-ndjson")
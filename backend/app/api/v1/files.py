@@ -18,29 +18,35 @@ import time
 import asyncio
 from dotenv import load_dotenv
 from agents.utils.pdf_processor import PDFProcessor
+from app.core.resources import get_pdf_processor
 
 logger = setup_logger(__name__)
 router = APIRouter()
 s3_service = S3Service()
 
-# Initialize PDFProcessor with necessary credentials
+# The PDFProcessor is shared through app.core.resources and built on first use
 load_dotenv()
-pdf_processor = PDFProcessor(
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    pinecone_api_key=os.getenv("PINECONE_API_KEY"),
-    pinecone_index_name=os.getenv("PINECONE_INDEX_NAME", "pdf-semantic-chunking")
-)
-
-# Create Pinecone index on startup
-pdf_processor.create_index("pdf-semantic-chunking")
 
 # Create a dedicated directory for temporary files
 TEMP_DIR = "/tmp/pdf_processing"
 os.makedirs(TEMP_DIR, exist_ok=True)
 
-async def process_pdf_embeddings(file_path: str, file_id: UUID, user_id: UUID):
+# Documents at least this long are ingested window by window to bound memory
+STREAM_INGEST_MIN_PAGES = int(os.getenv("PDF_STREAM_MIN_PAGES", "200"))
+
+async def process_pdf_embeddings(
+    file_path: str,
+    file_id: UUID,
+    user_id: UUID,
+    pdf_processor: PDFProcessor,
+    replace: bool = False
+):
     """
     Background task to process PDF and generate embeddings
+
+    With replace the PDF is a new version of the file: it is indexed as the
+    file's own document under its existing doc_id, so only changed chunks
+    are embedded, and any shared document the file linked to is released.
     """
     try:
         logger.info(f"Starting PDF processing for file_id: {file_id}")
@@ -66,9 +72,33 @@ async def process_pdf_embeddings(file_path: str, file_id: UUID, user_id: UUID):
                 }
             )
             return
+
+        # Identical bytes were indexed before (by any user): link this file to that chunk set instead
+        content_hash = None
+        if pdf_processor.dedup_mode == "content" and not replace:
+            content_hash = pdf_processor.calculate_content_hash(file_path)
+            num_chunks = pdf_processor.link_existing_document(content_hash, str(file_id), str(user_id))
+            if num_chunks is not None:
+                logger.info(f"Linked file_id {file_id} to an existing document with {num_chunks} chunks")
+                await notification_manager.send_notification(
+                    user_id,
+                    {
+                        "type": "success",
+                        "message": f"PDF successfully stored in vector database with {num_chunks} chunks",
+                        "file_id": str(file_id),
+                        "status": "completed",
+                        "chunks": num_chunks
+                    }
+                )
+                return
             
+        # Very large documents skip read_pdf and are streamed straight into the index
+        doc_info = pdf_processor.describe_pdf(file_path)
+        stream_ingest = doc_info["pages"] >= STREAM_INGEST_MIN_PAGES
+
         # Process the document
-        doc_info = pdf_processor.read_pdf(file_path)
+        if not stream_ingest:
+            doc_info = pdf_processor.read_pdf(file_path)
         if not doc_info:
             logger.error(f"Failed to process PDF for file_id: {file_id}")
             await notification_manager.send_notification(
@@ -82,8 +112,14 @@ async def process_pdf_embeddings(file_path: str, file_id: UUID, user_id: UUID):
             return
 
         # Add additional metadata
-        doc_info["file_id"] = str(file_id)
-        doc_info["user_id"] = str(user_id)
+        if content_hash:
+            # Shared document keyed by content; owners are recorded on the file links, not on the chunks
+            doc_info["doc_id"] = pdf_processor.shared_doc_id(content_hash)
+        else:
+            doc_info["file_id"] = str(file_id)
+            doc_info["user_id"] = str(user_id)
+            # Key the document by file so re-indexing a file only touches its own chunks
+            doc_info["doc_id"] = pdf_processor.file_doc_id(str(file_id))
         
         # Send notification for successful embedding generation
         await notification_manager.send_notification(
@@ -98,8 +134,20 @@ async def process_pdf_embeddings(file_path: str, file_id: UUID, user_id: UUID):
         )
         
         # Index the document
-        num_chunks, was_overwritten = pdf_processor.index_document(doc_info)
+        if stream_ingest:
+            num_chunks, was_overwritten = pdf_processor.index_document_stream(
+                file_path,
+                overwrite=replace,
+                extra_metadata={key: doc_info[key] for key in ("file_id", "user_id", "doc_id") if key in doc_info}
+            )
+        else:
+            num_chunks, was_overwritten = pdf_processor.index_document(doc_info, overwrite=replace)
+        if replace:
+            pdf_processor.detach_shared_document(str(file_id))
+        if content_hash:
+            num_chunks = pdf_processor.link_existing_document(content_hash, str(file_id), str(user_id)) or num_chunks
         logger.info(f"Successfully indexed {num_chunks} chunks for file_id: {file_id}")
+        logger.debug(f"Embedding dispatcher stats: {pdf_processor.embedding_dispatcher.stats()}")
         
         # Send notification for successful vector storage
         await notification_manager.send_notification(
@@ -188,7 +236,8 @@ async def upload_file(
     file: UploadFile,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    pdf_processor: PDFProcessor = Depends(get_pdf_processor)
 ):
     """
     Upload a file to S3, store its metadata in the database, and process it for semantic search
@@ -237,7 +286,8 @@ async def upload_file(
                 process_pdf_embeddings,
                 temp_file_path,
                 db_file.id,
-                current_user.id
+                current_user.id,
+                pdf_processor
             )
 
         except SQLAlchemyError as e:
@@ -287,6 +337,89 @@ async def upload_file(
         })
         raise HTTPException(status_code=500, detail="Failed to process file upload")
     
+@router.put("/files/{file_id}", response_model=FileResponse)
+async def replace_file(
+    file_id: UUID,
+    file: UploadFile,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    pdf_processor: PDFProcessor = Depends(get_pdf_processor)
+):
+    """
+    Replace a file's PDF with a new version, re-indexing only the chunks that changed
+    """
+    logger.info(f"File replacement initiated by user {current_user.id}: {file_id}")
+
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    db_file = db.query(FileModel).filter(
+        FileModel.id == file_id,
+        FileModel.user_id == current_user.id,
+        FileModel.is_deleted == False
+    ).first()
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    temp_file_path = os.path.join(TEMP_DIR, f"{file_id}_{file.filename}")
+    try:
+        with open(temp_file_path, "wb") as temp_file:
+            temp_file.write(await file.read())
+        await file.seek(0)
+
+        s3_key = await s3_service.upload_file(file, current_user.id)
+        old_s3_key = db_file.s3_key
+        try:
+            db_file.filename = file.filename
+            db_file.s3_key = s3_key
+            db_file.file_size = file.size
+            db_file.mime_type = file.content_type
+            db.commit()
+            db.refresh(db_file)
+        except SQLAlchemyError as e:
+            db.rollback()
+            await s3_service.delete_file(s3_key)
+            log_error(logger, e, {'operation': 'database_update', 'file_id': str(file_id)})
+            raise HTTPException(status_code=500, detail="Failed to save file information")
+
+        try:
+            await s3_service.delete_file(old_s3_key)
+        except Exception as e:
+            log_error(logger, e, {'operation': 'delete_replaced_s3_object', 'file_id': str(file_id)})
+
+        background_tasks.add_task(
+            process_pdf_embeddings,
+            temp_file_path,
+            db_file.id,
+            current_user.id,
+            pdf_processor,
+            True
+        )
+
+        return FileResponse(
+            id=db_file.id,
+            filename=db_file.filename,
+            file_size=db_file.file_size,
+            mime_type=db_file.mime_type,
+            created_at=db_file.created_at,
+            updated_at=db_file.updated_at,
+            download_url=await s3_service.generate_presigned_url(s3_key)
+        )
+
+    except HTTPException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+    except Exception as e:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        log_error(logger, e, {
+            'user_id': str(current_user.id),
+            'file_id': str(file_id)
+        })
+        raise HTTPException(status_code=500, detail="Failed to replace file")
+
 @router.get("/files", response_model=List[FileResponse])
 async def list_files(    
     current_user: User = Depends(get_current_user),
@@ -404,7 +537,8 @@ async def get_file(
 async def delete_file(
     file_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    pdf_processor: PDFProcessor = Depends(get_pdf_processor)
 ):
     """
     Delete a file (soft delete in database and remove from S3)
@@ -430,6 +564,9 @@ async def delete_file(
             # Soft delete in database
             file.is_deleted = True
             db.commit()
+            # Drops this file's reference; shared chunks are only deleted with the last one
+            if not await pdf_processor.delete_document_by_file_id(str(file_id)):
+                logger.warning(f"No indexed chunks removed for file {file_id}")
             logger.info(f"Successfully deleted file {file_id}")
 
             return {"message": "File deleted successfully"}
@@ -33,12 +33,11 @@ from app.schemas.generate.models import GenerateRequest, GenerateResponse
 from app.services.podcast_service import AudioService, TranscriptService
 from app.services.quiz_service import QuizService, QuestionService
 from app.services.flashcard_service import FlashcardService, DeckService, CardService
-from agents.podcast_agent.learn_lab_assistant_agent import PodcastGenerator
+from app.core.resources import get_podcast_generator
 from app.services.notification_service import notification_manager
 
 logger = setup_logger(__name__)
 router = APIRouter()
-podcast_generator = PodcastGenerator()
 
 
 async def _async_generate_podcast(
@@ -66,10 +65,11 @@ async def _async_generate_podcast(
         logger.debug(f"DEBUG File:{pdf_title}")
         logger.debug(f"DEBUG File:{file.id}")
 
-        result = podcast_generator.generate_content(
+        result = get_podcast_generator().generate_content(
             question=query,
             pdf_title=pdf_title,
-            output_type="podcast"
+            output_type="podcast",
+            file_id=str(file.id)
         )
 
         try:
@@ -170,10 +170,11 @@ async def _async_generate_quiz(file_id: UUID, query: str, db: Session, user_id:
         logger.debug(f"DEBUG File:{pdf_title}")
         logger.debug(f"DEBUG File:{file.id}")
 
-        result = podcast_generator.generate_content(
+        result = get_podcast_generator().generate_content(
             question=query,
             pdf_title=pdf_title,
-            output_type="quiz"
+            output_type="quiz",
+            file_id=str(file.id)
         )
 
         quiz_data = QuizCreate(
@@ -245,10 +246,11 @@ async def _async_generate_flashcards(
         logger.debug(f"DEBUG File:{file.id}")
 
         try:
-            result = podcast_generator.generate_content(
+            result = get_podcast_generator().generate_content(
                 question=query,
                 pdf_title=pdf_title,
-                output_type="flashcards"
+                output_type="flashcards",
+                file_id=str(file.id)
             )
 
             if not result.get('flashcards'):
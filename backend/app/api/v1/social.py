@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from agents.utils.blog_agent import BlogAgent
 from agents.utils.tweet_agent import TweetAgent
 from agents.podcast_agent.learn_lab_assistant_agent import PodcastGenerator
+from app.core.resources import get_podcast_generator
 import traceback
 import os
 from ...core.deps import get_db
@@ -17,7 +18,6 @@ from ...models.user import User
 from uuid import UUID
 
 router = APIRouter()
-generator = PodcastGenerator()
 
 class ContentRequest(BaseModel):
     query: str
@@ -68,7 +68,8 @@ async def post_blog(
 async def generate_blog(
     content_request: ContentRequest, 
     current_user: User= Depends(get_current_user),
-    db : Session = Depends(get_db)):
+    db : Session = Depends(get_db),
+    generator: PodcastGenerator = Depends(get_podcast_generator)):
     try:
         print(f"DEBUG: Generating blog for query: {content_request.query}")
         print(f"DEBUG: PDF Title: {content_request.pdf_title}")
@@ -85,7 +86,8 @@ async def generate_blog(
         result = generator.generate_content(
             question=content_request.query,
             pdf_title=pdf_title,
-            output_type="blog"
+            output_type="blog",
+            file_id=str(file.id)
         )
         
         print(f"DEBUG: Generation Result: {result}")
@@ -99,7 +101,8 @@ async def generate_blog(
 async def generate_tweet(
     content_request: ContentRequest, 
     current_user: User= Depends(get_current_user),
-    db : Session = Depends(get_db)):
+    db : Session = Depends(get_db),
+    generator: PodcastGenerator = Depends(get_podcast_generator)):
     try:
         print(f"DEBUG: Generating tweet for query: {content_request.query}")
         print(f"DEBUG: PDF Title: {content_request.pdf_title}")
@@ -115,7 +118,8 @@ async def generate_tweet(
         result = generator.generate_content(
             question=content_request.query,
             pdf_title=pdf_title,
-            output_type="tweet"
+            output_type="tweet",
+            file_id=str(file.id)
         )
         
         print(f"DEBUG: Generation Result: {result}")
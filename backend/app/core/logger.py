@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -6,9 +7,11 @@ from typing import Any
 import json
 import traceback
 
-# Create logs directory if it doesn't exist
-logs_dir = Path("logs")
-logs_dir.mkdir(exist_ok=True)
+# Directory of the daily log files; LOG_DIR= (empty) logs to the console only
+_log_dir = os.getenv("LOG_DIR", "logs")
+logs_dir = Path(_log_dir) if _log_dir else None
+if logs_dir is not None:
+    logs_dir.mkdir(exist_ok=True)
 
 # Configure logging
 def setup_logger(name: str) -> logging.Logger:
@@ -24,19 +27,19 @@ def setup_logger(name: str) -> logging.Logger:
     )
 
     # File handler for detailed logging
-    file_handler = logging.FileHandler(
-        logs_dir / f"{datetime.now().strftime('%Y-%m-%d')}_app.log"
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(detailed_formatter)
+    if logs_dir is not None:
+        file_handler = logging.FileHandler(
+            logs_dir / f"{datetime.now().strftime('%Y-%m-%d')}_app.log"
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(detailed_formatter)
+        logger.addHandler(file_handler)
 
     # Console handler for basic logging
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
 
-    # Add handlers
-    logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
     return logger
@@ -0,0 +1,103 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.logger import setup_logger
+
+if TYPE_CHECKING:
+    from agents.podcast_agent.learn_lab_assistant_agent import PodcastGenerator
+    from agents.utils.pdf_processor import PDFProcessor
+    from agents.utils.rag_application import RAGApplication
+
+logger = setup_logger(__name__)
+
+
+class ResourceContainer:
+    """Process-wide clients that are built on first use and shared by every router.
+
+    Nothing is constructed at import time. A resource's factory runs the first
+    time it is requested; concurrent first requests wait for a single build.
+    The application lifespan can warm resources in the background and
+    closes them on shutdown.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._instances: Dict[str, Any] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._locks[name]:
+                if name not in self._instances:
+                    logger.info(f"Building shared resource: {name}")
+                    self._instances[name] = self._factories[name]()
+                instance = self._instances[name]
+        return instance
+
+    def built(self) -> List[str]:
+        """Names of the resources constructed so far."""
+        return list(self._instances)
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> None:
+        for name in names or self._factories:
+            self.get(name)
+
+    def close(self) -> None:
+        """Close built resources that have a close() method, newest first, and forget them all."""
+        for name, instance in reversed(list(self._instances.items())):
+            close = getattr(instance, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.error(f"Error closing resource {name}: {str(e)}")
+        self._instances.clear()
+
+
+def _build_pdf_processor() -> "PDFProcessor":
+    from agents.utils.pdf_processor import PDFProcessor
+
+    return PDFProcessor(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        pinecone_api_key=os.getenv("PINECONE_API_KEY"),
+        pinecone_index_name=os.getenv("PINECONE_INDEX_NAME", "pdf-semantic-chunking")
+    )
+
+
+def _build_rag() -> "RAGApplication":
+    from agents.utils.rag_application import RAGApplication
+
+    return RAGApplication(pdf_processor=get_pdf_processor())
+
+
+def _build_podcast_generator() -> "PodcastGenerator":
+    from agents.podcast_agent.learn_lab_assistant_agent import PodcastGenerator
+
+    return PodcastGenerator(rag_app=get_rag())
+
+
+resources = ResourceContainer()
+resources.register("pdf_processor", _build_pdf_processor)
+resources.register("rag", _build_rag)
+resources.register("podcast_generator", _build_podcast_generator)
+
+
+def get_pdf_processor() -> "PDFProcessor":
+    """Shared PDF processor (FastAPI dependency)."""
+    return resources.get("pdf_processor")
+
+
+def get_rag() -> "RAGApplication":
+    """Shared RAG application, built on the shared PDF processor (FastAPI dependency)."""
+    return resources.get("rag")
+
+
+def get_podcast_generator() -> "PodcastGenerator":
+    """Shared content generator, built on the shared RAG application (FastAPI dependency)."""
+    return resources.get("podcast_generator")
@@ -1,20 +1,48 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .api.v1 import auth, files, flashcards, podcast, quiz, websocket, sample_data, generate, chat, social
 from .core.config import settings
 from .core.database import engine, Base
+from .core.logger import setup_logger
+from .core.resources import resources
 
 from fastapi.responses import StreamingResponse
 from openai import AsyncOpenAI
 import json
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = setup_logger(__name__)
+
+
+def _log_warmup_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Resource warm-up failed: {task.exception()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables
+    Base.metadata.create_all(bind=engine)
+    app.state.resources = resources
+    # Shared clients are built on first use; PRELOAD_RESOURCES builds them in the background instead
+    warmup = None
+    if os.getenv("PRELOAD_RESOURCES", "false").lower() == "true":
+        warmup = asyncio.create_task(asyncio.to_thread(resources.warm))
+        warmup.add_done_callback(_log_warmup_failure)
+    yield
+    if warmup is not None and not warmup.done():
+        logger.info("Shutting down before resource warm-up finished")
+    resources.close()
+
 
 app = FastAPI(
     title="LearnLab API",
     description="Backend API for LearnLab application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -2,6 +2,7 @@ from .user import User
 from .file import File
 from .flashcard import Flashcard, FlashcardDeck
 from .user_session import UserSession
+from .chat_conversation import ChatConversation
 from .podcast.podcast import Podcast
 from .podcast.progress import PodcastProgress
 from .podcast.analytics import PodcastAnalytics
@@ -12,6 +13,7 @@ __all__ = [
     "Flashcard",
     "FlashcardDeck",
     "UserSession",
+    "ChatConversation",
     "Podcast",
     "PodcastProgress",
     "PodcastAnalytics"
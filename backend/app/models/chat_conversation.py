@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+import uuid
+from ..core.database import Base
+from datetime import datetime
+
+class ChatConversation(Base):
+    """Server-side chat state of one user about one file: recent messages verbatim, older ones summarized."""
+    __tablename__ = "chat_conversations"
+    __table_args__ = (UniqueConstraint('user_id', 'file_id', name='uq_chat_conversation_user_file'),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    file_id = Column(UUID(as_uuid=True), ForeignKey('files.id', ondelete='CASCADE'), nullable=False)
+    summary = Column(Text, nullable=False, default="")
+    # Messages folded into the summary so far
+    summarized_count = Column(Integer, nullable=False, default=0)
+    # [{"role": ..., "content": ...}] after the summarized ones, oldest first
+    messages = Column(JSONB, nullable=False, default=list)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
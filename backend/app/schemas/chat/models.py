@@ -1,5 +1,5 @@
 from typing import List, Literal, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class Message(BaseModel):
     """Base message schema"""
@@ -9,4 +9,13 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     """Request schema for chat endpoint"""
     messages: List[Message]
-    file_id: Optional[str] = None
\ No newline at end of file
+    file_id: Optional[str] = None
+    # Conversation id sent by the chat client; keys the conversation's retrieval session
+    id: Optional[str] = None
+
+
+class BatchQuestionRequest(BaseModel):
+    """Request schema for answering many questions about one file"""
+    file_id: str
+    questions: List[str] = Field(..., min_length=1, max_length=100)
+    top_k: int = Field(3, ge=1, le=20)
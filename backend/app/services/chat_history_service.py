@@ -0,0 +1,173 @@
+import os
+from typing import Dict, List, NamedTuple, Optional
+from uuid import UUID
+
+from openai import AsyncOpenAI
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core.database import SessionLocal
+from ..core.logger import setup_logger, log_error
+from ..models.chat_conversation import ChatConversation
+
+logger = setup_logger(__name__)
+
+ChatMessage = Dict[str, str]
+
+SUMMARY_PROMPT = """You maintain a running summary of a study conversation between a user and an assistant about one document.
+Update the summary with the new messages. Keep the topics covered, questions asked, key answers and anything the user said about their goals or level.
+Write at most 250 words of plain prose and return only the updated summary."""
+
+
+class ConversationState(NamedTuple):
+    summary: str
+    messages: List[ChatMessage]
+    message_count: int
+
+
+class ChatHistoryService:
+    """Bounded server-side chat history per (user, file).
+
+    The last max_turns turns are kept verbatim. Once summarize_every more
+    turns have piled up, the older ones are folded into a running summary
+    with one model call after the reply has been sent, so the history
+    sent with each turn stops growing.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        max_turns: Optional[int] = None,
+        summarize_every: Optional[int] = None,
+        summary_model: Optional[str] = None,
+        summary_max_tokens: Optional[int] = None
+    ):
+        self.client = client
+        self.max_turns = int(os.getenv("CHAT_HISTORY_TURNS", "6")) if max_turns is None else max_turns
+        self.summarize_every = int(os.getenv("CHAT_SUMMARIZE_EVERY", "3")) if summarize_every is None else summarize_every
+        self.summary_model = summary_model or os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+        self.summary_max_tokens = summary_max_tokens or int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+
+    def _get(self, db: Session, user_id: UUID, file_id: UUID, for_update: bool = False) -> Optional[ChatConversation]:
+        query = db.query(ChatConversation).filter(
+            ChatConversation.user_id == user_id,
+            ChatConversation.file_id == file_id
+        )
+        return (query.with_for_update() if for_update else query).first()
+
+    def load(self, db: Session, user_id: UUID, file_id: UUID) -> ConversationState:
+        """Stored summary, verbatim messages and total message count of a conversation."""
+        conversation = self._get(db, user_id, file_id)
+        if conversation is None:
+            return ConversationState("", [], 0)
+        messages = list(conversation.messages)
+        return ConversationState(conversation.summary, messages, conversation.summarized_count + len(messages))
+
+    def clear(self, db: Session, user_id: UUID, file_id: UUID) -> bool:
+        """Forget a conversation; returns whether one existed."""
+        conversation = self._get(db, user_id, file_id)
+        if conversation is None:
+            return False
+        db.delete(conversation)
+        db.commit()
+        return True
+
+    @staticmethod
+    def new_messages(state: ConversationState, incoming: List[ChatMessage]) -> List[ChatMessage]:
+        """Messages of a request that are not stored yet.
+
+        Clients may send only the new message or, like useChat, the whole
+        conversation. A longer list is matched to the stored conversation
+        by the content of the last stored question rather than by position,
+        since a turn whose reply failed is stored without one; the client's
+        copy of that question's reply is dropped. Resending the question
+        that is still unanswered adds nothing.
+        """
+        if not state.message_count:
+            return list(incoming)
+        questions = [m for m in state.messages if m["role"] == "user"]
+        if not questions:
+            return incoming[-1:]
+        last = questions[-1]
+        for start in range(len(incoming) - 1, -1, -1):
+            if incoming[start]["role"] == "user" and incoming[start]["content"] == last["content"]:
+                break
+        else:
+            return incoming[-1:]
+        new = incoming[start + 1:]
+        while new and new[0]["role"] != "user":
+            new = new[1:]
+        if new:
+            return new
+        if state.messages[-1] is last:
+            return []
+        return incoming[-1:]
+
+    def prompt_messages(self, state: ConversationState, new: List[ChatMessage]) -> List[ChatMessage]:
+        """History to send to the model: the summary as a system message, the verbatim turns, then the new messages."""
+        history = []
+        if state.summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{state.summary}"})
+        return history + state.messages + new
+
+    async def summarize(self, summary: str, messages: List[ChatMessage]) -> str:
+        """Fold messages into the running summary."""
+        transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = await self.client.chat.completions.create(
+            model=self.summary_model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+            ],
+            temperature=0,
+            max_tokens=self.summary_max_tokens,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def record_turn(self, user_id: UUID, file_id: UUID, new: List[ChatMessage], reply: List[str]) -> None:
+        """Store a turn's messages and the streamed reply, folding old turns into the summary when due."""
+        try:
+            messages = list(new)
+            if reply:
+                messages.append({"role": "assistant", "content": "".join(reply)})
+            if not messages:
+                return
+            state = await run_in_threadpool(self._append, user_id, file_id, messages)
+
+            keep = 2 * self.max_turns
+            if len(state.messages) <= 2 * (self.max_turns + self.summarize_every):
+                return
+            folded = state.messages[:len(state.messages) - keep]
+            summary = await self.summarize(state.summary, folded)
+            folded_count = state.message_count - len(state.messages)
+            if not await run_in_threadpool(self._fold, user_id, file_id, summary, folded_count, len(folded)):
+                logger.info(f"Conversation {user_id}/{file_id} was summarized concurrently; dropped this summary")
+        except Exception as e:
+            log_error(logger, e, {'operation': 'record_chat_turn', 'file_id': str(file_id)})
+
+    def _append(self, user_id: UUID, file_id: UUID, messages: List[ChatMessage]) -> ConversationState:
+        with SessionLocal() as db:
+            conversation = self._get(db, user_id, file_id, for_update=True)
+            if conversation is None:
+                conversation = ChatConversation(user_id=user_id, file_id=file_id, summary="", summarized_count=0, messages=[])
+                db.add(conversation)
+            # Assign a new list so the JSON column is marked as changed
+            conversation.messages = list(conversation.messages) + messages
+            db.commit()
+            return ConversationState(
+                conversation.summary,
+                list(conversation.messages),
+                conversation.summarized_count + len(conversation.messages)
+            )
+
+    def _fold(self, user_id: UUID, file_id: UUID, summary: str, summarized_count: int, folded: int) -> bool:
+        """Replace the first folded verbatim messages by summary, unless another turn summarized meanwhile."""
+        with SessionLocal() as db:
+            conversation = self._get(db, user_id, file_id, for_update=True)
+            if conversation is None or conversation.summarized_count != summarized_count:
+                return False
+            conversation.summary = summary
+            conversation.summarized_count = summarized_count + folded
+            conversation.messages = list(conversation.messages)[folded:]
+            db.commit()
+            return True
@@ -0,0 +1,4 @@
+import os
+
+# Tests log to the console only, never to the app's log files
+os.environ["LOG_DIR"] = ""
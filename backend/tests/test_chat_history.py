@@ -0,0 +1,35 @@
+from app.services.chat_history_service import ChatHistoryService, ConversationState
+
+
+def user(content):
+    return {"role": "user", "content": content}
+
+
+def assistant(content):
+    return {"role": "assistant", "content": content}
+
+
+def test_new_messages_of_a_full_transcript_or_a_single_message():
+    state = ConversationState("", [user("q1"), assistant("a1")], 2)
+    assert ChatHistoryService.new_messages(state, [user("q1"), assistant("a1"), user("q2")]) == [user("q2")]
+    assert ChatHistoryService.new_messages(state, [user("q2")]) == [user("q2")]
+    assert ChatHistoryService.new_messages(ConversationState("", [], 0), [user("q1")]) == [user("q1")]
+
+
+def test_new_messages_after_a_turn_stored_without_its_reply():
+    # The reply to q2 failed, so the stored conversation is one message short of the client's
+    state = ConversationState("", [user("q1"), assistant("a1"), user("q2")], 3)
+    incoming = [user("q1"), assistant("a1"), user("q2"), assistant("partial a2"), user("q3")]
+    assert ChatHistoryService.new_messages(state, incoming) == [user("q3")]
+
+    # Retrying the unanswered question does not store it twice
+    assert ChatHistoryService.new_messages(state, incoming[:3]) == []
+    assert ChatHistoryService.new_messages(state, [user("q2")]) == []
+
+
+def test_new_messages_when_older_turns_were_summarized():
+    state = ConversationState("q1 and q2 were covered", [user("q3"), assistant("a3")], 6)
+    incoming = [user("q1"), assistant("a1"), user("q2"), assistant("a2"), user("q3"), assistant("a3"), user("q4")]
+    assert ChatHistoryService.new_messages(state, incoming) == [user("q4")]
+    # Asking the last question again is a new turn once it was answered
+    assert ChatHistoryService.new_messages(state, [user("q3")]) == [user("q3")]
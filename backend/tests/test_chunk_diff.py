@@ -0,0 +1,39 @@
+from agents.utils.chunk_diff import chunk_fingerprint, diff_chunks, iter_linked_chunks
+
+
+def _metadata(doc_id, contents):
+    return [
+        {"id": chunk_id, "content": content, "prechunk_id": pre, "postchunk_id": post, "doc_hash": "h"}
+        for chunk_id, pre, post, content, _ in iter_linked_chunks(doc_id, ((c, None) for c in contents))
+    ]
+
+
+def test_chunk_ids_survive_edits_elsewhere():
+    before = _metadata("doc", ["a", "b", "c"])
+    after = _metadata("doc", ["a", "x", "b", "c"])
+
+    assert before[0]["id"] == after[0]["id"]
+    assert before[2]["id"] == after[3]["id"]
+    assert after[1]["prechunk_id"] == after[0]["id"]
+    assert after[1]["postchunk_id"] == after[2]["id"]
+    assert after[-1]["postchunk_id"] == ""
+
+
+def test_repeated_content_gets_unique_ids():
+    ids = [m["id"] for m in _metadata("doc", ["a", "a", "a"])]
+    assert len(set(ids)) == 3
+
+
+def test_diff_embeds_new_relinks_neighbours_and_deletes_removed():
+    stored = _metadata("doc", ["a", "b", "c", "d"])
+    existing = {m["id"]: chunk_fingerprint(m) for m in stored}
+    new = _metadata("doc", ["a", "x", "c", "d"])
+    for m in new:
+        m["doc_hash"] = "changed"
+
+    diff = diff_chunks(existing, new)
+
+    assert [m["content"] for m in diff.to_embed] == ["x"]
+    assert sorted(m["content"] for m in diff.to_relink) == ["a", "c"]
+    assert diff.to_delete == [stored[1]["id"]]
+    assert diff.unchanged == 1
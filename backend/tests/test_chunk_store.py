@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine
+
+from agents.utils.chunk_store import ChunkTextStore, split_chunk_metadata
+from agents.utils.pdf_processor import PDFProcessor
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkTextStore(create_engine(f"sqlite:///{tmp_path / 'chunks.db'}"), cache_size=2)
+
+
+def _chunk(chunk_id, content):
+    return {"id": chunk_id, "doc_id": "doc", "title": "book", "content": content, "pages": 3, "prechunk_id": ""}
+
+
+def test_index_metadata_keeps_only_ids_and_filter_fields():
+    assert split_chunk_metadata(_chunk("doc#a", "text")) == {"doc_id": "doc", "title": "book", "prechunk_id": ""}
+
+
+def test_rows_round_trip_through_the_lru(store):
+    store.put_many([_chunk("doc#a", "first"), _chunk("doc#b", "second")])
+
+    assert store.get_many(["doc#a", "doc#b", "doc#missing"]) == {
+        "doc#a": {"content": "first", "pages": 3},
+        "doc#b": {"content": "second", "pages": 3}
+    }
+    assert store.get_many(["doc#a"])["doc#a"]["content"] == "first"
+    assert store.stats()["hits"] == 1
+
+    store.put_many([_chunk("doc#a", "edited")])
+    assert store.get_many(["doc#a"])["doc#a"]["content"] == "edited"
+
+
+def test_deletes_clear_store_and_cache(store):
+    store.put_many([_chunk("doc#a", "first"), _chunk("doc#b", "second")])
+    store.get_many(["doc#a", "doc#b"])
+
+    store.delete_many(["doc#a"])
+    assert list(store.get_many(["doc#a", "doc#b"])) == ["doc#b"]
+
+    store.delete_documents(["doc"])
+    assert store.get_many(["doc#b"]) == {}
+
+
+@pytest.mark.parametrize("window_chars, before, after", [(3, "rst", "thi"), (0, None, None)])
+def test_hydrated_matches_follow_the_configured_window_width(store, window_chars, before, after):
+    store.put_many([_chunk("doc#a", "first"), _chunk("doc#b", "second"), _chunk("doc#c", "third")])
+    processor = PDFProcessor.__new__(PDFProcessor)
+    processor.chunk_store = store
+    match = {"id": "doc#b", "metadata": {"prechunk_id": "doc#a", "postchunk_id": "doc#c"}}
+
+    processor.hydrate_matches([match], window_chars)
+    assert match["metadata"]["content"] == "second"
+    assert match["metadata"].get("context_before") == before
+    assert match["metadata"].get("context_after") == after
@@ -0,0 +1,34 @@
+from agents.utils.context_assembler import mmr_order, pack_context
+from agents.utils.embedding_dispatcher import count_tokens
+
+
+def test_mmr_prefers_diverse_passages():
+    query = [1.0, 0.0, 0.0]
+    vectors = [[0.9, 0.1, 0.0], [0.89, 0.11, 0.0], [0.7, 0.0, 0.7]]
+    assert mmr_order(query, vectors, mmr_lambda=1) == [0, 1, 2]
+    assert mmr_order(query, vectors, mmr_lambda=0.5) == [0, 2, 1]
+    assert mmr_order(query, [None, [1.0, 0.0, 0.0]], mmr_lambda=0.5) == [0, 1]
+
+
+def test_pack_context_merges_overlaps_and_respects_budget():
+    shared = "the mitochondria is the powerhouse of the cell and makes ATP"
+    passages = [
+        ("Bio", f"Chapter one opens here. {shared}"),
+        ("Bio", f"{shared}. Chapter two continues."),
+        ("Bio", "Chapter one opens here."),
+        ("Chem", "Acids donate protons. " * 40),
+        ("Chem", "Bases accept protons.")
+    ]
+    vectors = [None] * len(passages)
+
+    unbounded = pack_context(passages, vectors, [1.0], max_tokens=0)
+    assert unbounded[0] == f"# Bio\n\nChapter one opens here. {shared}. Chapter two continues."
+    assert len(unbounded) == 3
+
+    budget = count_tokens(unbounded[0]) + 20
+    bounded = pack_context(passages, vectors, [1.0], max_tokens=budget)
+    assert bounded == [unbounded[0], "# Chem\n\nBases accept protons."]
+
+    [truncated] = pack_context(passages[3:4], [None], [1.0], max_tokens=30)
+    assert truncated.startswith("# Chem\n\nAcids donate protons.")
+    assert count_tokens(truncated) <= 30
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from agents.utils.context_windows import assemble_context_windows, iter_with_context_windows, merge_overlap
+from agents.utils.pdf_processor import PDFProcessor
+
+
+def _chunks(contents, window_chars=5):
+    metadata = [
+        {
+            "content": content,
+            "prechunk_id": f"c{i - 1}" if i > 0 else "",
+            "postchunk_id": f"c{i + 1}" if i + 1 < len(contents) else ""
+        }
+        for i, content in enumerate(contents)
+    ]
+    list(iter_with_context_windows(((m, None) for m in metadata), window_chars))
+    return {f"c{i}": {"id": f"c{i}", "metadata": m} for i, m in enumerate(metadata)}
+
+
+def test_windows_hold_neighbour_text():
+    chunks = _chunks(["aaaaaaa", "bbbbbbb", "ccccccc"])
+    assert chunks["c0"]["metadata"]["context_before"] == ""
+    assert chunks["c1"]["metadata"]["context_before"] == "aaaaa"
+    assert chunks["c1"]["metadata"]["context_after"] == "ccccc"
+    assert chunks["c2"]["metadata"]["context_after"] == ""
+
+
+def test_single_match_uses_its_window():
+    chunks = _chunks(["aaaaaaa", "bbbbbbb", "ccccccc"])
+    [(metadata, text)] = assemble_context_windows([chunks["c1"]])
+    assert metadata is chunks["c1"]["metadata"]
+    assert text == "aaaaa\nbbbbbbb\nccccc"
+
+
+def test_adjacent_matches_are_merged_without_repeating_text():
+    chunks = _chunks(["aaaaaaa", "bbbbbbb", "ccccccc", "ddddddd"])
+    [(metadata, text)] = assemble_context_windows([chunks["c2"], chunks["c1"]])
+    assert metadata is chunks["c1"]["metadata"]
+    assert text == "aaaaa\nbbbbbbb\nccccccc\nddddd"
+
+
+def test_matches_one_chunk_apart_share_the_gap_once():
+    chunks = _chunks(["aaaaaaa", "bbb", "ccccccc", "0123456789abc", "eeeeeee"], window_chars=5)
+    passages = assemble_context_windows([chunks["c2"], chunks["c0"], chunks["c4"]])
+    assert [text for _, text in passages] == ["aaaaaaa\nbbb\nccccccc\n01234", "89abc\neeeeeee"]
+
+
+def test_merge_overlap_requires_a_real_overlap():
+    assert merge_overlap("hello wor", "world", min_overlap=3) == ("hello world", True)
+    assert merge_overlap("abc", "xyz", min_overlap=1) == ("", False)
+
+
+def test_query_time_windows_use_the_configured_width():
+    processor = PDFProcessor.__new__(PDFProcessor)
+    fetched = []
+
+    def fetch(ids, namespace=""):
+        fetched.append(ids)
+        return {"c0": SimpleNamespace(metadata={"content": "aaaaaaa"}), "c2": SimpleNamespace(metadata={"content": "ccccccc"})}
+
+    processor.index = SimpleNamespace(fetch=fetch)
+    match = {"id": "c1", "metadata": {"content": "bbb", "prechunk_id": "c0", "postchunk_id": "c2"}}
+
+    processor.fill_context_windows([match], 0)
+    assert fetched == [] and "context_before" not in match["metadata"]
+
+    processor.fill_context_windows([match], 2)
+    assert (match["metadata"]["context_before"], match["metadata"]["context_after"]) == ("aa", "cc")
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine
+
+from agents.utils.document_catalog import DocumentCatalog
+from agents.utils.sparse_encoder import BM25Stats
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DocumentCatalog(create_engine(f"sqlite:///{tmp_path / 'catalog.db'}"))
+
+
+def test_documents_are_listed_only_once_ready(catalog):
+    doc = {"doc_id": "doc_1", "file_id": "f1", "user_id": "u1", "title": "book"}
+    catalog.begin_indexing(doc, embedding_model="model", namespace="file_f1")
+    assert catalog.list_titles() == []
+    assert catalog.find_by_hash("h1") is None
+
+    catalog.complete_indexing("doc_1", "h1", [("doc_1#a", "fa"), ("doc_1#b", "fb")])
+
+    assert catalog.list_titles() == ["book"]
+    assert catalog.find_by_hash("h1") == "doc_1"
+    assert catalog.get_chunk_fingerprints("doc_1") == {"doc_1#a": "fa", "doc_1#b": "fb"}
+    assert catalog.get_documents_by_file("f1") == [("doc_1", "file_f1")]
+
+
+def test_reindexing_replaces_the_chunk_set(catalog):
+    doc = {"doc_id": "doc_1", "title": "book"}
+    catalog.begin_indexing(doc, embedding_model="model")
+    catalog.complete_indexing("doc_1", "h1", [("doc_1#a", "fa"), ("doc_1#b", "fb")])
+    catalog.begin_indexing(doc, embedding_model="model")
+    catalog.complete_indexing("doc_1", "h2", [("doc_1#b", "fb"), ("doc_1#c", "fc")])
+
+    assert catalog.get_chunk_ids("doc_1") == ["doc_1#b", "doc_1#c"]
+    assert catalog.find_by_hash("h1") is None
+
+
+def test_failed_and_deleted_documents_disappear(catalog):
+    catalog.begin_indexing({"doc_id": "doc_1", "file_id": "f1", "title": "book"}, embedding_model="model")
+    catalog.mark_failed("doc_1")
+    assert catalog.list_titles() == []
+
+    catalog.delete_documents(["doc_1"])
+    assert catalog.get_documents_by_file("f1") == []
+
+
+def test_shared_documents_are_reference_counted_by_file_links(catalog):
+    catalog.begin_indexing({"doc_id": "content_1", "title": "book"}, embedding_model="model", namespace="content_1")
+    assert not catalog.link_file("f1", "u1", "content_1", require_ready=True)
+    catalog.complete_indexing("content_1", "h1", [("content_1#a", "fa")])
+
+    assert catalog.link_file("f1", "u1", "content_1", require_ready=True)
+    assert catalog.link_file("f2", "u2", "content_1", require_ready=True)
+    assert catalog.get_documents_by_file("f2") == [("content_1", "content_1")]
+    assert catalog.get_linked_document("f2", user_id="u1") is None
+
+    assert catalog.unlink_file("f1") == ("content_1", 1)
+    assert catalog.unlink_file("f2") == ("content_1", 0)
+    assert catalog.unlink_file("f2") is None
+    # The last reference marks the document for deletion, so nothing new can link to it
+    assert not catalog.link_file("f3", "u3", "content_1", require_ready=True)
+    assert catalog.list_titles() == []
+
+
+def test_term_stats_are_replaced_on_reindex_and_deleted_with_the_document(catalog):
+    doc = {"doc_id": "doc_1", "title": "book"}
+    catalog.begin_indexing(doc, embedding_model="model")
+    catalog.complete_indexing("doc_1", "h1", [("doc_1#a", "fa")], term_stats=BM25Stats.from_texts(["ATP synthase", "ATP"]))
+
+    stats = catalog.get_term_stats("doc_1", ["atp", "synthase", "missing"])
+    assert (stats.chunk_count, stats.avg_length, stats.document_frequencies) == (2, 1.5, {"atp": 2, "synthase": 1})
+
+    catalog.complete_indexing("doc_1", "h2", [("doc_1#a", "fa")])
+    assert catalog.get_term_stats("doc_1", ["atp"]) is None
+
+    catalog.complete_indexing("doc_1", "h3", [("doc_1#a", "fa")], term_stats=BM25Stats.from_texts(["ATP"]))
+    catalog.delete_documents(["doc_1"])
+    assert catalog.get_term_stats("doc_1", ["atp"]) is None
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agents.utils.embedding_cache import GROWTH_SLOTS, EmbeddingCache, CachedEncoder, QueryEmbeddingCache
+
+
+class CountingEncoder:
+    """Fake encoder that records every text it is asked to embed"""
+    name = "fake-model"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, docs):
+        self.calls.append(list(docs))
+        return [[float(len(doc)), 1.0] for doc in docs]
+
+
+def test_cached_encoder_only_embeds_misses(tmp_path):
+    encoder = CountingEncoder()
+    cached = CachedEncoder(encoder, EmbeddingCache(str(tmp_path), dims=2))
+
+    assert cached(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cached(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert encoder.calls == [["a", "bb"], ["ccc"]]
+    assert cached.cache.hits == 1
+
+
+def test_cache_persists_and_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dims=2, max_entries=2)
+    cache.put_many([("k1", [1.0, 0.0]), ("k2", [2.0, 0.0])])
+    cache.get_many(["k1"])
+    cache.put_many([("k3", [3.0, 0.0])])
+
+    reopened = EmbeddingCache(str(tmp_path), dims=2, max_entries=2)
+    k1, k2, k3 = reopened.get_many(["k1", "k2", "k3"])
+    assert k1.tolist() == [1.0, 0.0]
+    assert k2 is None
+    assert k3.tolist() == [3.0, 0.0]
+    assert reopened.stats()["entries"] == 2
+
+
+class FailingCommit:
+    """sqlite3 connection proxy whose COMMIT fails, as if the disk filled up"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, *args):
+        if sql == "COMMIT":
+            raise OSError("disk full")
+        return self.db.execute(sql, *args)
+
+
+def test_failed_put_leaves_stored_vectors_intact(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dims=2, max_entries=1)
+    cache.put_many([("k1", [1.0, 0.0])])
+
+    db, cache.db = cache.db, FailingCommit(cache.db)
+    with pytest.raises(OSError):
+        cache.put_many([("k2", [2.0, 0.0])])
+    cache.db = db
+    assert cache.get_many(["k1"])[0].tolist() == [1.0, 0.0]
+
+
+def test_reused_slot_reads_as_miss_and_file_grows_in_steps(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), dims=2, max_entries=10 * GROWTH_SLOTS)
+    cache.put_many([("k1", [1.0, 0.0])])
+    assert os.path.getsize(tmp_path / "vectors.bin") == GROWTH_SLOTS * 2 * 4
+
+    # Another process has claimed the slot and not yet finished writing it
+    cache.slot_tags[0] = 0
+    assert cache.get_many(["k1"]) == [None]
+    cache.put_many([("k1", [1.0, 0.0])])
+    assert cache.get_many(["k1"])[0].tolist() == [1.0, 0.0]
+
+
+class SlowEncoder(CountingEncoder):
+    """CountingEncoder that blocks until released, so concurrent callers overlap"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def __call__(self, docs):
+        self.release.wait(5)
+        return super().__call__(docs)
+
+    async def acall(self, docs):
+        return await asyncio.to_thread(self, docs)
+
+
+def test_query_cache_normalizes_evicts_and_expires(tmp_path):
+    encoder = CountingEncoder()
+    cache = QueryEmbeddingCache(encoder, max_entries=2, ttl=60, store=EmbeddingCache(str(tmp_path), dims=2))
+
+    assert cache.embed("  what  is\nRAG ") == [11.0, 1.0]
+    assert cache.embed("what is RAG") == [11.0, 1.0]
+    cache.embed("b")
+    cache.embed("cc")
+    assert encoder.calls == [["what is RAG"], ["b"], ["cc"]]
+
+    # Evicted from the LRU but still in the persistent store
+    cache.embed("what is RAG")
+    assert len(encoder.calls) == 3
+    assert cache.stats()["store_hits"] == 1
+
+    cache.ttl = 0
+    cache.store = None
+    cache.embed("fresh")
+    cache.embed("fresh")
+    assert encoder.calls[-2:] == [["fresh"], ["fresh"]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_query_cache_coalesces_concurrent_lookups():
+    encoder = SlowEncoder()
+    cache = QueryEmbeddingCache(encoder)
+
+    async def lookups():
+        return await asyncio.gather(*(cache.aembed("same question") for _ in range(4)))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        threaded = [executor.submit(cache.embed, "same question") for _ in range(4)]
+        loop_thread = executor.submit(asyncio.run, lookups())
+        threading.Timer(0.2, encoder.release.set).start()
+        results = [future.result() for future in threaded] + loop_thread.result()
+
+    assert results == [[13.0, 1.0]] * 8
+    assert encoder.calls == [["same question"]]
+    assert cache.stats()["misses"] == 1
+
+
+def test_query_cache_embeds_a_batch_in_one_call():
+    encoder = CountingEncoder()
+    cache = QueryEmbeddingCache(encoder)
+    cache.embed("cached")
+
+    vectors = cache.embed_many(["a", "cached", " a ", "bb"])
+    assert vectors == [[1.0, 1.0], [6.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+    assert encoder.calls == [["cached"], ["a", "bb"]]
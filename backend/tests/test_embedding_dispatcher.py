@@ -0,0 +1,59 @@
+import threading
+import time
+
+from agents.utils.embedding_cache import CachedEncoder, EmbeddingCache
+from agents.utils.embedding_dispatcher import EmbeddingDispatcher, TokenBucket, pack_batches
+
+
+def test_pack_batches_respects_token_and_item_limits():
+    """Batches close before exceeding either limit and keep input order"""
+    assert pack_batches([3, 3, 3, 9, 1], max_batch_tokens=6, max_batch_items=10) == [[0, 1], [2], [3], [4]]
+    assert pack_batches([1, 1, 1], max_batch_tokens=100, max_batch_items=2) == [[0, 1], [2]]
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)
+    bucket.acquire(1)
+    start = time.monotonic()
+    bucket.acquire(1)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_dispatcher_runs_batches_concurrently_in_order():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def encoder(texts):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        return [[float(t)] for t in texts]
+
+    dispatcher = EmbeddingDispatcher(encoder, max_concurrency=3, max_batch_tokens=1, max_batch_items=1)
+    texts = [str(i) for i in range(6)]
+    assert dispatcher.embed(texts) == [[float(i)] for i in range(6)]
+    assert max(peak) == 3
+    assert dispatcher.stats()["requests_sent"] == 6
+    assert dispatcher.throughput > 0
+
+
+def test_cached_chunks_take_no_rate_limit_tokens(tmp_path):
+    class Encoder:
+        name = "fake-model"
+
+        def __call__(self, texts):
+            return [[float(len(t)), 1.0] for t in texts]
+
+    dispatcher = EmbeddingDispatcher(Encoder(), requests_per_minute=60, tokens_per_minute=60)
+    cached = CachedEncoder(dispatcher, EmbeddingCache(str(tmp_path), dims=2))
+    cached(["alpha", "beta"])
+    requests, tokens = dispatcher.request_bucket.tokens, dispatcher.token_bucket.tokens
+
+    assert cached(["beta", "alpha"]) == [[4.0, 1.0], [5.0, 1.0]]
+    assert dispatcher.stats()["requests_sent"] == 1
+    assert dispatcher.stats()["chunks_embedded"] == 2
+    assert (dispatcher.request_bucket.tokens, dispatcher.token_bucket.tokens) == (requests, tokens)
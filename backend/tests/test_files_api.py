@@ -0,0 +1,125 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from agents.utils.chunk_diff import chunk_fingerprint, diff_chunks, iter_linked_chunks
+from app.api.v1 import files
+from app.core.database import get_db
+from app.core.resources import get_pdf_processor
+from app.core.security import get_current_user
+from app.main import app
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *conditions):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession:
+    """Just enough of a SQLAlchemy session for the upload and replace endpoints"""
+
+    def __init__(self):
+        self.files = []
+
+    def query(self, model):
+        return FakeQuery(self.files)
+
+    def add(self, row):
+        self.files.append(row)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def refresh(self, row):
+        row.id = row.id or uuid.uuid4()
+        row.created_at = row.updated_at = datetime.utcnow()
+
+
+class FakeProcessor:
+    """Indexes "\\n\\n"-separated text by chunk diff against what is stored per doc_id"""
+    dedup_mode = "off"
+    embedding_dispatcher = SimpleNamespace(stats=lambda: {})
+
+    def __init__(self):
+        self.stored = {}
+        self.indexed = []
+        self.detached = []
+
+    def file_doc_id(self, file_id):
+        return f"doc_{file_id}"
+
+    def describe_pdf(self, file_path):
+        return {"title": "notes", "pages": 1}
+
+    def read_pdf(self, file_path):
+        with open(file_path) as pdf:
+            return {"title": "notes", "pages": 1, "content": pdf.read()}
+
+    def index_document(self, doc_info, overwrite=False):
+        doc_id = doc_info["doc_id"]
+        metadata = [
+            {"id": chunk_id, "prechunk_id": pre, "postchunk_id": post, "content": content}
+            for chunk_id, pre, post, content, _ in iter_linked_chunks(
+                doc_id, ((chunk, None) for chunk in doc_info["content"].split("\n\n"))
+            )
+        ]
+        diff = diff_chunks(self.stored.get(doc_id, {}), metadata)
+        self.stored[doc_id] = {m["id"]: chunk_fingerprint(m) for m in metadata}
+        self.indexed.append((doc_id, len(diff.to_embed), len(diff.to_delete)))
+        return len(metadata), bool(diff.unchanged or diff.to_relink)
+
+    def detach_shared_document(self, file_id):
+        self.detached.append(file_id)
+        return False
+
+
+def test_replacing_a_file_reembeds_only_changed_chunks(monkeypatch):
+    session, processor = FakeSession(), FakeProcessor()
+    app.dependency_overrides[get_db] = lambda: session
+    app.dependency_overrides[get_pdf_processor] = lambda: processor
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=uuid.uuid4())
+
+    async def upload_file(file, user_id):
+        return f"uploads/{uuid.uuid4()}"
+
+    async def presigned_url(s3_key, expires_in=3600):
+        return f"https://example.test/{s3_key}"
+
+    async def delete_file(s3_key):
+        return True
+
+    monkeypatch.setattr(files.s3_service, "upload_file", upload_file)
+    monkeypatch.setattr(files.s3_service, "generate_presigned_url", presigned_url)
+    monkeypatch.setattr(files.s3_service, "delete_file", delete_file)
+    try:
+        client = TestClient(app)
+        uploaded = client.post(
+            "/api/files/upload",
+            files={"file": ("notes.pdf", b"intro\n\nchapter one\n\nsummary", "application/pdf")}
+        )
+        assert uploaded.status_code == 200
+        file_id = uploaded.json()["id"]
+
+        replaced = client.put(
+            f"/api/files/files/{file_id}",
+            files={"file": ("notes.pdf", b"intro\n\nchapter one, revised\n\nsummary", "application/pdf")}
+        )
+        assert replaced.status_code == 200
+        assert replaced.json()["id"] == file_id
+    finally:
+        app.dependency_overrides.clear()
+
+    # Same document both times: the edit embeds one chunk and deletes the one it replaced
+    assert processor.indexed == [(f"doc_{file_id}", 3, 0), (f"doc_{file_id}", 1, 1)]
+    assert processor.detached == [file_id]
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from agents.utils.ingest_pipeline import run_embed_upsert_pipeline
+
+
+def test_pipeline_overlaps_embedding_with_upserts():
+    """Total time approaches max(embed, upsert) rather than their sum"""
+    upserted = []
+
+    def embed(items):
+        time.sleep(0.05)
+        return [i * 10 for i in items]
+
+    def upsert(batch, embeds):
+        time.sleep(0.05)
+        upserted.append((batch, embeds))
+
+    start = time.perf_counter()
+    results = run_embed_upsert_pipeline(([i] for i in range(6)), embed, upsert)
+    elapsed = time.perf_counter() - start
+
+    assert upserted == [([i], [i * 10]) for i in range(6)]
+    assert all(r.error is None for r in results)
+    assert elapsed < 0.5
+
+
+def test_pipeline_records_failures_per_batch():
+    def embed(items):
+        if 1 in items:
+            raise RuntimeError("rate limited")
+        return items
+
+    def upsert(batch, embeds):
+        if batch == [2]:
+            raise RuntimeError("upsert failed")
+
+    results = run_embed_upsert_pipeline(([i] for i in range(4)), embed, upsert)
+    assert [r.error for r in results] == [None, "rate limited", "upsert failed", None]
+
+
+def test_pipeline_reraises_producer_errors():
+    def batches():
+        yield [1]
+        raise ValueError("splitter failed")
+
+    with pytest.raises(ValueError):
+        run_embed_upsert_pipeline(batches(), lambda items: items, lambda batch, embeds: None)
@@ -1,4 +1,10 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
 from fastapi.testclient import TestClient
+from app.core.resources import resources
 from app.main import app
 
 client = TestClient(app)
@@ -16,4 +22,34 @@ def test_root():
     """Test root endpoint"""
     response = client.get("/")
     assert response.status_code == 200
-    assert "message" in response.json()
\ No newline at end of file
+    assert "message" in response.json()
+
+
+# Importing and starting the app must not build the PDF processor or call external services
+IMPORT_BUDGET_SECONDS = 10
+STARTUP_BUDGET_SECONDS = 5
+
+
+def test_app_imports_within_budget_without_building_clients():
+    # A fresh interpreter, so modules imported by other tests don't hide the cost
+    code = (
+        "import time; start = time.perf_counter(); import app.main; "
+        "from app.core.resources import resources; "
+        "print(time.perf_counter() - start, len(resources.built()))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, timeout=120, cwd=Path(__file__).resolve().parents[1]
+    )
+    assert result.returncode == 0, result.stderr
+    elapsed, built = result.stdout.split()[-2:]
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
+    assert built == "0"
+
+
+def test_startup_within_budget_without_building_clients():
+    start = time.perf_counter()
+    with TestClient(app) as started:
+        assert started.get("/health").status_code == 200
+    assert time.perf_counter() - start < STARTUP_BUDGET_SECONDS
+    assert resources.built() == []
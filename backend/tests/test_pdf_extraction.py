@@ -0,0 +1,17 @@
+from agents.utils.pdf_extraction import split_page_ranges, join_pages
+
+
+def test_split_page_ranges_covers_every_page_in_order():
+    """Ranges are contiguous, non-empty and cover the whole document"""
+    ranges = split_page_ranges(10, 3)
+    assert ranges == [(0, 4), (4, 7), (7, 10)]
+    assert split_page_ranges(2, 8) == [(0, 1), (1, 2)]
+
+
+def test_join_pages_records_char_and_byte_offsets():
+    """Offsets point at the first character/byte of every page"""
+    extracted = join_pages(["abc", "é", "xy"])
+    assert extracted.content == "abcéxy"
+    assert extracted.pages == 3
+    assert extracted.page_char_offsets == [0, 3, 4]
+    assert extracted.page_byte_offsets == [0, 3, 5]
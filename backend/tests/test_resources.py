@@ -0,0 +1,51 @@
+import threading
+import time
+
+from app.core.resources import ResourceContainer
+
+
+class _Client:
+    closed = []
+
+    def __init__(self, name):
+        self.name = name
+
+    def close(self):
+        _Client.closed.append(self.name)
+
+
+def test_resources_are_built_once_on_first_use():
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return _Client("processor")
+
+    container = ResourceContainer()
+    container.register("processor", build)
+    assert container.built() == []
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(container.get("processor"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_dependent_resources_share_and_close_newest_first():
+    container = ResourceContainer()
+    container.register("processor", lambda: _Client("processor"))
+    container.register("rag", lambda: (container.get("processor"), _Client("rag"))[1])
+    _Client.closed = []
+
+    container.get("rag")
+    assert container.built() == ["processor", "rag"]
+
+    container.close()
+    assert _Client.closed == ["rag", "processor"]
+    assert container.built() == []
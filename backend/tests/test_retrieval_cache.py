@@ -0,0 +1,37 @@
+from agents.utils.retrieval_cache import RetrievalCache, retrieval_tags
+
+
+def test_lookups_normalize_query_and_respect_bounds():
+    cache = RetrievalCache(max_entries=2, ttl=60)
+    key = RetrievalCache.make_key("summarize  chapter 3", 3, "model", file_id="f1")
+    assert cache.put(key, ["passage"], retrieval_tags("f1", "d1"), cache.generation)
+
+    assert cache.get(RetrievalCache.make_key(" summarize chapter 3\n", 3, "model", file_id="f1")) == ["passage"]
+    assert cache.get(RetrievalCache.make_key("summarize chapter 3", 5, "model", file_id="f1")) is None
+
+    for question in ("q2", "q3"):
+        cache.put(RetrievalCache.make_key(question, 3, "model", file_id="f1"), [question], [], cache.generation)
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 2
+
+    cache.ttl = 0
+    expired = RetrievalCache.make_key("q4", 3, "model")
+    cache.put(expired, ["q4"], [], cache.generation)
+    assert cache.get(expired) is None
+
+
+def test_invalidation_drops_tagged_entries_and_in_flight_results():
+    cache = RetrievalCache()
+    shared = RetrievalCache.make_key("q", 3, "model", file_id="f1")
+    other = RetrievalCache.make_key("q", 3, "model", file_id="f2")
+    cache.put(shared, ["old"], retrieval_tags("f1", "content_abc"), cache.generation)
+    cache.put(other, ["kept"], retrieval_tags("f2", "d2"), cache.generation)
+
+    in_flight = cache.generation
+    assert cache.invalidate(retrieval_tags(doc_id="content_abc")) == 1
+    assert cache.get(shared) is None
+    assert cache.get(other) == ["kept"]
+
+    # A result computed before the invalidation is not stored
+    assert not cache.put(shared, ["stale"], retrieval_tags("f1", "content_abc"), in_flight)
+    assert cache.get(shared) is None
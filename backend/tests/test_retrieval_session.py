@@ -0,0 +1,60 @@
+from agents.utils.retrieval_cache import retrieval_tags
+from agents.utils.retrieval_session import EXTEND, REFRESH, REUSE, RetrievalSessionStore
+
+
+def test_turns_reuse_extend_or_refresh_by_similarity_to_centroid():
+    store = RetrievalSessionStore(reuse_threshold=0.8, extend_threshold=0.5)
+    key = ("f1", "doc", "c1")
+    assert store.decide(store.get(key), [1.0, 0.0]) == REFRESH
+    store.update(key, REFRESH, [1.0, 0.0], ["a", "b"], "what is rag", retrieval_tags("f1"))
+
+    session = store.get(key)
+    assert store.decide(session, [0.95, 0.1]) == REUSE
+    assert store.update(key, REUSE, [0.95, 0.1], [], "explain that more simply") == ["a", "b"]
+    assert session.anchor == "what is rag"
+
+    assert store.decide(session, [0.7, 0.7]) == EXTEND
+    assert store.update(key, EXTEND, [0.7, 0.7], ["c", "a"], "and its costs?") == ["c", "a", "b"]
+    assert session.anchor == "and its costs?"
+
+    assert store.decide(session, [-1.0, 0.0]) == REFRESH
+    assert store.update(key, REFRESH, [-1.0, 0.0], ["z"], "unrelated") == ["z"]
+    assert store.stats()["reuse"] == 1
+
+
+def test_sessions_are_bounded_and_invalidated_by_tag():
+    store = RetrievalSessionStore(max_sessions=2)
+    for conversation in ("c1", "c2", "c3"):
+        store.update(("f1", None, conversation), REFRESH, [1.0], ["p"], "q", retrieval_tags("f1"))
+    store.update(("f2", None, "c4"), REFRESH, [1.0], ["p"], "q", retrieval_tags("f2"))
+    assert store.get(("f1", None, "c1")) is None
+
+    assert store.invalidate(retrieval_tags(file_id="f1")) == 1
+    assert store.get(("f1", None, "c3")) is None
+    assert store.get(("f2", None, "c4")) is not None
+
+
+def test_reindexing_a_shared_document_drops_sessions_of_every_linked_file():
+    store = RetrievalSessionStore()
+    store.update(("f1", "doc", "c1"), REFRESH, [1.0], ["p"], "q", retrieval_tags("f1", "d1", "doc"))
+    store.update(("f2", "doc", "c2"), REFRESH, [1.0], ["p"], "q", retrieval_tags("f2", "d1", "doc"))
+    assert store.invalidate(retrieval_tags(doc_id="d1")) == 2
+
+    # A search that overlapped an invalidation is answered but not kept
+    generation = store.generation
+    store.invalidate(retrieval_tags(doc_id="d1"))
+    assert store.update(("f1", "doc", "c1"), REFRESH, [1.0], ["old"], "q", generation=generation) == ["old"]
+    assert store.get(("f1", "doc", "c1")) is None
+
+
+def test_reuse_of_a_session_dropped_after_the_decision_records_nothing():
+    store = RetrievalSessionStore()
+    key = ("f1", "doc", "c1")
+    store.update(key, REFRESH, [1.0], ["p"], "q", retrieval_tags("f1", "d1", "doc"))
+    session = store.get(key)
+    assert store.decide(session, [1.0]) == REUSE
+
+    store.invalidate(retrieval_tags(doc_id="d1"))
+    assert store.update(key, REUSE, [1.0], [], "again?") is None
+    assert store.get(key) is None
+    assert store.stats()["reuse"] == 0
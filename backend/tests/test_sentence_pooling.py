@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from semantic_router.schema import DocumentSplit
+
+from agents.utils import sentence_pooling
+from agents.utils.sentence_pooling import pool_split_embeddings
+
+
+def test_pool_split_embeddings_weights_sentences_by_tokens(monkeypatch):
+    monkeypatch.setattr(sentence_pooling, "tiktoken_length", lambda text: len(text.split()))
+    splits = [
+        DocumentSplit(docs=["one two three", "four"]),
+        DocumentSplit(docs=["five"]),
+    ]
+    sentence_embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 2.0]])
+
+    first, second = pool_split_embeddings(splits, sentence_embeddings)
+
+    # weights 3:1 give [0.75, 0.25] before normalisation
+    assert first == pytest.approx([3 / np.sqrt(10), 1 / np.sqrt(10)])
+    assert second == pytest.approx([0.0, 1.0])
+
+
+def test_pool_split_embeddings_rejects_misaligned_input():
+    with pytest.raises(ValueError):
+        pool_split_embeddings([DocumentSplit(docs=["a", "b"])], np.zeros((3, 2)))
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+
+from agents.utils.document_catalog import DocumentCatalog
+from agents.utils.pdf_processor import PDFProcessor
+from agents.utils.retrieval_cache import RetrievalCache
+from agents.utils.retrieval_session import RetrievalSessionStore
+from agents.utils.sparse_encoder import BM25Stats, encode_document, encode_query, hybrid_scale, term_index, tokenize
+from agents.utils.vector_store import NumpyVectorStore
+
+
+def _dot(a, b):
+    weights = dict(zip(a["indices"], a["values"]))
+    return sum(weights.get(i, 0.0) * v for i, v in zip(b["indices"], b["values"]))
+
+
+def test_bm25_vectors_rank_the_chunk_with_the_rare_term():
+    chunks = [
+        "The cell makes energy in the mitochondria.",
+        "Glycolysis splits glucose; the cell gains two ATP.",
+        "The cell membrane controls what enters the cell."
+    ]
+    stats = BM25Stats.from_texts(chunks)
+    documents = [encode_document(tokenize(chunk), stats.avg_length) for chunk in chunks]
+    query = encode_query(tokenize("How much ATP does the cell gain?"), stats.chunk_count, stats.document_frequencies)
+
+    scores = [_dot(query, document) for document in documents]
+    assert scores.index(max(scores)) == 1
+    assert sum(query["values"]) == pytest.approx(1.0)
+    assert encode_query(tokenize("photosynthesis"), stats.chunk_count, stats.document_frequencies) is None
+    assert tokenize("The NADH and H2O") == ["nadh", "h2o"]
+
+
+def test_hybrid_scale_weights_dense_against_sparse():
+    dense, sparse = hybrid_scale([1.0, 2.0], {"indices": [term_index("atp")], "values": [0.5]}, alpha=0.75)
+    assert dense == [0.75, 1.5]
+    assert sparse["values"] == [0.125]
+    with pytest.raises(ValueError):
+        hybrid_scale([1.0], sparse, alpha=1.5)
+
+
+def _processor(tmp_path, sparse_mode):
+    processor = PDFProcessor.__new__(PDFProcessor)
+    processor.index = NumpyVectorStore(str(tmp_path / "index"), dims=2)
+    processor.catalog = DocumentCatalog(create_engine(f"sqlite:///{tmp_path / 'catalog.db'}"))
+    processor.chunk_store = None
+    processor.context_window_chars = 0
+    processor.namespace_mode = "off"
+    processor.chunk_embedding_mode = "reembed"
+    processor.sparse_mode = sparse_mode
+    processor.encoder = SimpleNamespace(name="fake")
+    processor.chunk_encoder = lambda texts: [[1.0, 0.0] for _ in texts]
+    processor.embedding_dispatcher = SimpleNamespace(max_concurrency=1)
+    processor.retrieval_cache = RetrievalCache()
+    processor.retrieval_sessions = RetrievalSessionStore()
+    processor.split_text = lambda text, pooled=False: ([SimpleNamespace(content=c) for c in text.split("\n\n")], None)
+    return processor
+
+
+def _doc(*chunks):
+    return {
+        "doc_id": "doc_1", "title": "book", "pages": 1, "processed_date": "", "references": [],
+        "content": "\n\n".join(chunks)
+    }
+
+
+def test_reindexing_an_edited_document_reweights_every_chunk(tmp_path):
+    chunks = ["the cell makes energy", "in the mitochondria", "from glucose", "and oxygen", "the membrane is a barrier"]
+    _processor(tmp_path, "off").index_document(_doc(*chunks))
+
+    # Sparse vectors are enabled after the first index, then the last chunk is edited;
+    # the first three chunks are unchanged both times
+    processor = _processor(tmp_path, "bm25")
+    for edited in (chunks[:4] + ["the membrane"], chunks):
+        processor.index_document(_doc(*edited))
+        stats = BM25Stats.from_texts(edited)
+        stored = processor.index.fetch(processor.catalog.get_chunk_ids("doc_1"))
+        assert len(stored) == len(edited)
+        for match in stored.values():
+            expected = encode_document(tokenize(match.metadata["content"]), stats.avg_length)
+            assert match.sparse_values["indices"] == expected["indices"]
+            assert match.sparse_values["values"] == pytest.approx(expected["values"])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from agents.utils.document_catalog import DocumentCatalog
+from agents.utils.vector_snapshot import load_manifest, restore_snapshot, snapshot_index
+from agents.utils.vector_store import NumpyVectorStore
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DocumentCatalog(create_engine(f"sqlite:///{tmp_path / 'catalog.db'}"))
+
+
+def _index(store, catalog, doc_id, doc_hash, n, namespace):
+    catalog.begin_indexing({"doc_id": doc_id, "title": doc_id}, embedding_model="model", namespace=namespace)
+    ids = [f"{doc_id}#{i}" for i in range(n)]
+    rng = np.random.default_rng(len(doc_id) + n)
+    store.upsert(((i, rng.normal(size=4), {"doc_id": doc_id, "doc_hash": doc_hash}) for i in ids), namespace=namespace)
+    catalog.complete_indexing(doc_id, doc_hash, [(i, "f") for i in ids])
+
+
+def test_snapshot_is_incremental_and_restores_without_embedding(tmp_path, catalog):
+    store = NumpyVectorStore(str(tmp_path / "index"), dims=4)
+    _index(store, catalog, "doc_a", "h1", 5, "file_a")
+    _index(store, catalog, "doc_b", "h1", 3, "file_b")
+
+    first = snapshot_index(store, catalog, str(tmp_path / "snap"))
+    assert (first["written"], first["vectors"], first["skipped"]) == (2, 8, 0)
+
+    _index(store, catalog, "doc_a", "h2", 6, "file_a")
+    catalog.delete_documents(["doc_b"])
+    second = snapshot_index(store, catalog, str(tmp_path / "snap"))
+    assert (second["written"], second["vectors"], second["removed"]) == (1, 6, 1)
+    assert list(load_manifest(str(tmp_path / "snap"))["documents"]) == ["doc_a"]
+
+    restored = NumpyVectorStore(str(tmp_path / "restored"), dims=4)
+    assert restore_snapshot(restored, str(tmp_path / "snap"), batch_size=4, workers=2) == 6
+    original = store.fetch(["doc_a#5"], namespace="file_a")["doc_a#5"]
+    copy = restored.fetch(["doc_a#5"], namespace="file_a")["doc_a#5"]
+    assert np.allclose(copy.values, original.values)
+    assert copy.metadata == original.metadata
+
+
+def test_documents_missing_from_the_index_keep_their_snapshot(tmp_path, catalog):
+    store = NumpyVectorStore(str(tmp_path / "index"), dims=4)
+    _index(store, catalog, "doc_a", "h1", 3, "file_a")
+    snapshot_index(store, catalog, str(tmp_path / "snap"))
+
+    store.delete(namespace="file_a", delete_all=True)
+    catalog.begin_indexing({"doc_id": "doc_a", "title": "doc_a"}, embedding_model="model", namespace="file_a")
+    catalog.complete_indexing("doc_a", "h2", [("doc_a#0", "f")])
+
+    assert snapshot_index(store, catalog, str(tmp_path / "snap"))["incomplete"] == 1
+    assert load_manifest(str(tmp_path / "snap"))["documents"]["doc_a"]["vectors"] == 3
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from agents.utils.vector_store import NumpyVectorStore, matches_filter
+
+
+def _unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore(str(tmp_path / "index"), dims=3, initial_capacity=2)
+
+
+def test_query_ranks_and_filters_within_a_namespace(store):
+    store.upsert([
+        ("a", _unit(1, 0, 0), {"title": "one", "page": 1}),
+        ("b", _unit(1, 1, 0), {"title": "two", "page": 2}),
+        ("c", _unit(0, 0, 1), {"title": "one", "page": 3})
+    ], namespace="file_1")
+    store.upsert([("d", _unit(1, 0, 0), {"title": "one"})], namespace="file_2")
+
+    matches = store.query(_unit(1, 0, 0), top_k=2, namespace="file_1")
+    assert [m.id for m in matches] == ["a", "b"]
+    assert matches[0]["metadata"] == {"title": "one", "page": 1}
+
+    filtered = store.query(_unit(1, 0, 0), top_k=5, filter={"title": "one", "page": {"$gte": 2}}, namespace="file_1")
+    assert [m.id for m in filtered] == ["c"]
+    assert store.stats()["namespaces"] == {"file_1": {"vector_count": 3}, "file_2": {"vector_count": 1}}
+
+
+def test_fetch_delete_and_reopen(tmp_path, store):
+    store.upsert([("a", _unit(1, 0, 0), {"n": 1}), ("b", _unit(0, 1, 0), {"n": 2}), ("c", _unit(0, 0, 1), {"n": 3})])
+    store.delete(ids=["b"])
+    store.upsert([("d", _unit(1, 1, 1), {"n": 4}), ("a", _unit(0, 1, 0), {"n": 5})])
+
+    fetched = store.fetch(["a", "b", "d"])
+    assert sorted(fetched) == ["a", "d"]
+    assert fetched["a"].metadata == {"n": 5}
+    assert np.allclose(fetched["a"].values, [0, 1, 0])
+    # The freed row is reused before the matrix grows
+    assert store.stats()["capacity"] == 4
+
+    reopened = NumpyVectorStore(str(tmp_path / "index"), dims=3)
+    assert [m.id for m in reopened.query(_unit(0, 1, 0), top_k=1)] == ["a"]
+    reopened.delete(delete_all=True)
+    assert reopened.list_namespaces() == []
+    with pytest.raises(ValueError):
+        NumpyVectorStore(str(tmp_path / "index"), dims=4)
+
+
+def test_ivf_search_finds_the_nearest_cluster(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = np.eye(8, dtype=np.float32)
+    points = np.repeat(centers, 50, axis=0) + rng.normal(scale=0.05, size=(400, 8)).astype(np.float32)
+    store = NumpyVectorStore(str(tmp_path / "ivf"), dims=8, ivf_lists=8, ivf_probes=2, ivf_min_vectors=100)
+    store.upsert((str(i), p, {"cluster": i // 50}) for i, p in enumerate(points))
+
+    matches = store.query(centers[3], top_k=10)
+    assert len(matches) == 10
+    assert all(m.metadata["cluster"] == 3 for m in matches)
+
+
+def test_filter_operators():
+    metadata = {"title": "a", "tags": ["x", "y"], "page": 4}
+    assert matches_filter(metadata, {"tags": "x", "page": {"$in": [3, 4]}})
+    assert matches_filter(metadata, {"$or": [{"title": "b"}, {"page": {"$lt": 5}}]})
+    assert not matches_filter(metadata, {"title": {"$ne": "a"}})
+    assert matches_filter(metadata, {"missing": {"$exists": False}, "other": {"$nin": ["a"]}})
+
+
+def test_sparse_scores_add_to_dense_scores_and_persist(tmp_path):
+    path = str(tmp_path / "index")
+    store = NumpyVectorStore(path, dims=2, ivf_lists=2, ivf_probes=1, ivf_min_vectors=4)
+    store.upsert([
+        ("near", _unit(1, 0), {}),
+        ("near2", _unit(1, 0.1), {}),
+        ("keyword", _unit(0, 1), {}, {"indices": [7], "values": [2.0]}),
+        ("far", _unit(0.1, 1), {}, {"indices": [9], "values": [2.0]})
+    ])
+
+    assert [m.id for m in store.query(_unit(1, 0), top_k=1)] == ["near"]
+    # The keyword match lies outside the probed list but is still scored
+    hybrid = store.query(_unit(1, 0), top_k=2, sparse_vector={"indices": [7], "values": [1.0]})
+    assert [m.id for m in hybrid] == ["keyword", "near"]
+    assert hybrid[0].score == pytest.approx(2.0, abs=1e-6)
+
+    store.close()
+    reopened = NumpyVectorStore(path, dims=2)
+    assert reopened.fetch(["keyword"])["keyword"].sparse_values == {"indices": [7], "values": [2.0]}
+    reopened.upsert([("keyword", _unit(0, 1), {})])
+    assert reopened.fetch(["keyword"])["keyword"].sparse_values is None
+    with pytest.raises(ValueError):
+        NumpyVectorStore(str(tmp_path / "cosine"), dims=2, metric="cosine").query(
+            _unit(1, 0), sparse_vector={"indices": [7], "values": [1.0]}
+        )
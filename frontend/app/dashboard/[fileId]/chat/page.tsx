@@ -51,6 +51,8 @@ export default function ChatPage({ params, searchParams }: ChatPageProps) {
   // Chat configuration
   const { messages, input, handleInputChange, handleSubmit: handleChatSubmit, isLoading } = useChat({
     api: `${API_BASE_URL}/api/chat`,
+    // Goes through fetchClient so the request carries the access token
+    fetch: (input, init) => fetchClient(input.toString(), init),
     body: {
       file_id:fileId
     }